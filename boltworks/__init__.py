@@ -4,28 +4,57 @@ __author__ = """Yaakov Saxon"""
 __email__ = "ysaxon@gmail.com"
 __version__ = "0.2.0"
 
-from .gui.treenodeui import TreeNodeUI,TreeNode,ButtonChildContainer,MenuOption,OverflowMenuChildContainer,StaticSelectMenuChildContainer,RadioButtonChildContainer
+TYPE_CHECKING = False #rather than importing typing for it, which is slower to import than the rest of this module; type checkers treat it as True
 
-from .cli.argparse_decorator import argparse_command
+#the exports are imported when they're first used, rather than all of them (and slack_bolt, diskcache etc with them) on `import boltworks`
+_exports = {
+    'TreeNodeUI': '.gui.treenodeui',
+    'TreeNode': '.gui.treenodeui',
+    'ButtonChildContainer': '.gui.treenodeui',
+    'MenuOption': '.gui.treenodeui',
+    'RadioButtonChildContainer': '.gui.treenodeui',
+    'OverflowMenuChildContainer': '.gui.treenodeui',
+    'StaticSelectMenuChildContainer': '.gui.treenodeui',
+    'VirtualChildContainer': '.gui.treenodeui',
+    'ChildNodeProvider': '.gui.providers',
+    'SQLiteChildNodeProvider': '.gui.providers',
+    'LineFileChildNodeProvider': '.gui.providers',
+    'GeneratorChildNodeProvider': '.gui.providers',
+    'MappedTree': '.gui.mappedtree',
+    'compile_tree': '.gui.mappedtree',
+    'argparse_command': '.cli.argparse_decorator',
+    'ActionCallbacks': '.callbacks.action_callbacks',
+    'MsgThreadCallbacks': '.callbacks.thread_callbacks',
+    'DiskCacheKVStore': '.helper.kvstore',
+    'AsyncKVStore': '.helper.async_kvstore',
+    'SignedSerializer': '.helper.serializers',
+    'CallbackDispatcher': '.helper.dispatch',
+    'DispatchedRequest': '.helper.dispatch',
+    'StreamingOutput': '.helper.streaming',
+}
 
-from .callbacks.action_callbacks import ActionCallbacks
-from .callbacks.thread_callbacks import MsgThreadCallbacks
+__all__ = list(_exports)
 
-from .helper.kvstore import DiskCacheKVStore
+def __getattr__(name):
+    if name in _exports:
+        import importlib
+        value = getattr(importlib.import_module(_exports[name], __name__), name)
+        globals()[name] = value #so it's only looked up once
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-from .helper.serializers import SignedSerializer
+def __dir__():
+    return sorted(list(globals()) + __all__)
 
-__all__ = [
-    'TreeNodeUI',
-    'TreeNode',
-    'ButtonChildContainer',
-    'MenuOption',
-    'RadioButtonChildContainer',
-    'OverflowMenuChildContainer',
-    'StaticSelectMenuChildContainer',
-    'argparse_command',
-    'ActionCallbacks',
-    'MsgThreadCallbacks',
-    'DiskCacheKVStore',
-    'SignedSerializer'
-]
+if TYPE_CHECKING:
+    from .gui.treenodeui import TreeNodeUI,TreeNode,ButtonChildContainer,MenuOption,OverflowMenuChildContainer,StaticSelectMenuChildContainer,RadioButtonChildContainer,VirtualChildContainer
+    from .gui.providers import ChildNodeProvider,SQLiteChildNodeProvider,LineFileChildNodeProvider,GeneratorChildNodeProvider
+    from .gui.mappedtree import MappedTree,compile_tree
+    from .cli.argparse_decorator import argparse_command
+    from .callbacks.action_callbacks import ActionCallbacks
+    from .callbacks.thread_callbacks import MsgThreadCallbacks
+    from .helper.kvstore import DiskCacheKVStore
+    from .helper.async_kvstore import AsyncKVStore
+    from .helper.serializers import SignedSerializer
+    from .helper.dispatch import CallbackDispatcher,DispatchedRequest
+    from .helper.streaming import StreamingOutput
@@ -4,15 +4,17 @@ import inspect
 import re
 import uuid
 from collections import ChainMap
-from typing import Optional, Protocol, Sequence, Union
+from typing import TYPE_CHECKING, Optional, Protocol, Sequence, Union
 
-from slack_bolt import Args
-from slack_bolt.app import App
-from slack_bolt.response.response import BoltResponse
+from ..helper import instrumentation, profiling
+from ..helper.dispatch import CallbackDispatcher, DispatchedRequest
 from ..helper.kvstore import KVStoreWithSerializer
 from slack_sdk.models.blocks import ButtonElement, StaticSelectElement
 from slack_sdk.models.blocks.block_elements import Option, PlainTextObject
-from slack_sdk.webhook import WebhookResponse
+
+if TYPE_CHECKING: #only annotations, and slack_bolt is slow to import
+    from slack_bolt import Args
+    from slack_bolt.app import App
 
 prefix_for_callback="rcb_"
 
@@ -25,16 +27,30 @@ class ViewCallbackFunction(Protocol):
 
 
 class ActionCallbacks:
-    def __init__(self,app:App,cache:KVStoreWithSerializer) -> None:
+    def __init__(self,app:App,cache:KVStoreWithSerializer,dispatcher:Optional[CallbackDispatcher]=None) -> None:
+        """
+        Args:
+            app (App): A Slack Bolt App instance, for registering the action and view handlers
+            cache (KVStoreWithSerializer): a KVStore instance, for storing the callbacks
+            dispatcher (CallbackDispatcher, optional): if passed, callbacks are acked right away and then run on the dispatcher's pool rather than on the listener thread
+        """
         self._cache=cache
+        self._dispatcher=dispatcher
         app.action(re.compile(prefix_for_callback+'.*'))(self._do_callback_action)
         app.view(re.compile(prefix_for_callback+'.*'))(self._do_callback_view)
 
     def _do_callback_action(self,args:Args):
         args.ack()
         if args.action:
+            if self._dispatcher:
+                self._dispatcher.submit(self._run_action_callback,args,key=self._dispatcher.key_for(args.body),request=DispatchedRequest("ActionCallbacks",args.body,args,args.respond))
+                return None
+            return self._run_action_callback(args)
+
+    def _run_action_callback(self,args:Args):
+        with instrumentation.span("actioncallbacks.run",kind="action") as span,profiling.profiled("actioncallbacks.action"):
             callback_key=args.action['action_id'][len(prefix_for_callback):]
-            callback_func=self._cache[callback_key]
+            callback_func=self._lookup_callback(callback_key,span)
             if "value" in inspect.signature(callback_func).parameters:
                 value = args.action['selected_option']['value'] if 'selected_option' in args.action and 'value' in args.action['selected_option'] else None  #menu option   
                 response=callback_func(args=args,value=value)
@@ -42,6 +58,15 @@ class ActionCallbacks:
                 response=callback_func(args=args)
             return response
         
+    def _lookup_callback(self,callback_key:str,span:instrumentation.Span):
+        try:
+            callback_func=self._cache[callback_key]
+        except KeyError:
+            span.set(found=False)
+            raise
+        span.set(found=True)
+        return callback_func
+
     def get_button_register_callback(self,
                     text,
                     callback_action:ActionCallbackFunction,
@@ -57,12 +82,19 @@ class ActionCallbacks:
 
     def _do_callback_view(self,args:Args,view):
         args.ack()
+        if self._dispatcher:
+            self._dispatcher.submit(self._run_view_callback,args,view,key=self._dispatcher.key_for(args.body),request=DispatchedRequest("ActionCallbacks",args.body,args,args.respond))
+        else:
+            self._run_view_callback(args,view)
+
+    def _run_view_callback(self,args:Args,view):
         callback_key=view['callback_id'][len(prefix_for_callback):]
         values=dict(ChainMap(*view["state"]['values'].values())) #if "state" in view and "values" in view["state"] else None
         # values_copy=copy.deepcopy(values)
         flat_values=self._flatten_values(values)#_copy)
-        callback_func:ViewCallbackFunction=self._cache[callback_key]
-        callback_func(flat_values=flat_values,args=args)
+        with instrumentation.span("actioncallbacks.run",kind="view") as span,profiling.profiled("actioncallbacks.view"):
+            callback_func:ViewCallbackFunction=self._lookup_callback(callback_key,span)
+            callback_func(flat_values=flat_values,args=args)
 
     def get_menu_register_callback(self,
         options:Optional[Sequence[Union[dict, Option]]],
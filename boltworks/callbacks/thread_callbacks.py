@@ -1,34 +1,155 @@
+from __future__ import annotations
 from functools import partial
+import logging
 import re
-from typing import Any, Callable, Protocol
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, Callable, Optional, Protocol
 
-from slack_bolt import App, Args
+from ..helper import instrumentation
+from ..helper.dispatch import CallbackDispatcher, DispatchedRequest
 from ..helper.kvstore import KVStoreWithSerializer
 
+if TYPE_CHECKING: #only annotations, and slack_bolt is slow to import
+    from slack_bolt import App, Args
+
+logger=logging.getLogger(__name__)
+
 class ThreadCallbackFunction(Protocol):
      def __call__(self, args:Args): ...
-     
+
+
+class _ThreadCallbackRegistration:
+    def __init__(self,callback:ThreadCallbackFunction,one_shot:bool=False,expires_at:Optional[float]=None):
+        self.registration_id=str(uuid.uuid1())
+        self.callback=callback
+        self.one_shot=one_shot
+        self.expires_at=expires_at #wall clock (time.time) rather than monotonic, since it needs to survive restarts and be shared between processes
+
+    def is_expired(self,now:float)->bool:
+        return self.expires_at is not None and now>=self.expires_at
+
 
 class MsgThreadCallbacks():
-    def __init__(self,app:App,kvstore:KVStoreWithSerializer):
+    def __init__(self,app:App,kvstore:KVStoreWithSerializer,default_ttl:Optional[float]=None,sweep_every:int=100,dispatcher:Optional[CallbackDispatcher]=None):
+        """Registers callbacks to be called whenever a message is posted into a given thread
+
+        Args:
+            app (App): A Slack Bolt App instance, to register the message listener on
+            kvstore (KVStoreWithSerializer): a KVStore instance, for storing the callbacks
+            default_ttl (float, optional): if set, registrations without their own ttl will expire after this many seconds. Defaults to None (never expire).
+            sweep_every (int, optional): expired registrations are swept from the store after every this many registrations. Defaults to 100.
+            dispatcher (CallbackDispatcher, optional): if passed, callbacks are run on the dispatcher's pool rather than on the listener thread
+        """
         self._callback_store=kvstore.namespaced("thread_callback")
+        self._default_ttl=default_ttl
+        self._sweep_every=sweep_every
+        self._registrations_since_sweep=0
+        self._sweep_lock=threading.Lock() #registrations come from several handler threads at once
+        self._dispatcher=dispatcher
         app.message(re.compile('.*'))(self._check_for_thread_reply_callback)
 
-    def register_thread_reply_callback(self, ts:str, callback:ThreadCallbackFunction):
-        self._callback_store[ts]=callback
+    def register_thread_reply_callback(self, ts:str, callback:ThreadCallbackFunction, *, one_shot:bool=False, ttl:Optional[float]=None)->str:
+        """Registers a callback to be called for replies in the thread of the message with this `ts`. A thread can have any number of callbacks registered on it.
+
+        Args:
+            ts (str): the ts of the parent message of the thread
+            callback (ThreadCallbackFunction): the callback, which will be passed the slack Args of the reply
+            one_shot (bool, optional): if True, the callback will be removed after the first reply it is called for. Defaults to False.
+            ttl (float, optional): the number of seconds after which this registration expires. Defaults to the default_ttl of this instance.
+
+        Returns:
+            str: a registration id, which can be passed to unregister_thread_reply_callback
+        """
+        ttl=ttl if ttl is not None else self._default_ttl
+        registration=_ThreadCallbackRegistration(callback,one_shot,time.time()+ttl if ttl is not None else None)
+        with self._callback_store.transact(key=ts):
+            registrations=self._load_registrations(ts)
+            registrations.append(registration)
+            self._store_registrations(ts,registrations)
+        with self._sweep_lock:
+            self._registrations_since_sweep+=1
+            sweep_due=bool(self._sweep_every) and self._registrations_since_sweep>=self._sweep_every
+            if sweep_due:
+                self._registrations_since_sweep=0 #here, so only one of the threads reaching it sweeps
+        if sweep_due:
+            self.sweep_expired()
+        return registration.registration_id
+
+    def unregister_thread_reply_callback(self, ts:str, registration_id:Optional[str]=None):
+        """Removes the registration with this id from the thread, or all of the thread's registrations if no id is passed"""
+        with self._callback_store.transact(key=ts):
+            if ts not in self._callback_store:
+                return
+            remaining=[r for r in self._load_registrations(ts) if registration_id is not None and r.registration_id!=registration_id]
+            self._store_registrations(ts,remaining)
+
+    def sweep_expired(self)->int:
+        """Removes every thread whose registrations have all expired from the store, returning the number of entries removed"""
+        with self._sweep_lock:
+            self._registrations_since_sweep=0
+        return self._callback_store.expire()
+
+    def _load_registrations(self,ts:str)->list[_ThreadCallbackRegistration]:
+        if ts not in self._callback_store:
+            return []
+        stored=self._callback_store[ts]
+        if callable(stored): #transitional, from when only one callback was stored per thread
+            return [_ThreadCallbackRegistration(stored)]
+        return stored
+
+    def _store_registrations(self,ts:str,registrations:list[_ThreadCallbackRegistration]):
+        if not registrations:
+            if ts in self._callback_store:
+                del self._callback_store[ts]
+            return
+        expiries=[r.expires_at for r in registrations]
+        if None in expiries: #the entry as a whole only expires once every registration in it has
+            self._callback_store[ts]=registrations
+        else:
+            self._callback_store.set(ts,registrations,expire=max(expiries)-time.time()) # type: ignore
 
     def _check_for_thread_reply_callback(self,args:Args):
-        if 'thread_ts' in args.payload:
+        with instrumentation.span("threadcallbacks.scan") as span:
+            matched='thread_ts' in args.payload and args.payload['thread_ts'] in self._callback_store
+            span.set(matched=matched)
+        if matched:
             thread_ts=args.payload['thread_ts']
-            if thread_ts in self._callback_store:
-                callback:ThreadCallbackFunction=self._callback_store[thread_ts] # type: ignore
-                if not args.respond.response_url: #calling respond will fail
-                    if 'user' in args.payload:
-                        #for some reason a respond_url is often not provided, so the respond method fails, so just fake it here instead
-                        args.respond=partial(args.client.chat_postEphemeral,channel=args.payload['channel'],user=args.payload['user']) # type: ignore
-                    else:
-                        def fail(**kwargs):
-                            raise ValueError("posting with args.respond is unsupported here as Slack provided neither a response_url, nor a username from which we could fake an ephemeral response")
-                        args.respond=fail# type: ignore
-                #TODO consider either modifying say and respond to say/respond in thread, or adding thread_say, and thread_respond to the args (maybe a custom subclass?)
-                callback(args)
+            if self._dispatcher:
+                self._dispatcher.submit(self._run_thread_reply_callbacks,args,thread_ts,key=self._dispatcher.key_for(args.payload),request=DispatchedRequest("MsgThreadCallbacks",args.payload,args,args.respond))
+            else:
+                self._run_thread_reply_callbacks(args,thread_ts)
+
+    def _run_thread_reply_callbacks(self,args:Args,thread_ts:str):
+        with instrumentation.span("threadcallbacks.run") as span:
+            registrations=self._registrations_to_run(thread_ts)
+            span.set(callbacks=len(registrations))
+            if registrations:
+                self._run_registrations(args,registrations)
+
+    def _run_registrations(self,args:Args,registrations:list[_ThreadCallbackRegistration]):
+        if not args.respond.response_url: #calling respond will fail
+            if 'user' in args.payload:
+                #for some reason a respond_url is often not provided, so the respond method fails, so just fake it here instead
+                args.respond=partial(args.client.chat_postEphemeral,channel=args.payload['channel'],user=args.payload['user']) # type: ignore
+            else:
+                def fail(**kwargs):
+                    raise ValueError("posting with args.respond is unsupported here as Slack provided neither a response_url, nor a username from which we could fake an ephemeral response")
+                args.respond=fail# type: ignore
+        #TODO consider either modifying say and respond to say/respond in thread, or adding thread_say, and thread_respond to the args (maybe a custom subclass?)
+        for registration in registrations:
+            try:
+                registration.callback(args)
+            except Exception: #so one failing callback doesn't stop the thread's others being called
+                logger.exception(f"error in thread reply callback {registration.registration_id} for thread {args.payload.get('thread_ts')}")
+
+    def _registrations_to_run(self,thread_ts:str)->list[_ThreadCallbackRegistration]:
+        now=time.time()
+        registrations=self._load_registrations(thread_ts)
+        if not any(r.one_shot or r.is_expired(now) for r in registrations):
+            return registrations #the common case, nothing to write back
+        with self._callback_store.transact(key=thread_ts): #reload inside the transaction, so a one_shot callback can only ever be claimed once
+            registrations=[r for r in self._load_registrations(thread_ts) if not r.is_expired(now)]
+            self._store_registrations(thread_ts,[r for r in registrations if not r.one_shot])
+        return registrations
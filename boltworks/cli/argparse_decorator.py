@@ -1,15 +1,28 @@
+from __future__ import annotations
 import argparse
 from argparse import Action, ArgumentParser
 import copy
+import hashlib
 import inspect
+import logging
+import pickle
+import re
 import shlex
 import sys
+import threading
 import typing
-from typing import Any, Literal, Optional, Union
+from typing import TYPE_CHECKING, Any, Literal, Optional, Union
 
 from slack_bolt import Args
+from .command_text import split_command_text, unescape_slack_text
+from ..helper import profiling
 from ..helper.slack_utils import safe_post_in_blockquotes
 
+if TYPE_CHECKING:
+    from ..helper.kvstore import KVStore
+
+
+logger=logging.getLogger(__name__)
 
 NoneType = type(None)
 
@@ -24,6 +37,25 @@ class SlackArgParseFormatter(argparse.HelpFormatter):
 
 RESERVED_SLACK_ARGS = ["args",*Args.__annotations__.keys()]
 
+MAX_CACHED_PARSERS_PER_COMMAND=16
+
+_output_sink=threading.local() #argparse's help/usage/error output is sent to whichever respond is set here for the current thread
+
+def _print_to_output_sink(message,file=None):
+    write=getattr(_output_sink,"write",None)
+    if write is None: #only happens if the parser is used outside of a command invocation
+        (file or sys.stderr).write(message)
+    else:
+        write(message)
+
+def _redirect_parser_output(parser:ArgumentParser):
+    parser.formatter_class=SlackArgParseFormatter
+    parser._print_message=_print_to_output_sink # type: ignore
+    for action in parser._actions:
+        if isinstance(action,argparse._SubParsersAction):
+            for subparser in action.choices.values():
+                _redirect_parser_output(subparser)
+
 def argparse_command(argparser:Optional[ArgumentParser]=None,echo_back=True,do_ack=True,automagic=False):
     """
     This is the primary method for this feature. It is a decorator that you put onto your Slack Command Method to parse the arguments in the command and pass them to your function.
@@ -115,34 +147,51 @@ def argparse_command(argparser:Optional[ArgumentParser]=None,echo_back=True,do_a
         deco_extra_args_in_deco_without_defaults=[a for a in deco_extra_args_in_deco if a.default is a.empty]
         if not automagic and deco_extra_args_in_deco_without_defaults:
             raise ValueError(f"The method you are decorating has one or more parameters without defaults defined that your argparser is not set to fill:{','.join(deco_extra_args_in_deco)}")
-        if automagic and deco_extra_args_in_deco:
-            midfunc_argparser = automagically_add_args_to_argparser(decorated_function, midfunc_argparser, deco_extra_args_in_deco)
+        #the spec is worked out now, so any problem with the type hints raises here, but it's only added to a parser when one is first built, below,
+        #which copies the argparser passed in anyway, rather than deepcopying it for each decorated function at startup
+        automagic_spec=_automagic_spec(decorated_function,deco_extra_args_in_deco) if automagic and deco_extra_args_in_deco else []
+
+        parsers_by_prog:dict[str,ArgumentParser]={}
+        def _parser_for_prog(prog:str)->ArgumentParser:
+            #each command builds its parser once (per prog, which is baked into subparsers when they're created) rather than deepcopying it on every invocation
+            parser=parsers_by_prog.get(prog)
+            if parser is None:
+                parser=copy.deepcopy(midfunc_argparser)#so we don't pollute the argparser passed in
+                _add_automagic_args(parser,automagic_spec)
+                parser.prog=prog
+                _redirect_parser_output(parser)
+                if len(parsers_by_prog)>=MAX_CACHED_PARSERS_PER_COMMAND:
+                    parsers_by_prog.pop(next(iter(parsers_by_prog)),None)
+                parser=parsers_by_prog.setdefault(prog,parser)
+            return parser
 
         def _inner_func_to_return_to_slack(args:Args):
-            def fn(message,file=None):
+            def fn(message):
                 safe_post_in_blockquotes(args.respond,message)
                 args.ack()
-            innerfunc_argparser=copy.deepcopy(midfunc_argparser)#so we can have _print_message be unique to each call
-            innerfunc_argparser.formatter_class=SlackArgParseFormatter
-            innerfunc_argparser._print_message=fn
 
             if args.command:
                 command_base=args.command['command'].replace("*","") if 'command' in args.command else '<cmd>'
-                command_args=shlex.split(args.command['text'].replace("*","")) if 'text' in args.command else []
+                command_args=split_command_text(unescape_slack_text(args.command['text'])) if 'text' in args.command else []
             elif args.message:
-                split_message=shlex.split(args.message['text'].replace("*",""))
+                split_message=split_command_text(unescape_slack_text(args.message['text']))
                 command_base=split_message[0]
                 command_args=split_message[1:]
             else: raise Exception("This class is only to be used with @command or @message")
 
-            # unfortunately it's not possible to perfectly strip out the markup formatting so for now we are just stripping out asterisks
+            # it's not possible to perfectly recover the plaintext from the mrkdwn formatting, so unescape_slack_text does a best effort
             # whenever they add 'blocks' to the command response, we can parse that to get the exact plaintext representation
             # see also https://stackoverflow.com/a/70627214/10773089
 
-            innerfunc_argparser.prog=command_base
+            innerfunc_argparser=_parser_for_prog(command_base)
             
             #maybe add more verbose explanation if you use `--var`` when it should have been `var`, or vice versa
-            parsed_params=vars(innerfunc_argparser.parse_args(command_args))
+            previous_sink=getattr(_output_sink,"write",None)
+            _output_sink.write=fn
+            try:
+                parsed_params=vars(innerfunc_argparser.parse_args(command_args))
+            finally:
+                _output_sink.write=previous_sink
 
             if do_ack:
                 args.ack()
@@ -155,16 +204,81 @@ def argparse_command(argparser:Optional[ArgumentParser]=None,echo_back=True,do_a
             else:
                 slackvars_to_pass={k:v for k,v in available_slackvars_to_pass.items() if k in deco_argnames} 
             return decorated_function(**slackvars_to_pass,**parsed_params)
-        return _inner_func_to_return_to_slack
+
+        def _profiled_inner_func_to_return_to_slack(args:Args):
+            with profiling.profiled(f"argparse_command.{decorated_function.__name__}"):
+                return _inner_func_to_return_to_slack(args)
+        return _profiled_inner_func_to_return_to_slack
 
     #on init, it will return a function that does all the above stuff when run
     return _mid_func
 #could potentially extend further to do the app.command command wrapper as well and maybe even handle making the regex string too
 
 
+AUTOMAGIC_SPEC_VERSION=3 #bump this whenever the way specs are compiled changes, so that stored specs are recompiled
+
+_automagic_spec_memo:dict[str,list[tuple[str,dict[str,Any]]]]={}
+_automagic_spec_store:Optional[KVStore]=None
+
+def set_automagic_spec_store(kvstore:Optional[KVStore]):
+    """Sets a KVStore (eg a DiskCacheKVStore) in which to keep compiled automagic argument specs, so they're reused across restarts.
+    Specs are keyed by a hash of the decorated function's signature, so a changed signature just compiles a new spec.
+    Pass None to go back to only memoizing in memory.
+    """
+    global _automagic_spec_store
+    _automagic_spec_store=kvstore.namespaced("automagic_spec") if kvstore is not None else None
+
+_STRING_LITERAL=re.compile(r"'[^']*'|\"[^\"]*\"")
+_GLOBAL_NAME=re.compile(r"(?<![\w.])[A-Za-z_]\w*")
+
+def _describe_annotation(annotation,globalns:dict)->str:
+    """the annotation, and with `from __future__ import annotations` (where it's just a string, eg 'Mode'), what the globals it names are,
+    so that changing what they are (eg Mode=Literal['a','b'] to Literal['x','y']) changes the description, without the cost of resolving it with get_type_hints"""
+    if not isinstance(annotation,str):
+        return repr(annotation)
+    names=sorted(set(_GLOBAL_NAME.findall(_STRING_LITERAL.sub("",annotation))))
+    return f"{annotation}{{{','.join(f'{name}={globalns[name]!r}' for name in names if name in globalns)}}}" #builtins aren't in globalns, and don't change
+
+def _automagic_signature_hash(decorated_function, deco_extra_args_in_deco)->str:
+    # only the things that the spec is compiled from
+    globalns=getattr(decorated_function,"__globals__",{})
+    params=[f"{a.name}:{a.kind}:{_describe_annotation(a.annotation,globalns)}:{a.default!r}" for a in deco_extra_args_in_deco]
+    described=f"{AUTOMAGIC_SPEC_VERSION}|{sys.version_info[:2]}|{decorated_function.__module__}.{decorated_function.__qualname__}|{'|'.join(params)}"
+    return hashlib.sha256(described.encode()).hexdigest()
+
+def _automagic_spec(decorated_function, deco_extra_args_in_deco)->list[tuple[str,dict[str,Any]]]:
+    signature_hash=_automagic_signature_hash(decorated_function,deco_extra_args_in_deco)
+    spec=_automagic_spec_memo.get(signature_hash)
+    if spec is not None:
+        return spec
+    store=_automagic_spec_store
+    if store is not None and signature_hash in store:
+        spec=store[signature_hash]
+    else:
+        spec=_compile_automagic_spec(decorated_function,deco_extra_args_in_deco)
+        if store is not None:
+            try:
+                store[signature_hash]=spec
+            except (pickle.PicklingError,TypeError,AttributeError): #eg a Literal of something unpicklable, it's still memoized in memory
+                logger.debug(f"automagic spec for {decorated_function.__qualname__} can't be pickled, only memoizing it",exc_info=True)
+            except Exception: #the store itself is broken, but the command can still run
+                logger.warning(f"couldn't store the automagic spec for {decorated_function.__qualname__}",exc_info=True)
+    _automagic_spec_memo[signature_hash]=spec
+    return spec
+
 def automagically_add_args_to_argparser(decorated_function, midfunc_argparser, deco_extra_args_in_deco):
-        supported_simple_types=[str,int,float,bool]
         midfunc_argparser:ArgumentParser=copy.deepcopy(midfunc_argparser)#in case the same argparser is reused for other methods we don't want to pollute it
+        _add_automagic_args(midfunc_argparser,_automagic_spec(decorated_function,deco_extra_args_in_deco))
+        return midfunc_argparser
+
+def _add_automagic_args(argparser:ArgumentParser,spec:list[tuple[str,dict[str,Any]]]):
+    for name_or_flag,add_argument_kwargs in spec:
+        argparser.add_argument(name_or_flag,**add_argument_kwargs)
+
+def _compile_automagic_spec(decorated_function, deco_extra_args_in_deco)->list[tuple[str,dict[str,Any]]]:
+        """works out the add_argument call for each parameter, as plain (picklable) data"""
+        supported_simple_types=[str,int,float,bool]
+        spec:list[tuple[str,dict[str,Any]]]=[]
         type_hints=typing.get_type_hints(decorated_function)
         for arg in deco_extra_args_in_deco:
             arg_default = arg.default if arg.default is not arg.empty else None
@@ -229,9 +343,9 @@ def automagically_add_args_to_argparser(decorated_function, midfunc_argparser, d
 
 
 
-            midfunc_argparser.add_argument(arg.name if not arg.kind==arg.KEYWORD_ONLY else f"--{arg.name}",**add_argument_kwargs)
+            spec.append((arg.name if not arg.kind==arg.KEYWORD_ONLY else f"--{arg.name}",add_argument_kwargs))
 
-        return midfunc_argparser
+        return spec
 
 #adapted from https://stackoverflow.com/a/74272052/10773089
 class BoolAction(Action):
@@ -0,0 +1,87 @@
+"""Turns the text of a slack command or message into argv style arguments.
+
+split_command_text follows exactly the same quoting rules as `shlex.split` (posix mode, no comments), but with compiled regexes rather than shlex's character by character state machine,
+and with plain text (no quotes or backslashes) skipping tokenization altogether.
+"""
+from __future__ import annotations
+
+import re
+
+_SHLEX_WHITESPACE=" \t\r\n" #shlex only splits on these, unlike str.split
+_WORDS=re.compile(r"[^ \t\r\n]+")
+_NEEDS_TOKENIZING=re.compile(r"""['"\\]""")
+_PARTS=re.compile(r"""
+     ([^ \t\r\n'"\\]+)          # 1: bare text
+    |\\(.)                      # 2: backslash escaped character
+    |'([^']*)'                  # 3: single quoted, everything is literal
+    |"((?:[^"\\]|\\.)*)"        # 4: double quoted, where only \\ and \" are escapes
+    |([ \t\r\n]+)               # 5: whitespace, ending the current token
+    |(['"])                     # 6: a quote without a closing quote
+    |(\\)                       # 7: a backslash at the very end
+    """,re.DOTALL|re.VERBOSE)
+_DOUBLE_QUOTED_ESCAPE=re.compile(r'\\([\\"])')
+_ENDS_MID_ESCAPE=re.compile(r'(?:[^\\]|\\.)*\\',re.DOTALL)
+
+
+def split_command_text(text:str)->list[str]:
+    """Splits text into arguments, exactly as `shlex.split(text)` would
+
+    Raises:
+        ValueError: for an unclosed quote or a trailing backslash, with the same message shlex uses
+    """
+    if not _NEEDS_TOKENIZING.search(text):
+        return _WORDS.findall(text) if any(c in text for c in _SHLEX_WHITESPACE) else [text] if text else []
+    tokens:list[str]=[]
+    current:list[str]|None=None #None when between tokens, so that an empty quoted string still makes a token
+    for match in _PARTS.finditer(text):
+        bare,escaped,single_quoted,double_quoted,whitespace,unclosed_quote,trailing_backslash=match.groups()
+        if whitespace is not None:
+            if current is not None:
+                tokens.append("".join(current))
+                current=None
+            continue
+        if unclosed_quote is not None:
+            if unclosed_quote=='"' and _ENDS_MID_ESCAPE.fullmatch(text,match.end()): #shlex hits the end of the text while still in the escape
+                raise ValueError("No escaped character")
+            raise ValueError("No closing quotation")
+        if trailing_backslash is not None:
+            raise ValueError("No escaped character")
+        if current is None:
+            current=[]
+        if bare is not None: current.append(bare)
+        elif escaped is not None: current.append(escaped)
+        elif single_quoted is not None: current.append(single_quoted)
+        else: current.append(_DOUBLE_QUOTED_ESCAPE.sub(r"\1",double_quoted))
+    if current is not None:
+        tokens.append("".join(current))
+    return tokens
+
+
+_SMART_DOUBLE_QUOTED=re.compile(r"“([^“”]*)”")
+_SMART_SINGLE_QUOTED=re.compile(r"(?<!\w)‘([^‘]*?)’(?!\w)") #not an apostrophe, as in don’t, which is the same character as the closing quote
+_LINK=re.compile(r"<((?:https?|mailto|ftp|tel):[^|>]*)(?:\|([^>]*))?>")
+_BOLD=re.compile(r"(?<![^\s(])\*(?=\S)(.+?)(?<=\S)\*(?![^\s.,;:!?)])")
+_ENTITIES=re.compile(r"&(amp|lt|gt);")
+_ENTITY_VALUES={"amp":"&","lt":"<","gt":">"}
+
+
+def unescape_slack_text(text:str)->str:
+    """Recovers (as closely as possible) the plain text a user typed, from the mrkdwn formatted text slack sends for commands and messages
+
+    * links slack added are turned back into what was typed (`<https://x.com|x.com>` -> `x.com`)
+    * user/channel mentions like `<@U123>` are left as is, so they can still be parsed as ids
+    * `&amp;`, `&lt;` and `&gt;` are unescaped
+    * *bold* markers are stripped, but other asterisks (eg `*.py` or `2*3`) are kept
+    * pairs of smart quotes inserted by some slack clients are straightened, so they can still be used for quoting. Unpaired ones, like the apostrophe in don’t, are left alone
+    """
+    if "<" in text:
+        text=_LINK.sub(lambda m: m.group(2) if m.group(2) is not None else m.group(1),text)
+    if "*" in text:
+        text=_BOLD.sub(r"\1",text)
+    if "&" in text:
+        text=_ENTITIES.sub(lambda m: _ENTITY_VALUES[m.group(1)],text)
+    if "“" in text:
+        text=_SMART_DOUBLE_QUOTED.sub(r'"\1"',text)
+    if "‘" in text:
+        text=_SMART_SINGLE_QUOTED.sub(r"'\1'",text)
+    return text
@@ -23,6 +23,8 @@ class _ExpandPointer:
 
     def __hash__(self) -> int:
         return self._values.__hash__()
+    def __eq__(self, other) -> bool:
+        return isinstance(other, _ExpandPointer) and self._values == other._values
     def __len__(self) -> int:
         return self._values.__len__()
     def __iter__(self): return self._values.__iter__()
@@ -0,0 +1,145 @@
+"""A read only, memory mapped store for large trees which never change, eg reference docs or a schema browser posted to many channels.
+
+```
+compile_tree(TreeNode.fromJson("schema",schema),"/srv/trees/schema.bwtree") #once, as a build step
+...
+treeui.post_single_node(channel,MappedTree.open("/srv/trees/schema.bwtree").root) #in each worker
+```
+
+Each node is pickled on its own into the file, with an index of their offsets at the end, and nodes are only unpickled when they're shown,
+straight out of the mapped file without copying it. Every process using the file shares the same pages of it through the OS page cache.
+Mapped nodes are pickled as a reference to their file and position in it, so storing one in a KVStore (as TreeNodeUI does when posting it) costs a few bytes,
+and the file must be at the same path for every process that renders the tree. Replace a file by compiling to a new path; never overwrite one in use.
+Searching (searchable=True) only covers the root of a mapped tree.
+"""
+from __future__ import annotations
+
+import copy
+import mmap
+import os
+import pickle
+import struct
+import threading
+from collections import deque
+from typing import Union
+
+from .providers import ChildNodeProvider
+from .treenodeui import (ChildNodeMenuContainer, TreeNode, _index_block_counts,
+                         _preserialize_tree, _VirtualChildNodes)
+
+MAGIC=b"BWTREE1\n"
+_HEADER=struct.Struct("<8sQQ") #magic, number of nodes, offset of the index
+_INDEX_ENTRY=struct.Struct("<QQ") #offset and length of each node's pickle
+
+
+def compile_tree(root:TreeNode,path:Union[str,os.PathLike],preserialize_blocks:bool=False):
+    """Writes the tree to a file for MappedTree, with the block counts (and if preserialize_blocks, the serialized blocks) TreeNodeUI needs already worked out
+
+    Args:
+        root (TreeNode): the tree, whose nodes must be picklable with pickle
+        path (Union[str,os.PathLike]): where to write it. It's written to a temporary file and renamed into place, so a half written file is never opened.
+        preserialize_blocks (bool, optional): for TreeNodeUIs with preserialize_blocks=True. Defaults to False.
+    """
+    _index_block_counts(root)
+    if preserialize_blocks:
+        _preserialize_tree(root)
+    temporary_path=f"{os.fspath(path)}.{os.getpid()}.tmp"
+    index=[]
+    with open(temporary_path,"wb") as f:
+        f.write(b"\0"*_HEADER.size) #filled in at the end
+        queue=deque([root]) #numbered breadth first, so each list of children is a consecutive range of node numbers
+        next_node_number=1
+        while queue:
+            node=queue.popleft()
+            shallow_node=copy.copy(node)
+            shallow_node.children_containers=[]
+            for container in node.children_containers:
+                shallow_container=copy.copy(container)
+                child_lists=container.child_nodes if isinstance(container,ChildNodeMenuContainer) else [container.child_nodes]
+                ranges=[]
+                for child_nodes in child_lists:
+                    child_nodes=list(child_nodes or [])
+                    ranges.append(_VirtualChildNodes(_MappedChildRange(next_node_number,len(child_nodes))))
+                    next_node_number+=len(child_nodes)
+                    queue.extend(child_nodes)
+                shallow_container.child_nodes=ranges if isinstance(container,ChildNodeMenuContainer) else ranges[0]
+                shallow_node.children_containers.append(shallow_container)
+            data=pickle.dumps(shallow_node,protocol=pickle.HIGHEST_PROTOCOL)
+            index.append((f.tell(),len(data)))
+            f.write(data)
+        index_offset=f.tell()
+        for entry in index:
+            f.write(_INDEX_ENTRY.pack(*entry))
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC,len(index),index_offset))
+    os.replace(temporary_path,path)
+
+
+class MappedTree:
+    _open_trees:dict[str,MappedTree]={}
+    _open_lock=threading.Lock()
+
+    def __init__(self,path:Union[str,os.PathLike]) -> None:
+        """A tree compiled by compile_tree. Use MappedTree.open, which shares one mapping of each file per process."""
+        self.path=os.path.abspath(path)
+        with open(self.path,"rb") as f:
+            self._mmap=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        magic,self.node_count,index_offset=_HEADER.unpack_from(self._mmap,0)
+        if magic!=MAGIC:
+            raise ValueError(f"{self.path} isn't a compiled tree")
+        self._data=memoryview(self._mmap)
+        self._index_offset=index_offset
+
+    @classmethod
+    def open(cls,path:Union[str,os.PathLike])->MappedTree:
+        path=os.path.abspath(path)
+        with cls._open_lock:
+            tree=cls._open_trees.get(path)
+            if tree is None:
+                tree=cls._open_trees[path]=cls(path)
+            return tree
+
+    @property
+    def root(self)->TreeNode:
+        return self.node(0)
+
+    def node(self,node_number:int)->TreeNode:
+        """Unpickles a single node, whose children are loaded when they're accessed"""
+        if not 0<=node_number<self.node_count: raise IndexError(node_number)
+        offset,length=_INDEX_ENTRY.unpack_from(self._data,self._index_offset+node_number*_INDEX_ENTRY.size) #rather than a cast memoryview, which would read it in the host's byte order
+        node=pickle.loads(self._data[offset:offset+length])
+        node.__class__=_MappedTreeNode
+        node._mapped_reference=(self.path,node_number)
+        for container in node.children_containers:
+            for child_nodes in container.child_nodes if isinstance(container,ChildNodeMenuContainer) else [container.child_nodes]:
+                child_nodes.provider.tree=self
+        return node
+
+    def get_range(self,start:int,stop:int)->list[TreeNode]:
+        return [self.node(node_number) for node_number in range(start,stop)]
+
+
+class _MappedChildRange(ChildNodeProvider):
+    """A consecutive range of nodes in a MappedTree, the children of one container (or menu option)"""
+    def __init__(self,first:int,count:int) -> None:
+        self.first=first
+        self.count=count
+        self.tree:MappedTree=None # type: ignore #attached when the parent is loaded, rather than pickled with every node
+    def row_count(self)->int:
+        return self.count
+    def get_range(self,start:int,stop:int)->list[TreeNode]:
+        return self.tree.get_range(self.first+start,self.first+stop)
+    def __getstate__(self):
+        return self.first,self.count
+    def __setstate__(self,state):
+        self.first,self.count=state
+        self.tree=None # type: ignore
+
+
+class _MappedTreeNode(TreeNode):
+    """A node loaded from a MappedTree, which pickles as a reference to it"""
+    def __reduce__(self):
+        return _load_mapped_node,self._mapped_reference
+
+def _load_mapped_node(path:str,node_number:int)->TreeNode:
+    return MappedTree.open(path).node(node_number)
@@ -0,0 +1,141 @@
+"""Providers of the children of a VirtualChildContainer, which build only the TreeNodes being shown.
+
+```
+provider=SQLiteChildNodeProvider("results.db","SELECT name,status FROM jobs ORDER BY started DESC")
+treeui.post_single_node(channel,TreeNode("jobs",VirtualChildContainer(provider,child_pageination=20)))
+```
+
+Providers are stored in the KVStore along with the rest of the tree, so they should hold how to get at the data (a path, a query), not the data itself.
+Any functions passed to them must be picklable by the KVStore's serializer (eg module level functions, or anything if using dill).
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+from itertools import islice
+from typing import Callable, Iterable, Optional, Sequence
+
+from .treenodeui import TreeNode
+
+
+class ChildNodeProvider:
+    """Random access to a container's children, by index, so only the visible page of them needs to be built"""
+    def row_count(self)->int:...
+    def get_range(self,start:int,stop:int)->Sequence[TreeNode]:
+        """The children from index start, up to but not including stop, both within row_count"""
+        ...
+
+
+def _row_as_node(row:tuple)->TreeNode:
+    return TreeNode(" | ".join(str(value) for value in row) or " ")
+
+def _line_as_node(line:str)->TreeNode:
+    return TreeNode(line or " ") #an empty string would be no blocks at all
+
+
+class SQLiteChildNodeProvider(ChildNodeProvider):
+    def __init__(self,database:str,query:str,parameters:Sequence=(),row_to_node:Callable[[tuple],TreeNode]=_row_as_node) -> None:
+        """Children from the rows of a SQLite query, fetched a page at a time with LIMIT and OFFSET
+
+        Args:
+            database (str): the path to the database file, which is opened read only
+            query (str): a SELECT, which should have an ORDER BY, so the pages are stable
+            parameters (Sequence, optional): parameters for the query's placeholders
+            row_to_node (Callable[[tuple],TreeNode], optional): builds a child from a row. Defaults to joining the row's values in a single line.
+        """
+        self.database=database
+        self.query=query
+        self.parameters=tuple(parameters)
+        self.row_to_node=row_to_node
+        self._connection:Optional[sqlite3.Connection]=None
+        self._lock=threading.Lock()
+
+    def _connect(self)->sqlite3.Connection:
+        if self._connection is None:
+            self._connection=sqlite3.connect(f"file:{self.database}?mode=ro",uri=True,check_same_thread=False)
+        return self._connection
+
+    def row_count(self)->int:
+        with self._lock:
+            return self._connect().execute(f"SELECT COUNT(*) FROM ({self.query})",self.parameters).fetchone()[0]
+
+    def get_range(self,start:int,stop:int)->list[TreeNode]:
+        with self._lock:
+            rows=self._connect().execute(f"SELECT * FROM ({self.query}) LIMIT ? OFFSET ?",(*self.parameters,stop-start,start)).fetchall()
+        return [self.row_to_node(row) for row in rows]
+
+    def __getstate__(self):
+        state=self.__dict__.copy()
+        del state["_connection"],state["_lock"]
+        return state
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self._connection=None
+        self._lock=threading.Lock()
+
+
+class LineFileChildNodeProvider(ChildNodeProvider):
+    CHECKPOINT_EVERY=256 #lines between the offsets kept, so seeking to a line reads at most this many lines past it
+
+    def __init__(self,path:str,line_to_node:Callable[[str],TreeNode]=_line_as_node,encoding:str="utf-8") -> None:
+        """Children from the lines of a text file, eg a log. The file is scanned once, when first needed, for the offset of every CHECKPOINT_EVERY'th line,
+        and the file is assumed not to change after that, other than being appended to (which won't show up).
+
+        Args:
+            path (str): the file's path
+            line_to_node (Callable[[str],TreeNode], optional): builds a child from a line, without its line ending. Defaults to a node of just the line.
+            encoding (str, optional): Defaults to "utf-8".
+        """
+        self.path=path
+        self.line_to_node=line_to_node
+        self.encoding=encoding
+        self._checkpoints:Optional[list[int]]=None #the byte offset of line 0, CHECKPOINT_EVERY, 2*CHECKPOINT_EVERY...
+        self._line_count=0
+
+    def _index(self)->list[int]:
+        if self._checkpoints is None:
+            checkpoints=[]
+            line_count=0
+            with open(self.path,"rb") as f:
+                offset=0
+                for line in f:
+                    if line_count%self.CHECKPOINT_EVERY==0:
+                        checkpoints.append(offset)
+                    offset+=len(line)
+                    line_count+=1
+            self._line_count=line_count
+            self._checkpoints=checkpoints
+        return self._checkpoints
+
+    def row_count(self)->int:
+        self._index()
+        return self._line_count
+
+    def get_range(self,start:int,stop:int)->list[TreeNode]:
+        checkpoints=self._index()
+        if start>=stop: return []
+        with open(self.path,"rb") as f:
+            f.seek(checkpoints[start//self.CHECKPOINT_EVERY])
+            lines=islice(f,start%self.CHECKPOINT_EVERY,start%self.CHECKPOINT_EVERY+stop-start)
+            return [self.line_to_node(line.decode(self.encoding).rstrip("\r\n")) for line in lines]
+
+
+class GeneratorChildNodeProvider(ChildNodeProvider):
+    def __init__(self,factory:Callable[[],Iterable[TreeNode]],length:Optional[int]=None) -> None:
+        """Children from an iterable, which is iterated afresh from the start for each page, skipping the nodes before it.
+        That's only cheap for early pages, so prefer one of the other providers, or your own, for anything with real random access.
+
+        Args:
+            factory (Callable[[],Iterable[TreeNode]]): returns a new iterable of the children each time it's called, always in the same order, eg a generator function
+            length (int, optional): the number of children, if known. Otherwise they're counted by iterating through them once.
+        """
+        self.factory=factory
+        self.length=length
+
+    def row_count(self)->int:
+        if self.length is None:
+            self.length=sum(1 for _ in self.factory())
+        return self.length
+
+    def get_range(self,start:int,stop:int)->list[TreeNode]:
+        return list(islice(self.factory(),start,stop))
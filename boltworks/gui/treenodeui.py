@@ -1,58 +1,121 @@
 from __future__ import annotations
 
-import datetime
+import logging
 import re
-from typing import Iterable, Optional, Tuple, Union, overload
+import threading
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Iterable, Optional, Tuple, Union, overload
 from uuid import uuid1
 from expiringdict import ExpiringDict
 from more_itertools import chunked
 from slack_bolt import Respond, Say
 from slack_bolt.app import App
 from slack_sdk.models.blocks import (ActionsBlock, Block, ButtonElement,
-                                     ContextBlock, InteractiveElement,
-                                     OverflowMenuElement, RadioButtonsElement,
-                                     SectionBlock, StaticSelectElement)
-from slack_sdk.models.blocks.basic_components import MarkdownTextObject, Option
+                                     ContextBlock, InputBlock,
+                                     InteractiveElement, OverflowMenuElement,
+                                     PlainTextInputElement,
+                                     RadioButtonsElement, SectionBlock,
+                                     StaticSelectElement)
+from slack_sdk.models.blocks.basic_components import (DispatchActionConfig,
+                                                      MarkdownTextObject,
+                                                      Option)
+from slack_sdk.web import SlackResponse
 from slack_sdk.webhook import WebhookResponse
 from ..gui.expandpointer import _ExpandPointer
+from ..helper import instrumentation, profiling
+from ..helper.dispatch import CallbackDispatcher, DispatchedRequest
 from ..helper.kvstore import KVStore
 from ..helper.slack_utils import simple_slack_block
 
+if TYPE_CHECKING:
+    from .providers import ChildNodeProvider
+
+logger=logging.getLogger(__name__)
+
 NAMELESS_FMT_STR_EXPAND="expand {}"
 NAMELESS_FMT_STR_COLLAPSE="collapse {}"
+EMPTY_PANE_TEXT="_(this pane is empty)_"
+REPAGINATED_TEXT="(blocks were repaginated to avoid exceeding slack limits)"
+MAX_SEARCH_QUERY_LENGTH=2000 #the most a button's value can hold
+MESSAGE_BLOCK_LIMIT=50
+VIEW_BLOCK_LIMIT=100 #modals and App Home tabs
+MAX_VIEW_TITLE_LENGTH=24
 
 
 
             
 
 prefix_for_callback="tn@"
+prefix_for_search_callback="tns@"
+search_index_key_suffix="^search"
 class TreeNodeUI:
-    def __init__(self,app:App,kvstore:KVStore) -> None:
+    def __init__(self,app:App,kvstore:KVStore,dispatcher:Optional[CallbackDispatcher]=None,preserialize_blocks:bool=False,duplicate_click_seconds:float=2) -> None:
         """This is the managing class for the NodeUI, which handles posting nodes and then responding to InteractiveElements to expand/contract node children
 
         Args:
             app (App): A Slack Bolt App instance, for posting and registering actionhandlers
             kvstore (_type_): a KVStore instance, for storing and looking up Nodes
+            dispatcher (CallbackDispatcher, optional): if passed, clicks are acked right away and the tree is rerendered on the dispatcher's pool rather than on the listener thread
+            preserialize_blocks (bool, optional): if True, each node's blocks are converted to dicts once, when the tree is stored, and renders assemble those dicts, patching in the action_ids, rather than building slack_sdk Blocks on every click. Renders then return dicts rather than Blocks.
+            duplicate_click_seconds (float, optional): a click which would rerender a message in the state it was just rendered in, within this many seconds, is ignored (eg a double click). 0 to disable. Defaults to 2.
         """
+        self._dispatcher=dispatcher
+        self._preserialize_blocks=preserialize_blocks
+        self._inflight_renders:dict[str,_InflightRender]={} #by rootkey, clicks on a message while it's being rendered are coalesced into one render of the newest state
+        self._inflight_lock=threading.Lock()
+        self._recently_rendered=ExpiringDict(max_age_seconds=duplicate_click_seconds,max_len=1000) if duplicate_click_seconds>0 else None
         app.action(re.compile(f"{prefix_for_callback}.*"))(self._do_callback_action)
+        app.action(re.compile(f"{prefix_for_search_callback}.*"))(self._do_search_action)
         self.expiring_root_dict=ExpiringDict(max_age_seconds=120,max_len=20)
+        self._searchable_roots=ExpiringDict(max_age_seconds=120,max_len=1000) #by rootkey, whether the tree was posted searchable
         self.kvstore=kvstore #.namespaced(prefix_for_callback)
         self._slack_chat_client=app.client
 
-    def post_single_node(self,post_callable_or_channel:str|Say|Respond,node:TreeNode,alt_text:Optional[str]=None,expand_first:bool=False):
+    def post_single_node(self,post_callable_or_channel:str|Say|Respond,node:TreeNode,alt_text:Optional[str]=None,expand_first:bool=False,searchable:bool=False):
         """Posts a Single Node
         Args:
             post_callable_or_channel: either an instance of Respond or Say, or a channelid to post to
             node (TreeNode): the node to post
             alt_text (str, optional): for notifications that require a simple string
             expand_first (bool, optional): if set to True, the Node will post with its first child container expanded [to its first menu option]
+            searchable (bool, optional): if set to True, a search box is shown above the tree, which expands the tree to the nodes whose text contains every word searched for
         """
         say=Say(self._slack_chat_client,post_callable_or_channel) if isinstance(post_callable_or_channel,str) else post_callable_or_channel
-        rootkey=self._rootkey_from_treenode(node)
-        return say(text=alt_text or node.text_formatting_as_str(),
+        rootkey=self._rootkey_from_treenode(node,searchable=searchable)
+        return self._post_blocks(say,text=alt_text or node.text_formatting_as_str(),
                                  blocks=self._format_tree(rootkey,expand_first=expand_first),unfurl_links=False)
 
-    def post_treenodes(self,post_callable_or_channel:str|Say|Respond,treenodes:list[TreeNode],post_all_together:bool,global_header:Optional[str]=None,*,message_if_none:Optional[str]=None,expand_first_if_seperate=False,**other_global_tn_kwargs):
+    def open_in_modal(self,trigger_id:str,node:TreeNode,title:Optional[str]=None,expand_first:bool=False,searchable:bool=False):
+        """Opens a modal showing a Node, which has room for 100 blocks rather than a message's 50, so big trees need less repaginating. Clicks in it update the modal.
+
+        Args:
+            trigger_id (str): the trigger_id of the interaction or slash command opening the modal, from its body
+            node (TreeNode): the node to show
+            title (str, optional): the modal's title, cut to slack's limit of 24 characters. Defaults to the node's text.
+            expand_first (bool, optional): like expand_first for post_single_node
+            searchable (bool, optional): like searchable for post_single_node
+        """
+        rootkey=self._rootkey_from_treenode(node,searchable=searchable)
+        view=dict(type="modal",
+                  title=dict(type="plain_text",text=_view_title(title or node.text_formatting_as_str())),
+                  close=dict(type="plain_text",text="Close"),
+                  blocks=_blocks_as_dicts(self._format_tree(rootkey,expand_first=expand_first,block_limit=VIEW_BLOCK_LIMIT)))
+        return self._post_blocks(self._slack_chat_client.views_open,trigger_id=trigger_id,view=view)
+
+    def publish_to_home(self,user_id:str,node:TreeNode,expand_first:bool=False,searchable:bool=False):
+        """Publishes a Node as a user's App Home tab, replacing whatever was there, with room for 100 blocks like a modal. Clicks in it update the tab.
+
+        Args:
+            user_id (str): the user whose App Home it is, eg from an app_home_opened event
+            node (TreeNode): the node to show
+            expand_first (bool, optional): like expand_first for post_single_node
+            searchable (bool, optional): like searchable for post_single_node
+        """
+        rootkey=self._rootkey_from_treenode(node,searchable=searchable)
+        view=dict(type="home",blocks=_blocks_as_dicts(self._format_tree(rootkey,expand_first=expand_first,block_limit=VIEW_BLOCK_LIMIT)))
+        return self._post_blocks(self._slack_chat_client.views_publish,user_id=user_id,view=view)
+
+    def post_treenodes(self,post_callable_or_channel:str|Say|Respond,treenodes:list[TreeNode],post_all_together:bool,global_header:Optional[str]=None,*,message_if_none:Optional[str]=None,expand_first_if_seperate=False,searchable=False,**other_global_tn_kwargs):
         """Posts multiple Nodes together
 
         Args:
@@ -62,6 +125,7 @@ class TreeNodeUI:
             global_header (str, optional): if posting together, this will be the text of the parent node, otherwise just a header posted before the nodes
             message_if_none (str, optional): optionally, provide a string to post if there are no nodes
             expand_first_if_seperate (bool, optional): like expand_first for post_single_node, only effective if posting the blocks seperately
+            searchable (bool, optional): like searchable for post_single_node, for the nodes together, or each one if posting them seperately
         """
         say=Say(self._slack_chat_client,post_callable_or_channel) if isinstance(post_callable_or_channel,str) else post_callable_or_channel
         if not treenodes:
@@ -70,39 +134,137 @@ class TreeNodeUI:
         if post_all_together:
             num_treenodes=f" ({len(treenodes)}) " if len(treenodes)>1 else ""
             alt_text=f"{global_header}: {num_treenodes} {treenodes[0].text_formatting_as_str()} "
-            say(text=alt_text,
+            self._post_blocks(say,text=alt_text,
                 blocks=self._format_tree(
                     self._rootkey_from_treenode(TreeNode.withSimpleSideButton(
                     formatblocks=global_header if global_header else [],
                     children=treenodes,
                     **other_global_tn_kwargs
-                )),expand_first=True
+                ),searchable=searchable),expand_first=True
             ),unfurl_links=False)
         else:
             if global_header:
                 say(text=global_header)
             for node in treenodes:
-                rootkey=self._rootkey_from_treenode(node)
+                rootkey=self._rootkey_from_treenode(node,searchable=searchable)
                 alt_text=node.text_formatting_as_str()
-                say(text=alt_text,blocks=self._format_tree(rootkey,expand_first=expand_first_if_seperate),unfurl_links=False)
+                self._post_blocks(say,text=alt_text,blocks=self._format_tree(rootkey,expand_first=expand_first_if_seperate),unfurl_links=False)
                 
-    def _rootkey_from_treenode(self,node:TreeNode):
+    @staticmethod
+    def _post_blocks(post:Say|Respond,**kwargs):
+        with instrumentation.span("treenodeui.post") as span:
+            response=post(**kwargs)
+            span.set(status=getattr(response,"status_code",None))
+            return response
+
+    def _rootkey_from_treenode(self,node:TreeNode,searchable:bool=False):
+        _index_block_counts(node) #so it's stored along with the tree
+        if self._preserialize_blocks:
+            _preserialize_tree(node)
         rootkey=str(uuid1())
         self.kvstore[rootkey]=node
         self.expiring_root_dict[rootkey]=node
+        if searchable: #stored seperately, so it's only loaded when searching
+            search_index=_SearchIndex(node)
+            self.kvstore[rootkey+search_index_key_suffix]=search_index
+            self.expiring_root_dict[rootkey+search_index_key_suffix]=search_index
+        self._searchable_roots[rootkey]=searchable
         return rootkey
 
     def _get_root(self,rootkey:str)->TreeNode:
-        if rootkey in self.expiring_root_dict:
-            return self.expiring_root_dict[rootkey]
-        root=self.kvstore[rootkey]
-        self.expiring_root_dict[rootkey]=root
-        return root
-
-    def _do_callback_action(self,ack,action,respond):
-        # if logging.root.level<=logging.DEBUG:
-        #     self.profiler.start()
-        ack()#find a way of threading that maybe?
+        with instrumentation.span("treenodeui.get_root") as span:
+            if rootkey in self.expiring_root_dict:
+                span.set(cache_hit=True)
+                return self.expiring_root_dict[rootkey]
+            span.set(cache_hit=False)
+            root=self.kvstore[rootkey]
+            self.expiring_root_dict[rootkey]=root
+            return root
+
+    def _is_searchable(self,rootkey:str)->bool:
+        """whether the tree was posted with searchable=True, which is recorded by its search index being stored alongside it, rather than on the root
+        (a root from a MappedTree is stored as just a reference to it, so nothing set on it survives being reloaded)"""
+        searchable=self._searchable_roots.get(rootkey)
+        if searchable is None:
+            searchable=self._searchable_roots[rootkey]=rootkey+search_index_key_suffix in self.kvstore
+        return searchable
+
+    def _get_search_index(self,rootkey:str)->_SearchIndex:
+        key=rootkey+search_index_key_suffix
+        if key in self.expiring_root_dict:
+            return self.expiring_root_dict[key]
+        search_index=self.kvstore[key]
+        self.expiring_root_dict[key]=search_index
+        return search_index
+
+    def _do_callback_action(self,ack,action,respond,body=None):
+        ack()
+        target=self._render_target(respond,body)
+        if self._dispatcher:
+            self._dispatcher.submit(self._rerender_for_action,action,target,key=self._dispatcher.key_for(body),request=DispatchedRequest("TreeNodeUI",body,None,respond))
+            return None
+        return self._rerender_for_action(action,target)
+
+    def _render_target(self,respond,body:Optional[dict])->_RenderTarget:
+        """Where a click's rerender goes, the view it was in if it was in a modal or App Home, otherwise the message"""
+        body=body or {}
+        if body.get('container',{}).get('type')=='view' and body.get('view'):
+            return _ViewTarget(self._slack_chat_client,body['view'],body.get('user',{}).get('id'))
+        return _MessageTarget(respond)
+
+    def _rerender_for_action(self,action,target:_RenderTarget):
+        with instrumentation.span("treenodeui.click") as span,profiling.profiled("treenodeui.click"):
+            rootkey,expandpointer=self._pointer_for_action(action)
+            with self._inflight_lock:
+                inflight=self._inflight_renders.get(rootkey)
+                if inflight is not None: #the message is already being rendered, so the render in flight will render this state too once it's done, unless a newer click comes first
+                    if inflight.newest_pointer()!=expandpointer:
+                        inflight.pending=(expandpointer,target)
+                    span.set(coalesced=True)
+                    return None
+                if self._recently_rendered is not None and self._recently_rendered.get(rootkey)==expandpointer:
+                    span.set(coalesced=True)
+                    return None
+                inflight=self._inflight_renders[rootkey]=_InflightRender(expandpointer)
+            try:
+                while True:
+                    response=self._render_and_post(rootkey,expandpointer,target)
+                    with self._inflight_lock:
+                        if inflight.pending is None:
+                            del self._inflight_renders[rootkey]
+                            if self._recently_rendered is not None:
+                                if _post_succeeded(response):
+                                    self._recently_rendered[rootkey]=expandpointer
+                                else: #so retrying the click isn't ignored as a duplicate
+                                    self._recently_rendered.pop(rootkey,None)
+                            return response
+                        (expandpointer,target),inflight.pending=inflight.pending,None
+                        inflight.pointer=expandpointer
+            except BaseException:
+                with self._inflight_lock:
+                    self._inflight_renders.pop(rootkey,None)
+                raise
+
+    def _do_search_action(self,ack,action,respond,body=None):
+        ack()
+        target=self._render_target(respond,body)
+        if self._dispatcher:
+            self._dispatcher.submit(self._rerender_for_search,action,target,key=self._dispatcher.key_for(body),request=DispatchedRequest("TreeNodeUI",body,None,respond))
+            return None
+        return self._rerender_for_search(action,target)
+
+    def _rerender_for_search(self,action,target:_RenderTarget):
+        with instrumentation.span("treenodeui.search") as span,profiling.profiled("treenodeui.search"):
+            rootkey,hit=self._deserialize_search_callback(action['action_id'])
+            query=(action.get('value') or "")[:MAX_SEARCH_QUERY_LENGTH] #the typed query for the search box, or the query the prev/next buttons carry
+            hits=self._get_search_index(rootkey).search(query)
+            span.set(hits=len(hits))
+            hit=hit%len(hits) if hits else 0
+            if self._recently_rendered is not None:
+                self._recently_rendered.pop(rootkey,None) #the message isn't in that state any more
+            return self._render_and_post(rootkey,hits[hit] if hits else _ExpandPointer([0]),target,_SearchState(query,hit,len(hits)))
+
+    def _pointer_for_action(self,action)->Tuple[str,_ExpandPointer]:
         callback_data=action['action_id'][len(prefix_for_callback):]
         rootkey,expandpointer=self._deserialize_callback(callback_data)
         value = action['selected_option']['value'] if 'selected_option' in action and 'value' in action['selected_option'] else None
@@ -111,16 +273,11 @@ class TreeNodeUI:
                 expandpointer=expandpointer[:-1]
             else:
                 expandpointer=expandpointer.extend([int(value),0])
-        blocks=self._format_tree(rootkey,expandpointer=expandpointer)
-        response=respond(replace_original=True,blocks=blocks)
-        if isinstance(response, WebhookResponse):
-            if response.status_code!=200:
-                respond(f"error in slack handling: {response.body}",replace_original=False)
-                print(f"{datetime.datetime.now()}: error in slack handling: {response.body}")
-        return response
-        # if logging.root.level<=logging.DEBUG:
-        #     self.profiler.stop()
-        #     print(self.profiler.output_text(unicode=True, color=True))
+        return rootkey,expandpointer
+
+    def _render_and_post(self,rootkey:str,expandpointer:_ExpandPointer,target:_RenderTarget,search:Optional[_SearchState]=None):
+        blocks=self._format_tree(rootkey,expandpointer=expandpointer,search=search,block_limit=target.block_limit)
+        return target.post(blocks)
 
     @staticmethod
     def _button_to_replace_block(button_text:str,rootkey:str,expandpointer:_ExpandPointer,**format_options):
@@ -137,6 +294,15 @@ class TreeNodeUI:
         serialized_pointer=','.join([str(v) for v in expandpointer])
         return f"{prefix_for_callback}{rootkey}^{serialized_pointer}"
 
+    @staticmethod
+    def _serialize_search_callback(rootkey:str,hit:int,control:str)->str:
+        return f"{prefix_for_search_callback}{rootkey}^{hit}^{control}" #the control just keeps the action_ids of the search box and buttons distinct
+
+    @staticmethod
+    def _deserialize_search_callback(action_id:str)->Tuple[str,int]:
+        rootkey,hit,_=action_id[len(prefix_for_search_callback):].rsplit('^',2)
+        return rootkey,int(hit)
+
     @staticmethod
     def _deserialize_callback(data:str)->Tuple[str,_ExpandPointer]:
         rootkey,serialized_pointer=data.rsplit('^', 1)
@@ -144,26 +310,17 @@ class TreeNodeUI:
         expandpointer=_ExpandPointer([int(p) for p in pointerelems])
         return rootkey,expandpointer
 
-    def _format_tree(self,rootkey:str,*,expandpointer:_ExpandPointer=_ExpandPointer([0]),expand_first=False):
-        root=self._get_root(rootkey)
-        if expand_first and root.children_containers:
-            if isinstance(root.children_containers[0],ChildNodeContainer):
-                expandpointer=_ExpandPointer([0,0,0])
-            elif isinstance(root.children_containers[0],ChildNodeMenuContainer):
-                expandpointer=_ExpandPointer([0,0,0,0])
-        diminish_pageination_by=0
-        blocks_to_return =  self._format_tree_recursive(
-                        parentnodes=[root],
-                        expandpointer=expandpointer,
-                        ancestral_pointer=_ExpandPointer([]),
-                        rootkey=rootkey,
-                        parents_pagination=1,
-                        diminish_pageination_by=0
-                    )
-        if len(blocks_to_return)>50:#this could probably be made more efficient, but for now, this should suffice
-            while len(blocks_to_return)>49:
-                diminish_pageination_by+=1
-                blocks_to_return =  self._format_tree_recursive(
+    def _format_tree(self,rootkey:str,*,expandpointer:_ExpandPointer=_ExpandPointer([0]),expand_first=False,search:Optional[_SearchState]=None,block_limit:int=MESSAGE_BLOCK_LIMIT):
+        with instrumentation.span("treenodeui.render") as span:
+            root=self._get_root(rootkey)
+            search_blocks=self._search_blocks(rootkey,search) if self._is_searchable(rootkey) else []
+            if expand_first and root.children_containers:
+                if isinstance(root.children_containers[0],ChildNodeContainer):
+                    expandpointer=_ExpandPointer([0,0,0])
+                elif isinstance(root.children_containers[0],ChildNodeMenuContainer):
+                    expandpointer=_ExpandPointer([0,0,0,0])
+            diminish_pageination_by=self._diminish_pageination_to_fit(root,expandpointer,block_limit=block_limit-len(search_blocks)) #worked out from the block counts, before building any blocks
+            blocks_to_return =  search_blocks + self._format_tree_recursive(
                             parentnodes=[root],
                             expandpointer=expandpointer,
                             ancestral_pointer=_ExpandPointer([]),
@@ -171,8 +328,72 @@ class TreeNodeUI:
                             parents_pagination=1,
                             diminish_pageination_by=diminish_pageination_by
                         )
-            blocks_to_return.append(ContextBlock(elements=[MarkdownTextObject(text="(blocks were repaginated to avoid exceeding slack limits)")]))
-        return blocks_to_return
+            if diminish_pageination_by:
+                if self._preserialize_blocks:
+                    blocks_to_return.append({"type":"context","elements":[{"type":"mrkdwn","text":REPAGINATED_TEXT}]})
+                else:
+                    blocks_to_return.append(ContextBlock(elements=[MarkdownTextObject(text=REPAGINATED_TEXT)]))
+            span.set(blocks=len(blocks_to_return),repaginations=diminish_pageination_by)
+            return blocks_to_return
+
+    def _diminish_pageination_to_fit(self,root:TreeNode,expandpointer:_ExpandPointer,block_limit:int=MESSAGE_BLOCK_LIMIT)->int:
+        """How much the pageination must be diminished by for the render to fit in block_limit, slack's limit for where it's going (leaving room for the repagination notice, if it's needed at all)"""
+        total,max_pageination=self._count_tree_blocks([root],[0,_node_block_count(root)],expandpointer,1,0)
+        if total<=block_limit:
+            return 0
+        diminish_pageination_by=1
+        while self._count_tree_blocks([root],[0,_node_block_count(root)],expandpointer,1,diminish_pageination_by)[0]>block_limit-1:
+            if diminish_pageination_by>=max_pageination-1: #every page is already down to a single node, so diminishing further changes nothing
+                logger.warning(f"tree can't be paginated to within slack's block limit, posting anyway with {total} blocks")
+                break
+            diminish_pageination_by+=1
+        return diminish_pageination_by
+
+    def _search_blocks(self,rootkey:str,search:Optional[_SearchState])->list:
+        """The search box, and if a search was made, which match is showing and buttons to the previous and next ones"""
+        blocks:list[Block]=[InputBlock(label="Search this tree",dispatch_action=True,optional=True,element=PlainTextInputElement(
+            action_id=self._serialize_search_callback(rootkey,0,"query"),
+            placeholder="every word must match",
+            initial_value=search.query if search else None,
+            dispatch_action_config=DispatchActionConfig(trigger_actions_on=["on_enter_pressed"])))]
+        if search:
+            status=f"match {search.hit+1} of {search.total} for _{search.query}_" if search.total else f"no matches for _{search.query}_"
+            blocks.append(ContextBlock(elements=[MarkdownTextObject(text=status)]))
+            if search.total>1:
+                blocks.append(ActionsBlock(elements=[
+                    ButtonElement(text=":arrow_up_small: previous match",action_id=self._serialize_search_callback(rootkey,search.hit-1,"prev"),value=search.query),
+                    ButtonElement(text=":arrow_down_small: next match",action_id=self._serialize_search_callback(rootkey,search.hit+1,"next"),value=search.query)]))
+        return [block.to_dict() for block in blocks] if self._preserialize_blocks else blocks
+
+    def _count_tree_blocks(self,
+                    parentnodes:list[TreeNode],
+                    block_prefix_sums:Optional[list[int]],
+                    expandpointer:_ExpandPointer,
+                    parents_pagination:int,
+                    diminish_pageination_by:int
+                )->Tuple[int,int]:
+        """The number of blocks _format_tree_recursive would return with these args, and the largest pageination along the way, from the precomputed block counts.
+        This must mirror _format_tree_recursive exactly.
+        """
+        max_pageination=parents_pagination
+        parents_pagination=parents_pagination if not diminish_pageination_by else max(1,parents_pagination-diminish_pageination_by)
+        child_insert,remaining_expandpointer=expandpointer[0],expandpointer[1:]
+        num_parents=len(parentnodes)
+        start_at=self._startat(child_insert,parents_pagination)
+        end_at=self._endat(start_at,parents_pagination,num_parents)
+        if block_prefix_sums is not None:
+            total=block_prefix_sums[end_at]-block_prefix_sums[start_at]
+        else: #a VirtualChildContainer, whose children are only built a page at a time
+            total=sum(_node_block_count(node) for node in parentnodes[start_at:end_at])
+        if remaining_expandpointer:
+            new_parent=parentnodes[child_insert]
+            selected_container,child_nodes,child_prefix_sums,child_expandpointer=_selected_child_nodes(new_parent,remaining_expandpointer)
+            child_total,child_max_pageination=self._count_tree_blocks(child_nodes,child_prefix_sums,child_expandpointer,selected_container.child_pageination,diminish_pageination_by)
+            total+=child_total
+            max_pageination=max(max_pageination,child_max_pageination)
+        if start_at>0 or end_at<num_parents: #the prev/next buttons
+            total+=1
+        return total,max_pageination
 
     def _format_tree_recursive(self,
                     parentnodes:list[TreeNode],
@@ -187,13 +408,15 @@ class TreeNodeUI:
                 num_parents=len(parentnodes)
                 start_at=self._startat(child_insert,parents_pagination)
                 end_at=self._endat(start_at,parents_pagination,num_parents)
+                page=parentnodes[start_at:end_at] #sliced once, so only the visible page of a VirtualChildContainer's children is built
+                pointed_node=page[child_insert-start_at]
                 blocks:list[Block]=[]
-                before_blocks=[blocks for number,node in enumerate(parentnodes[start_at:child_insert],start_at) for blocks in self._formatblock(node,ancestral_pointer.append(number),rootkey)]
+                before_blocks=[blocks for number,node in enumerate(page[:child_insert-start_at],start_at) for blocks in self._formatblock(node,ancestral_pointer.append(number),rootkey)]
                 blocks.extend(before_blocks)
-                blocks_for_pointed_node=self._formatblock(parentnodes[child_insert],ancestral_pointer.append(child_insert),rootkey,remaining_expandpointer)
+                blocks_for_pointed_node=self._formatblock(pointed_node,ancestral_pointer.append(child_insert),rootkey,remaining_expandpointer)
                 blocks.extend(blocks_for_pointed_node)
                 if remaining_expandpointer:#if there are more nodes to expand in the pointer list
-                    new_parent=parentnodes[child_insert]
+                    new_parent=pointed_node
                     children_containers=new_parent.children_containers
                     if remaining_expandpointer[0] > len(new_parent.children_containers):    #transitional
                         remaining_expandpointer=_ExpandPointer([0,0])
@@ -203,7 +426,7 @@ class TreeNodeUI:
                     selected_container=children_containers[container_opened_index]
                     if isinstance(selected_container,ChildNodeContainer):
                         selected_container_blocks=self._format_tree_recursive(
-                            parentnodes=selected_container.child_nodes if selected_container.child_nodes else [TreeNode("_(this pane is empty)_")],
+                            parentnodes=selected_container.child_nodes if selected_container.child_nodes else [TreeNode(EMPTY_PANE_TEXT)],
                             parents_pagination=selected_container.child_pageination,
                             expandpointer=remaining_expandpointer[1:],
                             ancestral_pointer=ancestral_pointer.append(child_insert).append(remaining_expandpointer[0]),
@@ -213,7 +436,7 @@ class TreeNodeUI:
                     else: 
                         assert isinstance(selected_container,ChildNodeMenuContainer)
                         selected_container_blocks=self._format_tree_recursive(
-                            parentnodes=selected_container.child_nodes[remaining_expandpointer[1]] if selected_container.child_nodes and selected_container.child_nodes[remaining_expandpointer[1]] else [TreeNode("_(this pane is empty)_")],
+                            parentnodes=selected_container.child_nodes[remaining_expandpointer[1]] if selected_container.child_nodes and selected_container.child_nodes[remaining_expandpointer[1]] else [TreeNode(EMPTY_PANE_TEXT)],
                             parents_pagination=selected_container.child_pageination,
                             expandpointer=remaining_expandpointer[2:],#since this contains multiple lists of nodes, we need two pointer indexes to find the next node to show
                             ancestral_pointer=ancestral_pointer.append(child_insert).append(remaining_expandpointer[0]).append(remaining_expandpointer[1]),
@@ -223,7 +446,7 @@ class TreeNodeUI:
                     blocks.extend(selected_container_blocks)
 
 
-                after_blocks= [blocks for number,node in enumerate(parentnodes[child_insert+1:end_at],child_insert+1) for blocks in self._formatblock(node,ancestral_pointer.append(number),rootkey)]
+                after_blocks= [blocks for number,node in enumerate(page[child_insert-start_at+1:],child_insert+1) for blocks in self._formatblock(node,ancestral_pointer.append(number),rootkey)]
                 blocks.extend(after_blocks)
                 navig_blocks=self._make_prev_next_buttons(usePrev=start_at>0,useNext=end_at<num_parents,
                 prev_callback=(rootkey,ancestral_pointer.append(start_at-parents_pagination if start_at-parents_pagination>0 else 0)),
@@ -237,6 +460,8 @@ class TreeNodeUI:
                 pointer_to_block:_ExpandPointer,
                 rootkey:str,
                 remaining_expandpointer:_ExpandPointer=None):
+        if self._preserialize_blocks:
+            return self._formatblock_dicts(node,pointer_to_block,rootkey,remaining_expandpointer)
         blocks:list[Block]=[]
         if isinstance(node.formatblocks,list):
             blocks.extend(node.formatblocks)
@@ -246,11 +471,7 @@ class TreeNodeUI:
             blocks.append(simple_slack_block(node.formatblocks))
 
         def format_nth_container(n):
-            if not remaining_expandpointer or remaining_expandpointer[0]!=n:
-                return node.children_containers[n].format_container(rootkey,pointer_to_block.append(n),-1)
-            else:
-                child_selected=remaining_expandpointer[1] if isinstance(node.children_containers[n],ChildNodeMenuContainer) and len(remaining_expandpointer)>1 else 0
-                return node.children_containers[n].format_container(rootkey,pointer_to_block.append(n),child_selected)
+            return node.children_containers[n].format_container(rootkey,pointer_to_block.append(n),self._child_selected(node,n,remaining_expandpointer))
 
         if node.children_containers:
             if node.first_child_container_on_side and blocks and 'accessory' in blocks[0].attributes: #and not blocks[0].accessory
@@ -264,8 +485,40 @@ class TreeNodeUI:
 
         return blocks
 
-    def _make_prev_next_buttons(self,usePrev:bool,useNext:bool,prev_callback:Tuple[str,_ExpandPointer],next_callback:Tuple[str,_ExpandPointer])->Optional[ActionsBlock]:
+    def _formatblock_dicts(self,
+                    node:TreeNode,
+                pointer_to_block:_ExpandPointer,
+                rootkey:str,
+                remaining_expandpointer:_ExpandPointer=None)->list[dict]:
+        """_formatblock for preserialize_blocks mode, assembling the node's blocks from dicts serialized when the tree was stored"""
+        block_dicts,first_takes_accessory=_node_serialized_blocks(node)
+        blocks=list(block_dicts) #the dicts are shared by every render, so they're copied before being changed, never changed in place
+        def format_nth_container(n):
+            return _container_element_dict(node.children_containers[n],rootkey,pointer_to_block.append(n),self._child_selected(node,n,remaining_expandpointer))
+
+        if node.children_containers:
+            if node.first_child_container_on_side and first_takes_accessory:
+                blocks[0]={**blocks[0],"accessory":format_nth_container(0)}
+                start_at=1
+            else: start_at=0
+
+            after_blocks_container_elements=(format_nth_container(n) for n in range(start_at,len(node.children_containers)))
+
+            blocks.extend({"type":"actions","elements":buttons_chunk} for buttons_chunk in chunked(after_blocks_container_elements,ActionsBlock.elements_max_length))
+
+        return blocks
+
+    @staticmethod
+    def _child_selected(node:TreeNode,n:int,remaining_expandpointer:Optional[_ExpandPointer])->int:
+        """which child of the node's nth container is expanded, or -1 if it isn't expanded"""
+        if not remaining_expandpointer or remaining_expandpointer[0]!=n:
+            return -1
+        return remaining_expandpointer[1] if isinstance(node.children_containers[n],ChildNodeMenuContainer) and len(remaining_expandpointer)>1 else 0
+
+    def _make_prev_next_buttons(self,usePrev:bool,useNext:bool,prev_callback:Tuple[str,_ExpandPointer],next_callback:Tuple[str,_ExpandPointer])->Optional[ActionsBlock|dict]:
         if (not usePrev) and (not useNext): return None
+        if self._preserialize_blocks:
+            return {"type":"actions","elements":[_button_dict(text,*callback) for use,text,callback in ((usePrev,":arrow_left:",prev_callback),(useNext,":arrow_right:",next_callback)) if use]}
         buttons=[]
         if(usePrev): buttons.append(self._button_to_replace_block(":arrow_left:",*prev_callback))
         if(useNext): buttons.append(self._button_to_replace_block(":arrow_right:",*next_callback))
@@ -284,6 +537,63 @@ class TreeNodeUI:
     
 
 
+class _SearchState:
+    def __init__(self,query:str,hit:int,total:int) -> None:
+        self.query=query
+        self.hit=hit #the index of the match being shown
+        self.total=total
+
+class _InflightRender:
+    def __init__(self,pointer:_ExpandPointer) -> None:
+        self.pointer=pointer #what's being rendered now
+        self.pending:Optional[Tuple[_ExpandPointer,_RenderTarget]]=None #the newest click since, to render next
+    def newest_pointer(self)->_ExpandPointer:
+        return self.pending[0] if self.pending else self.pointer
+
+
+class _RenderTarget:
+    """Where a rerendered tree is posted, and how many blocks it can hold there"""
+    block_limit=MESSAGE_BLOCK_LIMIT
+    def post(self,blocks:list):...
+
+class _MessageTarget(_RenderTarget):
+    def __init__(self,respond:Respond) -> None:
+        self.respond=respond
+    def post(self,blocks:list):
+        response=TreeNodeUI._post_blocks(self.respond,replace_original=True,blocks=blocks)
+        if isinstance(response, WebhookResponse):
+            if response.status_code!=200:
+                self.respond(f"error in slack handling: {response.body}",replace_original=False)
+                logger.error(f"error in slack handling: {response.body}")
+        return response
+
+class _ViewTarget(_RenderTarget):
+    block_limit=VIEW_BLOCK_LIMIT
+    def __init__(self,client,view:dict,user_id:Optional[str]) -> None:
+        """A modal, updated in place, or an App Home tab, republished"""
+        self.client=client
+        self.view=view
+        self.user_id=user_id
+    def post(self,blocks:list):
+        view={key:self.view[key] for key in ("type","title","close","submit","callback_id","private_metadata","clear_on_close","notify_on_close") if self.view.get(key) is not None}
+        view["blocks"]=_blocks_as_dicts(blocks)
+        if self.view.get("type")=="home":
+            return TreeNodeUI._post_blocks(self.client.views_publish,user_id=self.user_id,view=view)
+        return TreeNodeUI._post_blocks(self.client.views_update,view_id=self.view["id"],view=view) #not passing the hash, as the tree is the only thing changing the view
+
+def _post_succeeded(response)->bool:
+    """whether a _RenderTarget's post updated the message or view, as far as its response shows"""
+    if isinstance(response,SlackResponse) and not response.get("ok",False):
+        return False
+    return getattr(response,"status_code",200)==200
+
+def _blocks_as_dicts(blocks:list)->list[dict]:
+    return [block if isinstance(block,dict) else block.to_dict() for block in blocks] #views are sent as json, which Blocks nested in the view dict wouldn't be converted for
+
+def _view_title(text:str)->str:
+    return text if len(text)<=MAX_VIEW_TITLE_LENGTH else text[:MAX_VIEW_TITLE_LENGTH-1]+"…"
+
+
 class TreeNode:
     """The basic building block of this UI library, a Node has it's own Blocks, under formatblocks, and optionally, one or more child_containers containing one or more child nodes which can be expanded
     If there is only one childNodeContainer it will by default be placed on the side of the first formatblock
@@ -351,11 +661,19 @@ class ChildNodeContainer:
     child_nodes:list[TreeNode]
     child_pageination:int=10
     def format_container(self,rootkey:str,pointer_to_container:_ExpandPointer,child_already_selected:int=-1)->InteractiveElement:...
+    def callback_pointer(self,pointer_to_container:_ExpandPointer,child_already_selected:int=-1)->Optional[_ExpandPointer]:
+        """The pointer format_container puts in the element's action_id, if the action_id is the only part of the element which depends on the rootkey and pointer.
+        If it is, in preserialize_blocks mode the element is serialized once per selection and only the action_id is patched in each render. Returning None builds it every render.
+        """
+        return None
 
 class ChildNodeMenuContainer:
     child_nodes:list[list[TreeNode]]
     child_pageination:int=10
     def format_container(self,rootkey:str,pointer_to_container:_ExpandPointer,child_already_selected:int=-1,)->InteractiveElement:...
+    def callback_pointer(self,pointer_to_container:_ExpandPointer,child_already_selected:int=-1)->Optional[_ExpandPointer]:
+        """See ChildNodeContainer.callback_pointer"""
+        return None
 
 
 class ButtonChildContainer(ChildNodeContainer):
@@ -372,11 +690,15 @@ class ButtonChildContainer(ChildNodeContainer):
     def format_container(self, rootkey:str,pointer_to_container:_ExpandPointer, child_already_selected:int=-1) -> InteractiveElement:
         if child_already_selected == -1:#if not already selected then it should be an expand button
             return TreeNodeUI._button_to_replace_block(rootkey=rootkey,
-                                                       expandpointer=pointer_to_container.append(0) #appending 0 to point to first node contained within this button
+                                                       expandpointer=self.callback_pointer(pointer_to_container,child_already_selected)
                                                        ,button_text=self.expand_button_format_string.format(len(self.child_nodes)))
         else:
-            return TreeNodeUI._button_to_replace_block(rootkey=rootkey,expandpointer=pointer_to_container[:-1] #slicing off the last one to collapse this container and only show it's containing node
+            return TreeNodeUI._button_to_replace_block(rootkey=rootkey,expandpointer=self.callback_pointer(pointer_to_container,child_already_selected)
                                                        ,button_text=self.collapse_button_format_string.format(len(self.child_nodes)),style="danger")
+    def callback_pointer(self,pointer_to_container:_ExpandPointer,child_already_selected:int=-1)->_ExpandPointer:
+        if child_already_selected == -1:
+            return pointer_to_container.append(0) #appending 0 to point to first node contained within this button
+        return pointer_to_container[:-1] #slicing off the last one to collapse this container and only show it's containing node
     @staticmethod
     def forJsonDetails(jsonlike:list|dict,name:str="details",pageination=15,optimize_blocks=True):
         children,numchildren=_jsonlike_to_treenode_and_truenum_children(jsonlike,optimize_blocks=optimize_blocks,_level=0,pageination=pageination)
@@ -387,6 +709,62 @@ class ButtonChildContainer(ChildNodeContainer):
                             child_pageination=pageination)
 
 
+class VirtualChildContainer(ButtonChildContainer):
+    """A button whose children come from a ChildNodeProvider (see providers.py), for containers over results too big to build as TreeNodes up front.
+    Only the page of children being shown is built, on each render. The children aren't searched by searchable trees.
+    """
+    def __init__(self,provider:ChildNodeProvider,expand_button_format_string:str=NAMELESS_FMT_STR_EXPAND,collapse_button_format_string:str=NAMELESS_FMT_STR_COLLAPSE,static_button_text:Optional[str]=None,child_pageination:int=10):
+        super().__init__([],expand_button_format_string,collapse_button_format_string,static_button_text,child_pageination)
+        self.child_nodes=_VirtualChildNodes(provider) # type: ignore
+
+    @property
+    def provider(self)->ChildNodeProvider:
+        return self.child_nodes.provider # type: ignore
+
+class _VirtualChildNodes(Sequence):
+    """A read only list of a provider's nodes, which only builds the ones sliced out of it, and keeps the last slice, since a render slices the same page more than once"""
+    def __init__(self,provider:ChildNodeProvider) -> None:
+        self.provider=provider
+        self._length:Optional[int]=None
+        self._window:Tuple[int,list[TreeNode]]=(0,[]) #a single attribute, so it's replaced atomically
+
+    def __len__(self)->int:
+        if self._length is None: #counted once, so the number of children stays consistent with the pointers already in the message
+            self._length=self.provider.row_count()
+        return self._length
+
+    @overload
+    def __getitem__(self,index:int)->TreeNode: ...
+    @overload
+    def __getitem__(self,index:slice)->list[TreeNode]: ...
+    def __getitem__(self,index):
+        if isinstance(index,slice):
+            start,stop,step=index.indices(len(self))
+            if step!=1: raise ValueError("VirtualChildContainer children can only be sliced contiguously")
+            return self._get_range(start,max(start,stop))
+        if index<0: index+=len(self)
+        if not 0<=index<len(self): raise IndexError(index)
+        return self._get_range(index,index+1)[0]
+
+    def _get_range(self,start:int,stop:int)->list[TreeNode]:
+        window_start,window=self._window
+        if window_start<=start and stop<=window_start+len(window):
+            return window[start-window_start:stop-window_start]
+        nodes=list(self.provider.get_range(start,stop))
+        self._window=(start,nodes)
+        return nodes
+
+    def __iter__(self): #in pages, rather than Sequence's one index at a time
+        for start in range(0,len(self),1000):
+            yield from self._get_range(start,min(start+1000,len(self)))
+
+    def __getstate__(self):
+        return self.provider,self._length #not the built nodes
+    def __setstate__(self,state):
+        self.provider,self._length=state
+        self._window=(0,[])
+
+
 class MenuOption:
     def __init__(self,label:str,nodes:list[TreeNode]|TreeNode):
         self.label=label
@@ -403,6 +781,8 @@ class StaticSelectMenuChildContainer(ChildNodeMenuContainer):
         self.placeholder=placeholder
         self.options_for_menu=[Option(value=str(i),label=labels[i]) for i in range(len(labels))]
         self.child_pageination=child_pageination
+    def callback_pointer(self,pointer_to_container:_ExpandPointer,child_already_selected:int=-1)->_ExpandPointer:
+        return pointer_to_container
     def format_container(self, rootkey:str,pointer_to_container:_ExpandPointer, child_already_selected:int=-1) -> InteractiveElement:
         if child_already_selected == -1: #not already selected
             return StaticSelectElement(placeholder=self.placeholder or "",action_id=TreeNodeUI._serialize_callback(rootkey,pointer_to_container),
@@ -418,6 +798,8 @@ class OverflowMenuChildContainer(ChildNodeMenuContainer):
         self.child_nodes=list(i.nodes for i in menu_options_and_associated_nodes)
         self.options_for_menu=[Option(value=str(i),label=labels[i]) for i in range(len(labels))]
         self.child_pageination=child_pageination
+    def callback_pointer(self,pointer_to_container:_ExpandPointer,child_already_selected:int=-1)->_ExpandPointer:
+        return pointer_to_container
     def format_container(self, rootkey:str,pointer_to_container:_ExpandPointer, child_already_selected:int=-1) -> InteractiveElement:
         if child_already_selected == -1: #not already selected
             return OverflowMenuElement(action_id=TreeNodeUI._serialize_callback(rootkey,pointer_to_container),options=self.options_for_menu)
@@ -434,6 +816,8 @@ class RadioButtonChildContainer(ChildNodeMenuContainer):
         self.child_nodes=list(i.nodes for i in menu_options_and_associated_nodes)
         self.options_for_menu=[Option(value=str(i),label=labels[i]) for i in range(len(labels))]
         self.child_pageination=child_pageination
+    def callback_pointer(self,pointer_to_container:_ExpandPointer,child_already_selected:int=-1)->_ExpandPointer:
+        return pointer_to_container
     def format_container(self, rootkey:str,pointer_to_container:_ExpandPointer, child_already_selected:int=-1) -> InteractiveElement:
         if child_already_selected == -1: #not already selected
             return RadioButtonsElement(action_id=TreeNodeUI._serialize_callback(rootkey,pointer_to_container),options=self.options_for_menu)
@@ -448,6 +832,199 @@ class RadioButtonChildContainer(ChildNodeMenuContainer):
 
 
 
+def _node_block_count(node:TreeNode)->int:
+    """The number of blocks _formatblock makes for this node, whether or not any of its containers are selected"""
+    block_count=getattr(node,"_block_count",None)
+    if block_count is None: #not indexed yet, or stored before block counts were
+        block_count=node._block_count=_compute_node_block_count(node)
+    return block_count
+
+def _compute_node_block_count(node:TreeNode)->int:
+    formatblocks=node.formatblocks
+    if isinstance(formatblocks,list):
+        block_count=len(formatblocks)
+        has_accessory=bool(formatblocks) and 'accessory' in formatblocks[0].attributes
+    elif isinstance(formatblocks,Block):
+        block_count=1
+        has_accessory='accessory' in formatblocks.attributes
+    elif isinstance(formatblocks,str) and formatblocks:
+        block_count=1
+        has_accessory=True #a SectionBlock
+    else:
+        block_count=0
+        has_accessory=False
+    if node.children_containers:
+        on_side=1 if node.first_child_container_on_side and has_accessory else 0
+        block_count+=-(-(len(node.children_containers)-on_side)//ActionsBlock.elements_max_length) #ActionsBlocks of the remaining containers
+    return block_count
+
+def _block_prefix_sums(container:ChildNodeContainer|ChildNodeMenuContainer,option:Optional[int]=None)->Optional[list[int]]:
+    """Cumulative block counts of a container's child nodes (of the given option, for a menu), so the blocks in any page of them are a subtraction.
+    None for a VirtualChildContainer, whose children aren't all built.
+    """
+    prefix_sums=getattr(container,"_block_prefix_sums",None)
+    if prefix_sums is None:
+        prefix_sums=container._block_prefix_sums=_compute_block_prefix_sums(container)
+    return prefix_sums if option is None or prefix_sums is None else prefix_sums[option]
+
+def _compute_block_prefix_sums(container:ChildNodeContainer|ChildNodeMenuContainer)->Optional[list]:
+    if isinstance(container,VirtualChildContainer):
+        return None
+    def prefix_sums(nodes:list[TreeNode])->list[int]:
+        sums=[0]
+        for node in nodes or [TreeNode(EMPTY_PANE_TEXT)]:
+            sums.append(sums[-1]+_node_block_count(node))
+        return sums
+    if isinstance(container,ChildNodeMenuContainer):
+        return [prefix_sums(nodes) for nodes in container.child_nodes]
+    return prefix_sums(container.child_nodes)
+
+def _children_in_memory(container:ChildNodeContainer|ChildNodeMenuContainer)->bool:
+    """False for containers whose children are only loaded as they're shown, eg VirtualChildContainers and the containers of a MappedTree, which walking the tree mustn't load"""
+    if isinstance(container,ChildNodeMenuContainer):
+        return isinstance(container.child_nodes,list) and all(isinstance(child_nodes,list) or not child_nodes for child_nodes in container.child_nodes)
+    return isinstance(container.child_nodes,list)
+
+def _walk_tree(root:TreeNode)->Iterable[TreeNode]:
+    """Every node in the tree, once each, even if a node appears under more than one parent. Children which aren't in memory are skipped."""
+    stack=[root]
+    seen=set()
+    while stack:
+        node=stack.pop()
+        if id(node) in seen: continue
+        seen.add(id(node))
+        yield node
+        for container in node.children_containers:
+            if not _children_in_memory(container): continue
+            child_lists=container.child_nodes if isinstance(container,ChildNodeMenuContainer) else [container.child_nodes]
+            for child_nodes in child_lists:
+                stack.extend(child_nodes or [])
+
+def _index_block_counts(root:TreeNode):
+    """Precomputes the block count of every node, and the prefix sums of every container, throughout the tree"""
+    for node in _walk_tree(root):
+        node._block_count=_compute_node_block_count(node)
+    for node in _walk_tree(root): #a second pass, once every node's count is known
+        for container in node.children_containers:
+            if _children_in_memory(container): #otherwise they're computed when needed, or were already, when compiling a MappedTree
+                container._block_prefix_sums=_compute_block_prefix_sums(container)
+
+def _preserialize_tree(root:TreeNode):
+    """Serializes the blocks of every node, and the elements of every container in each of its selection states, throughout the tree"""
+    for node in _walk_tree(root):
+        node._serialized_blocks=_compute_node_serialized_blocks(node)
+        for container in node.children_containers:
+            selections=range(len(container.child_nodes)) if isinstance(container,ChildNodeMenuContainer) else [0]
+            for child_already_selected in (-1,*selections):
+                _container_element_template(container,child_already_selected)
+
+def _node_serialized_blocks(node:TreeNode)->Tuple[list[dict],bool]:
+    """The node's own blocks as dicts, and whether the first of them can take an accessory"""
+    serialized_blocks=getattr(node,"_serialized_blocks",None)
+    if serialized_blocks is None: #stored without preserialize_blocks, or before it existed
+        serialized_blocks=node._serialized_blocks=_compute_node_serialized_blocks(node)
+    return serialized_blocks
+
+def _compute_node_serialized_blocks(node:TreeNode)->Tuple[list[dict],bool]:
+    formatblocks=node.formatblocks
+    if isinstance(formatblocks,list):
+        blocks=formatblocks
+    elif isinstance(formatblocks,Block):
+        blocks=[formatblocks]
+    elif isinstance(formatblocks,str) and formatblocks:
+        blocks=[simple_slack_block(formatblocks)]
+    else:
+        blocks=[]
+    return [block.to_dict() for block in blocks],bool(blocks) and 'accessory' in blocks[0].attributes
+
+def _container_element_template(container:ChildNodeContainer|ChildNodeMenuContainer,child_already_selected:int)->dict:
+    templates=getattr(container,"_element_templates",None)
+    if templates is None:
+        templates=container._element_templates={}
+    template=templates.get(child_already_selected)
+    if template is None: #the action_id is patched in on every render, so the rootkey and pointer here don't matter
+        template=templates[child_already_selected]=container.format_container("",_ExpandPointer([0]),child_already_selected).to_dict()
+    return template
+
+def _container_element_dict(container:ChildNodeContainer|ChildNodeMenuContainer,rootkey:str,pointer_to_container:_ExpandPointer,child_already_selected:int)->dict:
+    callback_pointer=container.callback_pointer(pointer_to_container,child_already_selected) if hasattr(container,"callback_pointer") else None
+    if callback_pointer is None: #the element can't be templated, so it's built every render
+        return container.format_container(rootkey,pointer_to_container,child_already_selected).to_dict()
+    return {**_container_element_template(container,child_already_selected),"action_id":TreeNodeUI._serialize_callback(rootkey,callback_pointer)}
+
+def _button_dict(button_text:str,rootkey:str,expandpointer:_ExpandPointer)->dict:
+    """what TreeNodeUI._button_to_replace_block(...).to_dict() returns, without building the ButtonElement"""
+    return {"type":"button","text":{"type":"plain_text","text":button_text,"emoji":True},"action_id":TreeNodeUI._serialize_callback(rootkey,expandpointer)}
+
+class _SearchIndex:
+    def __init__(self,root:TreeNode) -> None:
+        """An inverted index of the words in each node's text, to the pointers which expand the tree to show that node.
+        Nodes are numbered in the order they appear in the tree, so each word's list of nodes is sorted.
+        """
+        self.pointers:list[Tuple[int,...]]=[]
+        self.postings:dict[str,list[int]]={}
+        stack:list[Tuple[TreeNode,Tuple[int,...]]]=[(root,(0,))]
+        while stack:
+            node,pointer=stack.pop()
+            node_number=len(self.pointers)
+            self.pointers.append(pointer)
+            for word in set(_search_words(_node_search_text(node))):
+                self.postings.setdefault(word,[]).append(node_number)
+            children=[]
+            for c,container in enumerate(node.children_containers):
+                if not _children_in_memory(container): #too many to index, and not loaded until they're shown
+                    continue
+                if isinstance(container,ChildNodeMenuContainer):
+                    for option,child_nodes in enumerate(container.child_nodes):
+                        children.extend((child,pointer+(c,option,i)) for i,child in enumerate(child_nodes or []))
+                else:
+                    children.extend((child,pointer+(c,i)) for i,child in enumerate(container.child_nodes or []))
+            stack.extend(reversed(children)) #so they're popped in order
+
+    def search(self,query:str)->list[_ExpandPointer]:
+        """The pointers to every node containing all the words in the query, in the order they appear in the tree"""
+        words=set(_search_words(query))
+        if not words: return []
+        postings=sorted((self.postings.get(word,[]) for word in words),key=len) #intersecting from the rarest word keeps the sets small
+        matches=set(postings[0])
+        for posting in postings[1:]:
+            if not matches: break
+            matches.intersection_update(posting)
+        return [_ExpandPointer(self.pointers[node_number]) for node_number in sorted(matches)]
+
+def _search_words(text:str)->list[str]:
+    return re.findall(r"\w+",text.lower())
+
+def _node_search_text(node:TreeNode)->str:
+    formatblocks=node.formatblocks
+    if isinstance(formatblocks,str): return formatblocks
+    blocks=formatblocks if isinstance(formatblocks,list) else [formatblocks] if isinstance(formatblocks,Block) else []
+    texts:list[str]=[]
+    def collect(value):
+        if isinstance(value,dict):
+            for k,v in value.items():
+                if k=="text" and isinstance(v,str): texts.append(v)
+                else: collect(v)
+        elif isinstance(value,list):
+            for v in value: collect(v)
+    for block in blocks:
+        collect(block.to_dict())
+    return "\n".join(texts)
+
+def _selected_child_nodes(parent:TreeNode,remaining_expandpointer:_ExpandPointer):
+    """The container the pointer selects, and its child nodes, their prefix sums, and the rest of the pointer, as _format_tree_recursive resolves them"""
+    if remaining_expandpointer[0] > len(parent.children_containers):    #transitional
+        remaining_expandpointer=_ExpandPointer([0,0])
+    if len(remaining_expandpointer)==1:                                 #transitional
+        remaining_expandpointer=_ExpandPointer([0]).extend(remaining_expandpointer)
+    selected_container=parent.children_containers[remaining_expandpointer[0]]
+    if isinstance(selected_container,ChildNodeContainer):
+        return selected_container,selected_container.child_nodes or [TreeNode(EMPTY_PANE_TEXT)],_block_prefix_sums(selected_container),remaining_expandpointer[1:]
+    option=remaining_expandpointer[1]
+    child_nodes=selected_container.child_nodes[option] if selected_container.child_nodes and selected_container.child_nodes[option] else [TreeNode(EMPTY_PANE_TEXT)]
+    return selected_container,child_nodes,_block_prefix_sums(selected_container,option),remaining_expandpointer[2:]
+
+
 def _jsonlike_to_treenode_and_truenum_children(object,pageination:int=15,optimize_blocks:bool=True,name:str="",_level:int=0):
     indent="•"*_level
     object = _convert_jsonlike_to_dict(object,inline_child_if_solo=_level>0)
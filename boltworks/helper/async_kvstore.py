@@ -0,0 +1,282 @@
+"""KVStores for async code, which don't block the event loop on SQLite I/O or deserializing.
+
+```
+store=DiskCacheKVStore(Cache(DISK_CACHE_DIR)).using_serializer(dill).as_async()
+await store.aset("key",value)
+async with store.transact(key="key") as transaction:
+    await transaction.aset("key",await transaction.aget("key")+1)
+```
+
+and `store.as_sync()` gives a plain KVStore of the same data, for the components which take one (TreeNodeUI, ActionCallbacks, MsgThreadCallbacks).
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import threading
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Any, AsyncIterator, BinaryIO, Callable, Iterable, Mapping, Optional
+
+from .kvstore import KVStore
+
+_MISSING=object()
+
+
+class AsyncKVStore:
+    async def aget(self, key, default=_MISSING):
+        """the value for key, or default if it's missing, raising KeyError if no default is passed"""
+    async def aset(self, key, value, expire:Optional[float]=None):
+        """like KVStore.set"""
+    async def adelete(self, key)->bool:
+        """deletes the key, returning whether it was there"""
+    async def acontains(self, key)->bool:...
+    async def aexpire(self)->int:
+        """sweeps out all expired entries, returning the number removed"""
+
+    async def aget_many(self, keys:Iterable)->dict:
+        """the values of whichever of the keys are in the store"""
+    async def aset_many(self, items:Mapping, expire:Optional[float]=None):
+        """sets every item, atomically"""
+    async def adelete_many(self, keys:Iterable)->int:
+        """deletes the keys, returning the number which were there"""
+
+    #like KVStore's, which a store which doesn't implement them raises rather than returning None
+
+    async def alen(self)->int:
+        raise NotImplementedError(f"{type(self).__name__} doesn't support alen()")
+    async def akeys(self)->list:
+        """the keys in this store (or namespace), without its prefix, all at once"""
+        raise NotImplementedError(f"{type(self).__name__} doesn't support akeys()")
+    async def aclear(self)->int:
+        """deletes every entry in this store (or namespace), returning the number removed"""
+        raise NotImplementedError(f"{type(self).__name__} doesn't support aclear()")
+    async def aexport(self, stream:BinaryIO, namespaces:Optional[Iterable[str]]=None, compress:int=0)->int:
+        """like KVStore.export, the stream is written to off the event loop"""
+        raise NotImplementedError(f"{type(self).__name__} doesn't support aexport()")
+    async def aimport_(self, stream:BinaryIO, workers:int=1, batch_size:int=1000)->int:
+        """like KVStore.import_, the stream is read from off the event loop"""
+        raise NotImplementedError(f"{type(self).__name__} doesn't support aimport_()")
+
+    def transact(self, retry=False, key=None)->contextlib.AbstractAsyncContextManager[AsyncKVStore]:
+        """an async context manager making the operations on the store it yields atomic, like KVStore.transact.
+        Use only the yielded store inside it, as the transaction's lock may be held on another thread, which the store's own operations would wait on."""
+        ...
+
+    def namespaced(self,prefix:str)->AsyncKVStore:...
+
+    def as_sync(self)->KVStore:
+        """a KVStore of the same data, for code which isn't async"""
+        return SyncKVStoreAdapter(self)
+
+
+class ExecutorAsyncKVStore(AsyncKVStore):
+    def __init__(self,kvstore:KVStore,max_workers:int=4,executor:Optional[Executor]=None) -> None:
+        """Runs each operation on a KVStore, eg a DiskCacheKVStore, on a thread pool, so only that pool's threads wait on the disk. Usually made with KVStore.as_async.
+
+        Args:
+            kvstore (KVStore): the store, including its serializer if it has one, so deserializing is done on the pool too
+            max_workers (int, optional): the threads in the default pool, which bounds how many operations are run at once. Defaults to 4.
+            executor (Executor, optional): a pool to use instead, which may be shared with other stores
+        """
+        self._kvstore=kvstore
+        self._max_workers=max_workers
+        self._executor=executor or ThreadPoolExecutor(max_workers=max_workers,thread_name_prefix="boltworks-kvstore")
+
+    def _run(self,fn:Callable,*args,**kwargs)->asyncio.Future:
+        context=contextvars.copy_context() #so instrumentation spans on the pool nest under the caller's
+        return asyncio.get_running_loop().run_in_executor(self._executor,partial(context.run,fn,*args,**kwargs))
+
+    async def aget(self, key, default=_MISSING):
+        return await self._run(_get,self._kvstore,key,default)
+    async def aset(self, key, value, expire:Optional[float]=None):
+        await self._run(_set,self._kvstore,key,value,expire)
+    async def adelete(self, key)->bool:
+        return await self._run(_delete,self._kvstore,key)
+    async def acontains(self, key)->bool:
+        return await self._run(self._kvstore.__contains__,key)
+    async def aexpire(self)->int:
+        return await self._run(self._kvstore.expire)
+
+    #the bulk operations are each a single trip to the pool
+
+    async def aget_many(self, keys:Iterable)->dict:
+        return await self._run(_get_many,self._kvstore,list(keys))
+    async def aset_many(self, items:Mapping, expire:Optional[float]=None):
+        await self._run(_set_many,self._kvstore,dict(items),expire)
+    async def adelete_many(self, keys:Iterable)->int:
+        return await self._run(_delete_many,self._kvstore,list(keys))
+
+    async def alen(self)->int:
+        return await self._run(len,self._kvstore)
+    async def akeys(self)->list:
+        return await self._run(_keys,self._kvstore)
+    async def aclear(self)->int:
+        return await self._run(self._kvstore.clear)
+    async def aexport(self, stream:BinaryIO, namespaces:Optional[Iterable[str]]=None, compress:int=0)->int:
+        return await self._run(self._kvstore.export,stream,namespaces,compress)
+    async def aimport_(self, stream:BinaryIO, workers:int=1, batch_size:int=1000)->int:
+        return await self._run(self._kvstore.import_,stream,workers,batch_size)
+
+    @contextlib.asynccontextmanager
+    async def transact(self, retry=False, key=None)->AsyncIterator[AsyncKVStore]:
+        #diskcache transactions belong to the thread which began them, so everything in one runs on a thread of its own, rather than whichever of the pool's is free
+        thread=ThreadPoolExecutor(max_workers=1,thread_name_prefix="boltworks-kvstore-transaction")
+        transaction=_TransactionAsyncKVStore(self._kvstore,executor=thread)
+        context_manager=self._kvstore.transact(retry,key)
+        try:
+            await transaction._run(context_manager.__enter__)
+            try:
+                yield transaction
+            except BaseException as e:
+                if not await transaction._run(context_manager.__exit__,type(e),e,e.__traceback__):
+                    raise
+            else:
+                await transaction._run(context_manager.__exit__,None,None,None)
+        finally:
+            thread.shutdown(wait=False)
+
+    def namespaced(self,prefix:str)->AsyncKVStore:
+        return ExecutorAsyncKVStore(self._kvstore.namespaced(prefix),self._max_workers,self._executor)
+
+    def as_sync(self)->KVStore:
+        return self._kvstore #no need to go through the event loop to get back to it
+
+class _TransactionAsyncKVStore(ExecutorAsyncKVStore):
+    """The store inside an ExecutorAsyncKVStore's transaction, running everything on the transaction's thread"""
+    @contextlib.asynccontextmanager
+    async def transact(self, retry=False, key=None)->AsyncIterator[AsyncKVStore]:
+        yield self #already in one, and diskcache transactions nest anyway
+
+    def namespaced(self,prefix:str)->AsyncKVStore:
+        return _TransactionAsyncKVStore(self._kvstore.namespaced(prefix),executor=self._executor)
+
+
+def _get(kvstore:KVStore,key,default):
+    try:
+        return kvstore[key]
+    except KeyError:
+        if default is _MISSING: raise
+        return default
+
+def _set(kvstore:KVStore,key,value,expire:Optional[float]):
+    if expire is None:
+        kvstore[key]=value
+    else:
+        kvstore.set(key,value,expire=expire)
+
+def _delete(kvstore:KVStore,key)->bool:
+    try:
+        del kvstore[key]
+        return True
+    except KeyError:
+        return False
+
+def _get_many(kvstore:KVStore,keys:list)->dict:
+    found={}
+    for key in keys:
+        try:
+            found[key]=kvstore[key]
+        except KeyError:
+            pass
+    return found
+
+def _keys(kvstore:KVStore)->list:
+    return list(kvstore.keys()) #iterated on the pool, as iterating may read from the disk
+
+def _set_many(kvstore:KVStore,items:dict,expire:Optional[float]):
+    with kvstore.transact(retry=True): #one commit for all of them, rather than one each
+        for key,value in items.items():
+            _set(kvstore,key,value,expire)
+
+def _delete_many(kvstore:KVStore,keys:list)->int:
+    with kvstore.transact(retry=True):
+        return sum(_delete(kvstore,key) for key in keys)
+
+
+class SyncKVStoreAdapter(KVStore):
+    def __init__(self,async_kvstore:AsyncKVStore,loop:Optional[asyncio.AbstractEventLoop]=None) -> None:
+        """A KVStore over an AsyncKVStore, which runs each operation on an event loop and waits for it. Usually made with AsyncKVStore.as_sync.
+        It must not be used from a coroutine running on that loop, which would wait on itself.
+
+        Args:
+            async_kvstore (AsyncKVStore): the store
+            loop (asyncio.AbstractEventLoop, optional): a running loop, on another thread, to run the operations on. Defaults to a loop on a thread of the adapter's own.
+        """
+        self._async_kvstore=async_kvstore
+        self._loop=loop or _background_loop()
+        self._transaction=threading.local() #the store yielded by the transaction this thread is in, if any
+
+    def _store(self)->AsyncKVStore:
+        return getattr(self._transaction,"store",None) or self._async_kvstore
+
+    def _wait(self,coroutine)->Any:
+        return asyncio.run_coroutine_threadsafe(coroutine,self._loop).result()
+
+    def __getitem__(self, key): return self._wait(self._store().aget(key))
+    def __setitem__(self, key, value): self._wait(self._store().aset(key,value))
+    def __delitem__(self, key):
+        if not self._wait(self._store().adelete(key)):
+            raise KeyError(key)
+    def __contains__(self, key): return self._wait(self._store().acontains(key))
+
+    def set(self, key, value, expire:Optional[float]=None): self._wait(self._store().aset(key,value,expire=expire))
+    def expire(self): return self._wait(self._store().aexpire())
+
+    def __len__(self): return self._wait(self._store().alen())
+    def keys(self): return iter(self._wait(self._store().akeys()))
+    def clear(self): return self._wait(self._store().aclear())
+    def export(self, stream, namespaces=None, compress=0): return self._wait(self._store().aexport(stream,namespaces,compress))
+    def import_(self, stream, workers=1, batch_size=1000): return self._wait(self._store().aimport_(stream,workers,batch_size))
+
+    @contextlib.contextmanager
+    def transact(self, retry=False, key=None):
+        if getattr(self._transaction,"store",None) is not None: #nested
+            yield
+            return
+        entered:Future=Future()
+        outcome:list[Optional[BaseException]]=[None]
+        held=asyncio.run_coroutine_threadsafe(self._hold_transaction(retry,key,entered,outcome),self._loop)
+        wait([entered,held],return_when=FIRST_COMPLETED)
+        if not entered.done():
+            held.result() #raises whatever stopped the transaction starting
+        store,finished=entered.result()
+        self._transaction.store=store
+        try:
+            yield
+        except BaseException as e:
+            outcome[0]=e #raised in the transaction too, so it's rolled back
+            raise
+        finally:
+            self._transaction.store=None
+            self._loop.call_soon_threadsafe(finished.set)
+            try:
+                held.result()
+            except BaseException as e:
+                if e is not outcome[0]: raise
+
+    async def _hold_transaction(self,retry,key,entered:Future,outcome:list):
+        """holds the async store's transaction open, on the loop, until the sync transaction is done"""
+        finished=asyncio.Event()
+        async with self._async_kvstore.transact(retry,key) as store:
+            entered.set_result((store,finished))
+            await finished.wait()
+            if outcome[0] is not None:
+                raise outcome[0]
+
+    def namespaced(self,prefix:str)->KVStore:
+        return SyncKVStoreAdapter(self._async_kvstore.namespaced(prefix),self._loop)
+
+
+_loop:Optional[asyncio.AbstractEventLoop]=None
+_loop_lock=threading.Lock()
+
+def _background_loop()->asyncio.AbstractEventLoop:
+    """An event loop running forever on a daemon thread, shared by every SyncKVStoreAdapter without a loop of its own"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop=asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever,name="boltworks-kvstore-loop",daemon=True).start()
+        return _loop
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Hashable, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from slack_bolt import Args
+
+logger=logging.getLogger(__name__)
+
+
+def key_by_user(body:dict)->Optional[str]:
+    """A key_func for CallbackDispatcher which limits concurrency per slack user"""
+    user=body.get('user')
+    if isinstance(user,dict): return user.get('id') #interactive payloads
+    return user or body.get('user_id') #message events / slash commands
+
+def key_by_channel(body:dict)->Optional[str]:
+    """A key_func for CallbackDispatcher which limits concurrency per slack channel"""
+    channel=body.get('channel')
+    if isinstance(channel,dict): return channel.get('id') #interactive payloads
+    if channel: return channel #message events
+    if 'container' in body and 'channel_id' in body['container']: return body['container']['channel_id']
+    return body.get('channel_id') #slash commands
+
+
+class DispatchedRequest(NamedTuple):
+    """The request a dispatched callback is handling, which on_rejected is called with, in the same shape whichever component submitted it"""
+    component:str #"ActionCallbacks", "MsgThreadCallbacks" or "TreeNodeUI", or the callback's name if it was submitted without one
+    body:Optional[dict]=None #the request's body, or for MsgThreadCallbacks the message event
+    args:Optional[Args]=None #bolt's Args, which TreeNodeUI's handlers aren't passed
+    respond:Optional[Callable]=None #for telling the user to try again, if the request can be responded to
+
+
+class CallbackDispatcher:
+    def __init__(self,
+                 executor:Optional[Executor]=None,
+                 max_workers:int=8,
+                 max_pending:Optional[int]=100,
+                 per_key_limit:Optional[int]=None,
+                 key_func:Optional[Callable[[dict],Optional[Hashable]]]=key_by_user,
+                 on_rejected:Optional[Callable[[DispatchedRequest],Any]]=None) -> None:
+        """Runs callbacks off of the Bolt listener thread, on a bounded pool, so the handler can ack right away and a slow callback doesn't hold up everything after it.
+        Pass an instance to the `dispatcher` param of ActionCallbacks, MsgThreadCallbacks or TreeNodeUI to enable it.
+
+        Args:
+            executor (Executor, optional): the pool to run callbacks on. Defaults to a ThreadPoolExecutor with max_workers threads.
+                A ProcessPoolExecutor may be passed, but then the callbacks and everything passed to them must be picklable, which slack's Args are not.
+            max_workers (int, optional): the number of threads in the default executor. Defaults to 8.
+            max_pending (int, optional): the maximum number of callbacks queued or running at once, beyond which new ones are rejected (backpressure). None for unlimited. Defaults to 100.
+            per_key_limit (int, optional): the maximum number of callbacks running at once for a single key (eg a user or channel), further ones wait their turn without occupying a worker. Defaults to None (no limit).
+            key_func (Callable, optional): derives the key from the request body. Defaults to key_by_user, key_by_channel is also provided.
+            on_rejected (Callable[[DispatchedRequest],Any], optional): called with the DispatchedRequest of a callback rejected because max_pending is exceeded, eg to tell the user to try again with its respond. Defaults to just logging a warning.
+        """
+        self._executor=executor or ThreadPoolExecutor(max_workers=max_workers,thread_name_prefix="boltworks-dispatch")
+        self._max_pending=max_pending
+        self._per_key_limit=per_key_limit
+        self._key_func=key_func
+        self._on_rejected=on_rejected
+        self._lock=threading.Lock()
+        self._idle=threading.Condition(self._lock)
+        self._pending=0
+        self._running_per_key:dict[Hashable,int]=defaultdict(int)
+        self._waiting_per_key:dict[Hashable,deque]=defaultdict(deque)
+        self._submitted=0
+        self._completed=0
+        self._failed=0
+        self._rejected=0
+
+    def key_for(self,body:Optional[dict])->Optional[Hashable]:
+        return self._key_func(body) if self._key_func and body else None
+
+    def submit(self,fn:Callable,*args,key:Optional[Hashable]=None,request:Optional[DispatchedRequest]=None,**kwargs)->bool:
+        """Queues fn(*args,**kwargs) to be run on the pool
+
+        Args:
+            key (Hashable, optional): for per_key_limit, usually from key_for
+            request (DispatchedRequest, optional): the request fn is handling, which on_rejected is called with if it's rejected
+
+        Returns:
+            bool: False if the callback was rejected because max_pending was reached
+        """
+        with self._lock:
+            if self._max_pending is not None and self._pending>=self._max_pending:
+                self._rejected+=1
+                rejected=True
+            else:
+                rejected=False
+                self._pending+=1
+                self._submitted+=1
+                if key is not None and self._per_key_limit:
+                    if self._running_per_key[key]>=self._per_key_limit:
+                        self._waiting_per_key[key].append((fn,args,kwargs))
+                        return True
+                    self._running_per_key[key]+=1
+        if rejected:
+            if self._on_rejected: self._on_rejected(request or DispatchedRequest(getattr(fn,'__qualname__',repr(fn))))
+            else: logger.warning(f"dispatcher rejected {getattr(fn,'__name__',fn)}, {self._max_pending} callbacks are already pending")
+            return False
+        self._start(key,fn,args,kwargs)
+        return True
+
+    def _start(self,key,fn,args,kwargs):
+        try:
+            future=self._executor.submit(fn,*args,**kwargs)
+        except BaseException: #eg RuntimeError once the pool is shut down, the callback never runs, so it mustn't keep holding its place
+            self._finish(key,failed=True)
+            raise
+        future.add_done_callback(partial(self._on_done,key))
+
+    def _on_done(self,key,future:Future):
+        exception=future.exception()
+        if exception is not None:
+            logger.error("error in dispatched callback",exc_info=exception)
+        self._finish(key,failed=exception is not None)
+
+    def _finish(self,key,failed:bool):
+        """releases a callback's place in max_pending and its key's slot, starting the next callback waiting on the key, if any, in the slot"""
+        next_up=self._release(key,failed)
+        while next_up:
+            try:
+                future=self._executor.submit(next_up[0],*next_up[1],**next_up[2])
+            except Exception:
+                logger.error("couldn't start a dispatched callback which was waiting on its key",exc_info=True)
+                next_up=self._release(key,failed=True)
+            else:
+                future.add_done_callback(partial(self._on_done,key))
+                return
+
+    def _release(self,key,failed:bool):
+        with self._lock:
+            next_up=None
+            self._pending-=1
+            self._completed+=1
+            if failed: self._failed+=1
+            if key is not None and self._per_key_limit:
+                waiting=self._waiting_per_key.get(key)
+                if waiting:
+                    next_up=waiting.popleft() #it inherits this callback's slot, so the running count stays the same
+                else:
+                    self._running_per_key[key]-=1
+                    if not self._running_per_key[key]: del self._running_per_key[key]
+                if waiting is not None and not waiting: del self._waiting_per_key[key]
+            if not self._pending: self._idle.notify_all()
+            return next_up
+
+    def stats(self)->dict[str,int]:
+        """A snapshot of the queue depth and counters, for monitoring"""
+        with self._lock:
+            waiting=sum(len(w) for w in self._waiting_per_key.values())
+            return dict(
+                pending=self._pending, #queued, waiting on a key limit, or running
+                waiting_on_key_limit=waiting,
+                active_keys=len(self._running_per_key),
+                submitted=self._submitted,
+                completed=self._completed,
+                failed=self._failed,
+                rejected=self._rejected,
+            )
+
+    def shutdown(self,wait:bool=True):
+        """Shuts down the pool, if wait is True, first waiting for every pending callback, including ones held back by per_key_limit"""
+        if wait:
+            with self._idle:
+                self._idle.wait_for(lambda: not self._pending)
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,169 @@
+"""Timing spans around boltworks' hot paths, reported to pluggable hooks.
+
+```
+from boltworks.helper import instrumentation
+instrumentation.add_hook(lambda span: print(span.name,span.duration,span.attributes))
+```
+
+Spans emitted (attributes in brackets):
+* `kvstore.get` / `kvstore.set` (bytes), with `kvstore.deserialize` / `kvstore.serialize` inside them, for stores using a serializer
+* `treenodeui.click` (coalesced, if the click was a duplicate or will be rendered by a render already in flight), around handling a click on a TreeNode, with inside it:
+* `treenodeui.get_root` (cache_hit)
+* `treenodeui.render` (blocks, repaginations)
+* `treenodeui.post`, the round trip to slack, posting a message or opening or updating a view (status)
+* `treenodeui.search` (hits), around handling a search in a searchable tree, with a render and post inside it
+* `actioncallbacks.run` (kind, found), around looking up and running an action or view callback
+* `threadcallbacks.scan` (matched), checking each message for a thread reply callback, and `threadcallbacks.run` (callbacks) around running them
+
+When no hook is registered, `span()` returns a shared do-nothing span, so the overhead is a single check.
+"""
+from __future__ import annotations
+
+import contextvars
+import logging
+import time
+from typing import Any, Callable, Optional, Union
+
+logger=logging.getLogger(__name__)
+
+
+class Span:
+    def __init__(self,name:str,attributes:dict[str,Any]) -> None:
+        self.name=name
+        self.attributes=attributes
+        self.parent:Optional[Span]=None
+        self.start=0.0
+        self.duration=0.0 #seconds, set once the span has ended
+        self.error:Optional[BaseException]=None
+        self.hook_state:dict[Any,Any]={} #for hooks to keep their own per-span state in, keyed by the hook
+        self._token:Optional[contextvars.Token]=None
+
+    def set(self,**attributes):
+        """adds attributes which are only known partway through, eg the size of what was loaded"""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.parent=_current_span.get()
+        self._token=_current_span.set(self)
+        for hook in _hooks:
+            _call_hook(hook.span_started,self)
+        self.start=time.perf_counter()
+        return self
+
+    def __exit__(self,exc_type,exc,tb):
+        self.duration=time.perf_counter()-self.start
+        self.error=exc
+        for hook in _hooks:
+            _call_hook(hook.span_ended,self)
+        _current_span.reset(self._token) # type: ignore
+        return False
+
+class _NoopSpan(Span):
+    def __init__(self) -> None:
+        super().__init__("noop",{})
+    def set(self,**attributes):...
+    def __enter__(self): return self
+    def __exit__(self,exc_type,exc,tb): return False
+
+_NOOP_SPAN=_NoopSpan()
+_current_span:contextvars.ContextVar[Optional[Span]]=contextvars.ContextVar("boltworks_current_span",default=None)
+
+
+class InstrumentationHook:
+    """Receives every span as it starts and ends. Override either or both.
+    Hooks are called on whichever thread the span is on, and any exception they raise is logged and otherwise ignored.
+    """
+    def span_started(self,span:Span):...
+    def span_ended(self,span:Span):...
+
+class _CallbackHook(InstrumentationHook):
+    def __init__(self,callback:Callable[[Span],Any]) -> None:
+        self.callback=callback
+    def span_ended(self,span:Span):
+        self.callback(span)
+
+_hooks:tuple[InstrumentationHook,...]=() #a tuple, replaced rather than mutated, so spans can iterate it without a lock
+
+
+def add_hook(hook:Union[InstrumentationHook,Callable[[Span],Any]])->InstrumentationHook:
+    """Registers a hook, either an InstrumentationHook, or a plain callable which is called with each span once it's ended
+
+    Returns:
+        InstrumentationHook: the registered hook, to pass to remove_hook
+    """
+    global _hooks
+    if not isinstance(hook,InstrumentationHook):
+        hook=_CallbackHook(hook)
+    _hooks=_hooks+(hook,)
+    return hook
+
+def remove_hook(hook:InstrumentationHook):
+    global _hooks
+    _hooks=tuple(h for h in _hooks if h is not hook)
+
+def span(name:str,**attributes)->Span:
+    """A context manager timing the code inside it, to be reported to the registered hooks"""
+    if not _hooks:
+        return _NOOP_SPAN
+    return Span(name,attributes)
+
+def enabled()->bool:
+    """Whether any hook is registered, to skip gathering attributes which are costly to work out"""
+    return bool(_hooks)
+
+def _call_hook(method:Callable[[Span],Any],span:Span):
+    try:
+        method(span)
+    except Exception:
+        logger.exception(f"error in instrumentation hook {method}")
+
+
+class LoggingHook(InstrumentationHook):
+    def __init__(self,logger:logging.Logger=logger,level:int=logging.DEBUG) -> None:
+        """Logs every span with its duration, indented under its parent span"""
+        self._logger=logger
+        self._level=level
+
+    def span_ended(self,span:Span):
+        if not self._logger.isEnabledFor(self._level):
+            return
+        depth=0
+        parent=span.parent
+        while parent is not None:
+            depth+=1
+            parent=parent.parent
+        attributes=" ".join(f"{k}={v}" for k,v in span.attributes.items())
+        self._logger.log(self._level,f"{'  '*depth}{span.name} {span.duration*1e3:.2f}ms {attributes}{' error='+repr(span.error) if span.error else ''}")
+
+
+class OpenTelemetryHook(InstrumentationHook):
+    def __init__(self,tracer=None) -> None:
+        """Reports spans to OpenTelemetry, nested under whatever span is current, requires the opentelemetry-api package
+
+        Args:
+            tracer (opentelemetry.trace.Tracer, optional): Defaults to the global tracer provider's tracer for "boltworks".
+        """
+        try:
+            from opentelemetry import context, trace
+        except ImportError as e:
+            raise ImportError("OpenTelemetryHook requires the opentelemetry-api package") from e
+        self._context=context
+        self._trace=trace
+        self._tracer=tracer or trace.get_tracer("boltworks")
+
+    def span_started(self,span:Span):
+        otel_span=self._tracer.start_span(span.name,attributes=_otel_attributes(span.attributes))
+        token=self._context.attach(self._trace.set_span_in_context(otel_span))
+        span.hook_state[self]=(otel_span,token)
+
+    def span_ended(self,span:Span):
+        otel_span,token=span.hook_state.pop(self)
+        otel_span.set_attributes(_otel_attributes(span.attributes))
+        if span.error is not None:
+            otel_span.record_exception(span.error)
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+        otel_span.end()
+        self._context.detach(token)
+
+def _otel_attributes(attributes:dict)->dict:
+    return {k:v if isinstance(v,(bool,int,float,str)) else str(v) for k,v in attributes.items() if v is not None}
@@ -1,9 +1,24 @@
 from __future__ import annotations
 
 import contextlib
+import os
+import threading
+import time
+import weakref
+from itertools import islice
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator, Optional, Union
+from urllib.parse import quote, unquote
 
 import diskcache.core
+import diskcache.fanout
+from . import instrumentation
 from .serializers import Serializer
+from .snapshot import NAMESPACE_SEPARATOR, SnapshotEntry, read_snapshot, write_snapshot
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+    from .async_kvstore import AsyncKVStore
 
 
 class KVStore:
@@ -12,14 +27,56 @@ class KVStore:
     def __delitem__(self, key): ...
     def __contains__(self, key): ...
 
+    def set(self, key, value, expire:Optional[float]=None):
+        """like __setitem__, but optionally the entry will expire after `expire` seconds"""
+    def expire(self)->int:
+        """sweeps out all expired entries, returning the number removed"""
+
+    #these weren't always part of KVStore, so a store which doesn't implement them raises rather than returning None
+
+    def __len__(self)->int:
+        raise NotImplementedError(f"{type(self).__name__} doesn't support len()")
+    def keys(self)->Iterator:
+        """the keys in this store (or namespace), without its prefix"""
+        raise NotImplementedError(f"{type(self).__name__} doesn't support keys()")
+    def clear(self)->int:
+        """deletes every entry in this store (or namespace), returning the number removed"""
+        raise NotImplementedError(f"{type(self).__name__} doesn't support clear()")
+
+    def export(self, stream:BinaryIO, namespaces:Optional[Iterable[str]]=None, compress:int=0)->int:
+        """streams the store's entries, as they're stored, with their expiry times, to a binary stream (see snapshot.py), returning the number written
+
+        Args:
+            stream (BinaryIO): eg a file opened with "wb", or a socket's makefile("wb")
+            namespaces (Iterable[str], optional): only export the entries in these namespaces of the store. Defaults to all of its entries.
+            compress (int, optional): a zlib level, 1 (fastest) to 9 (smallest), or 0 for no compression. Defaults to 0.
+        """
+        raise NotImplementedError(f"{type(self).__name__} doesn't support export()")
+    def import_(self, stream:BinaryIO, workers:int=1, batch_size:int=1000)->int:
+        """adds the entries from a stream written by export, into the same namespaces, returning the number added (entries which have expired since are skipped)
+
+        Args:
+            stream (BinaryIO): eg a file opened with "rb"
+            workers (int, optional): the number of threads writing batches at once, for stores which can write in parallel. Defaults to 1.
+            batch_size (int, optional): entries written in each transaction. Defaults to 1000.
+        """
+        raise NotImplementedError(f"{type(self).__name__} doesn't support import_()")
+
     @contextlib.contextmanager
-    def transact(self, retry=False):...
+    def transact(self, retry=False, key=None):
+        """makes the operations inside it atomic. If `key` is passed, only the part of the store holding that key need be locked, so only operations on that key are atomic"""
+        ...
 
     def namespaced(self,prefix:str)->KVStore:...
 
     def using_serializer(self,serializer:Serializer):
         return KVStoreWithSerializer(self,serializer)
 
+    def as_async(self,max_workers:int=4,executor:Optional[Executor]=None)->AsyncKVStore:
+        """this store for async code, running each operation on a bounded thread pool so the event loop doesn't wait on the disk or deserializing (see async_kvstore.py)"""
+        from .async_kvstore import ExecutorAsyncKVStore
+        return ExecutorAsyncKVStore(self,max_workers,executor)
+
 class KVStoreWithSerializer(KVStore):
     def __init__(self,kvstore:KVStore,serializer:Serializer):
         if isinstance(kvstore,KVStoreWithSerializer):
@@ -29,16 +86,40 @@ class KVStoreWithSerializer(KVStore):
         self._serializer=serializer
 
     def __getitem__(self, key):
-        serialized=self._inner_kvstore[key]
-        return self._serializer.loads(serialized) \
-            if isinstance(serialized,bytes) else serialized #transitional
+        with instrumentation.span("kvstore.get") as span:
+            serialized=self._inner_kvstore[key]
+            if not isinstance(serialized,bytes): #transitional
+                return serialized
+            span.set(bytes=len(serialized))
+            with instrumentation.span("kvstore.deserialize",bytes=len(serialized)):
+                return self._serializer.loads(serialized)
 
     def __setitem__(self, key, value):
-        serialized=self._serializer.dumps(value)
-        self._inner_kvstore[key]=serialized
+        with instrumentation.span("kvstore.set") as span:
+            serialized=self._serialize(value)
+            span.set(bytes=len(serialized))
+            self._inner_kvstore[key]=serialized
+
+    def set(self, key, value, expire:Optional[float]=None):
+        with instrumentation.span("kvstore.set",expire=expire) as span:
+            serialized=self._serialize(value)
+            span.set(bytes=len(serialized))
+            self._inner_kvstore.set(key,serialized,expire=expire)
+
+    def _serialize(self,value)->bytes:
+        with instrumentation.span("kvstore.serialize") as span:
+            serialized=self._serializer.dumps(value)
+            span.set(bytes=len(serialized))
+            return serialized
 
     def __delitem__(self, key): return self._inner_kvstore.__delitem__(key)
     def __contains__(self, key): return self._inner_kvstore.__contains__(key)
+    def expire(self): return self._inner_kvstore.expire()
+    def __len__(self): return len(self._inner_kvstore)
+    def keys(self): return self._inner_kvstore.keys()
+    def clear(self): return self._inner_kvstore.clear()
+    def export(self, stream, namespaces=None, compress=0): return self._inner_kvstore.export(stream,namespaces,compress) #the serialized values, so nothing is deserialized
+    def import_(self, stream, workers=1, batch_size=1000): return self._inner_kvstore.import_(stream,workers,batch_size)
     
     def namespaced(self,prefix:str)->KVStore:
         return KVStoreWithSerializer(
@@ -46,14 +127,44 @@ class KVStoreWithSerializer(KVStore):
             self._serializer)
 
     @contextlib.contextmanager
-    def transact(self, retry=False):
-        with self._inner_kvstore.transact(retry):
+    def transact(self, retry=False, key=None):
+        with self._inner_kvstore.transact(retry,key):
             yield
 
 class DiskCacheKVStore(KVStore):
-    def __init__(self,disk_cache:diskcache.core.Cache,prefix:str="") -> None:
+    def __init__(self,disk_cache:Union[diskcache.core.Cache,diskcache.fanout.FanoutCache],prefix:str="",partition_namespaces:bool=False) -> None:
+        """A KVStore in a diskcache Cache, or a FanoutCache, which spreads keys over several Caches (shards) so writes to different shards don't wait on each other. See `multiprocess`.
+
+        Args:
+            disk_cache (Union[diskcache.core.Cache,diskcache.fanout.FanoutCache]): the cache
+            prefix (str, optional): prefixed to every key, as `namespaced` does. Defaults to "".
+            partition_namespaces (bool, optional): if True, each namespace is kept in a cache of its own, in a subdirectory, rather than prefixing its keys in this one,
+                so counting, listing, clearing and expiring a namespace's entries only touches that namespace. Entries stored without it won't be found with it, and vice versa.
+                Defaults to False.
+        """
         self._prefix=prefix
         self._diskcache=disk_cache
+        self._partition_namespaces=partition_namespaces
+
+    @classmethod
+    def multiprocess(cls,directory:Union[str,os.PathLike],shards:int=8,timeout:float=1,partition_namespaces:bool=False,**settings)->DiskCacheKVStore:
+        """A store for several processes (eg gunicorn workers) sharing one directory, in a FanoutCache, so each write and `transact(key=...)` locks only one shard's database
+        rather than a single database every write in every process waits on. It can't be opened as a plain Cache, nor a plain Cache's directory as one of these.
+
+        Args:
+            directory (Union[str,os.PathLike]): the cache directory, the same one in every process
+            shards (int, optional): the number of databases keys are spread over, which must be the same everywhere the directory is used. Defaults to 8.
+            timeout (float, optional): seconds a connection waits on a locked database before retrying. Defaults to 1.
+            partition_namespaces (bool, optional): as for the constructor, each namespace gets its own shards
+            settings: any other diskcache settings, overriding the tuning here
+        """
+        settings={
+            "sqlite_journal_mode":"wal", #readers never wait on writers
+            "sqlite_synchronous":1, #NORMAL, which is safe with wal, syncing only at checkpoints
+            "sqlite_wal_autocheckpoint":4000, #pages, so checkpoints, which wait on readers, happen less often than every 1000
+            "sqlite_mmap_size":2**28,
+            **settings}
+        return cls(diskcache.fanout.FanoutCache(os.fspath(directory),shards=shards,timeout=timeout,**settings),partition_namespaces=partition_namespaces)
 
     def _prefixed(self,key):
         return f"{self._prefix}{key}"
@@ -63,9 +174,148 @@ class DiskCacheKVStore(KVStore):
     def __delitem__(self, key): del self._diskcache[self._prefixed(key)]
     def __contains__(self, key): return self._prefixed(key) in self._diskcache
 
+    def set(self, key, value, expire:Optional[float]=None): self._diskcache.set(self._prefixed(key),value,expire=expire,retry=True) #a FanoutCache otherwise fails silently if the database is busy
+    def expire(self): return self._diskcache.expire(retry=True) #diskcache keeps an index on expire_time, so this doesn't scan unexpiring entries
+
+    #without a prefix these are the whole cache's, so a partitioned namespace's are just its own, but an unpartitioned namespace's mean scanning every key in the cache
+    #(and, like a partitioned one's, don't include the entries of namespaces nested in it)
+    def __len__(self):
+        if not self._prefix: return len(self._diskcache)
+        return sum(1 for _ in self.keys())
+
+    def keys(self):
+        if not self._prefix: return iter(self._diskcache)
+        return (key for key in self._keys_under_prefix() if NAMESPACE_SEPARATOR not in key)
+
+    def _keys_under_prefix(self)->Iterator[str]:
+        """the keys starting with this store's prefix, without it, including those of namespaces nested in it"""
+        return (key[len(self._prefix):] for key in self._diskcache if isinstance(key,str) and key.startswith(self._prefix))
+
+    def clear(self):
+        if not self._prefix: return self._diskcache.clear(retry=True)
+        removed=0
+        for key in list(self.keys()):
+            removed+=self._diskcache.delete(self._prefixed(key),retry=True)
+        return removed
+
+    def export(self, stream, namespaces=None, compress=0):
+        if namespaces is None:
+            entries=self._snapshot_entries(())
+        else:
+            entries=(entry for name in namespaces for entry in self.namespaced(name)._snapshot_entries((name,)))
+        return write_snapshot(stream,entries,compress)
+
+    def _snapshot_entries(self,namespace:tuple)->Iterator[SnapshotEntry]:
+        if self._prefix and not self._partition_namespaces: #nested namespaces' entries are under this one's prefix, separated like a snapshot's namespaces
+            keys=((tuple(names),key) for *names,key in (key.split(NAMESPACE_SEPARATOR) for key in self._keys_under_prefix()))
+        else:
+            keys=(((),key) for key in self.keys())
+        for nested,key in keys:
+            found=self._diskcache.get(self._prefixed(NAMESPACE_SEPARATOR.join((*nested,key))),default=_MISSING,expire_time=True,retry=True)
+            if found[0] is not _MISSING: #unless it expired or was deleted while exporting
+                yield SnapshotEntry(namespace+nested,key,*found)
+        if self._partition_namespaces: #the namespaces' caches, and theirs, are in their own subdirectories
+            directory=os.path.join(self._diskcache.directory,"namespaces")
+            for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else ():
+                yield from self.namespaced(unquote(name))._snapshot_entries(namespace+(unquote(name),))
+
+    def import_(self, stream, workers=1, batch_size=1000):
+        from concurrent.futures import Future, ThreadPoolExecutor #here, as it's slow to import and only needed for this
+        imported=0
+        pool=ThreadPoolExecutor(max_workers=workers,thread_name_prefix="boltworks-import") if workers>1 else None
+        pending:list[Future]=[]
+        try:
+            entries=iter(read_snapshot(stream))
+            while True:
+                batch=list(islice(entries,batch_size))
+                if not batch:
+                    break
+                for target,group in self._import_groups(batch):
+                    if pool is None:
+                        imported+=_import_group(target,group)
+                    else:
+                        if len(pending)>=2*workers: #so reading doesn't get further ahead of writing than this
+                            imported+=pending.pop(0).result()
+                        pending.append(pool.submit(_import_group,target,group))
+            for future in pending:
+                imported+=future.result()
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
+        return imported
+
+    def _import_groups(self,batch:list[SnapshotEntry])->Iterable[tuple]:
+        """the batch split up by the database each entry goes in (the namespace's cache, and its shard), so each group is one transaction, and different groups can be written at once"""
+        groups:dict[int,tuple]={}
+        stores:dict[tuple,DiskCacheKVStore]={():self}
+        for entry in batch:
+            store=stores.get(entry.namespace)
+            if store is None:
+                store=self
+                for name in entry.namespace:
+                    store=store.namespaced(name)
+                stores[entry.namespace]=store
+            prefixed_key=store._prefixed(entry.key)
+            cache=store._shard_for(prefixed_key) if isinstance(store._diskcache,diskcache.fanout.FanoutCache) else store._diskcache
+            groups.setdefault(id(cache),(cache,[]))[1].append((prefixed_key,entry.value,entry.expire_time))
+        return groups.values()
+
     @contextlib.contextmanager
-    def transact(self, retry=False):
-        with self._diskcache.transact(retry):
-            yield
+    def transact(self, retry=False, key=None):
+        if isinstance(self._diskcache,diskcache.fanout.FanoutCache):
+            #a FanoutCache transaction locks every shard, so lock only the one holding the key where we can. FanoutCache transactions always retry.
+            with (self._shard_for(self._prefixed(key)) if key is not None else self._diskcache).transact(retry=True):
+                yield
+        else:
+            with self._diskcache.transact(retry):
+                yield
+
+    def _shard_for(self,prefixed_key)->diskcache.core.Cache:
+        fanout=self._diskcache
+        return fanout._shards[fanout._hash(prefixed_key)%fanout._count] # type: ignore #as FanoutCache picks them
+
+    def namespaced(self,prefix:str):
+        if NAMESPACE_SEPARATOR in prefix:
+            raise ValueError(f"a namespace's name can't contain {NAMESPACE_SEPARATOR!r}")
+        if self._partition_namespaces:
+            return DiskCacheKVStore(_partition(self._diskcache,f"{self._prefix}{prefix}"),partition_namespaces=True)
+        #each name is followed by the separator, so neither "a" then "bc" and "ab" then "c", nor "tree" and "tree_x", share keys
+        return DiskCacheKVStore(self._diskcache,f"{self._prefix}{prefix}{NAMESPACE_SEPARATOR}")
+
+
+_MISSING=object()
+
+def _import_group(cache:diskcache.core.Cache,entries:list)->int:
+    now=time.time()
+    imported=0
+    with cache.transact(retry=True):
+        for key,value,expire_time in entries:
+            if expire_time is not None and expire_time<=now:
+                continue
+            cache.set(key,value,expire=expire_time-now if expire_time is not None else None,retry=True)
+            imported+=1
+    return imported
+
+
+_partitions:weakref.WeakKeyDictionary=weakref.WeakKeyDictionary() #the caches opened for each cache's namespaces, so namespacing the same one again reuses its connections
+_partitions_lock=threading.Lock()
 
-    def namespaced(self,prefix:str): return DiskCacheKVStore(self._diskcache,prefix)
+def _partition(disk_cache:Union[diskcache.core.Cache,diskcache.fanout.FanoutCache],name:str)->Union[diskcache.core.Cache,diskcache.fanout.FanoutCache]:
+    """The cache for a namespace of disk_cache, in a subdirectory of it, with the same settings"""
+    if name in ("",".",".."):
+        raise ValueError(f"{name!r} can't be the name of a partitioned namespace")
+    with _partitions_lock:
+        partitions=_partitions.setdefault(disk_cache,{})
+        partition=partitions.get(name)
+        if partition is None:
+            directory=os.path.join(disk_cache.directory,"namespaces",quote(name,safe=""))
+            if isinstance(disk_cache,diskcache.fanout.FanoutCache):
+                shard=disk_cache._shards[0]
+                settings={key:getattr(shard,key) for key in diskcache.core.DEFAULT_SETTINGS}
+                settings["size_limit"]*=disk_cache._count #FanoutCache divides it between the shards
+                partition=diskcache.fanout.FanoutCache(directory,shards=disk_cache._count,timeout=shard.timeout,disk=type(shard.disk),**settings)
+            else:
+                settings={key:getattr(disk_cache,key) for key in diskcache.core.DEFAULT_SETTINGS}
+                partition=diskcache.core.Cache(directory,timeout=disk_cache.timeout,disk=type(disk_cache.disk),**settings)
+            partitions[name]=partition
+        return partition
@@ -0,0 +1,254 @@
+"""Prometheus style counters and histograms for boltworks' components, with no dependencies.
+
+```
+from boltworks.helper import metrics
+metrics.enable() #starts collecting into metrics.REGISTRY
+
+@flask_app.route("/metrics") #or whatever http endpoint you already have
+def scrape():
+    return metrics.REGISTRY.exposition(),200,{"Content-Type":metrics.CONTENT_TYPE}
+```
+
+The metrics are gathered from instrumentation spans (see instrumentation.py), by MetricsHook.
+"""
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+from typing import Iterable, Optional
+
+from . import instrumentation
+from .instrumentation import InstrumentationHook, Span
+
+CONTENT_TYPE="text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_LATENCY_BUCKETS=(.001,.0025,.005,.01,.025,.05,.1,.25,.5,1,2.5,5,10)
+BLOCK_COUNT_BUCKETS=(1,2,5,10,20,30,40,50)
+BYTES_BUCKETS=(256,1024,4096,16384,65536,262144,1048576)
+
+
+class _Metric:
+    type=""
+    def __init__(self,name:str,documentation:str,labelnames:Iterable[str]=()) -> None:
+        self.name=name
+        self.documentation=documentation
+        self.labelnames=tuple(labelnames)
+        self._lock=threading.Lock()
+
+    def _key(self,labels:dict)->tuple:
+        try:
+            if len(labels)==len(self.labelnames):
+                return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError:
+            pass
+        raise ValueError(f"{self.name} takes the labels {self.labelnames}, got {tuple(labels)}")
+
+    def _format_labels(self,key:tuple,extra:Optional[tuple]=None)->str:
+        pairs=list(zip(self.labelnames,key))
+        if extra: pairs.append(extra)
+        if not pairs: return ""
+        return "{"+",".join(f'{name}="{_escape_label(value)}"' for name,value in pairs)+"}"
+
+    def _samples(self)->Iterable[str]: ...
+
+    def exposition(self)->str:
+        header=f"# HELP {self.name} {_escape_help(self.documentation)}\n# TYPE {self.name} {self.type}\n"
+        return header+"".join(line+"\n" for line in self._samples())
+
+class Counter(_Metric):
+    type="counter"
+    def __init__(self,name:str,documentation:str,labelnames:Iterable[str]=()) -> None:
+        super().__init__(name,documentation,labelnames)
+        self._values:dict[tuple,float]={}
+
+    def inc(self,amount:float=1,**labels):
+        key=self._key(labels)
+        with self._lock:
+            self._values[key]=self._values.get(key,0)+amount
+
+    def value(self,**labels)->float:
+        return self._values.get(self._key(labels),0)
+
+    def _samples(self):
+        with self._lock:
+            values=list(self._values.items())
+        for key,value in values:
+            yield f"{self.name}{self._format_labels(key)} {_format_value(value)}"
+
+class Histogram(_Metric):
+    type="histogram"
+    def __init__(self,name:str,documentation:str,labelnames:Iterable[str]=(),buckets:Iterable[float]=DEFAULT_LATENCY_BUCKETS) -> None:
+        super().__init__(name,documentation,labelnames)
+        self.buckets=tuple(sorted(buckets))
+        self._values:dict[tuple,list]={} #per labelset, [count in each bucket (not cumulative) plus +Inf, sum]
+
+    def observe(self,value:float,**labels):
+        key=self._key(labels)
+        index=bisect.bisect_left(self.buckets,value) #buckets are upper bounds, inclusive
+        with self._lock:
+            state=self._values.get(key)
+            if state is None:
+                state=self._values[key]=[[0]*(len(self.buckets)+1),0.0]
+            state[0][index]+=1
+            state[1]+=value
+
+    def count(self,**labels)->int:
+        state=self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def sum(self,**labels)->float:
+        state=self._values.get(self._key(labels))
+        return state[1] if state else 0.0
+
+    def _samples(self):
+        with self._lock:
+            values=[(key,list(counts),total) for key,(counts,total) in self._values.items()]
+        for key,counts,total in values:
+            cumulative=0
+            for bound,count in zip(self.buckets+(math.inf,),counts):
+                cumulative+=count
+                yield f"{self.name}_bucket{self._format_labels(key,('le',_format_value(bound)))} {cumulative}"
+            yield f"{self.name}_sum{self._format_labels(key)} {_format_value(total)}"
+            yield f"{self.name}_count{self._format_labels(key)} {cumulative}"
+
+
+def _format_value(value:float)->str:
+    if value==math.inf: return "+Inf"
+    if isinstance(value,int) or value.is_integer(): return str(int(value))
+    return repr(value)
+
+def _escape_help(value:str)->str:
+    return value.replace("\\","\\\\").replace("\n","\\n")
+
+def _escape_label(value:str)->str:
+    return value.replace("\\","\\\\").replace("\n","\\n").replace('"','\\"')
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        """Holds metrics by name, and renders them all in the prometheus text format"""
+        self._metrics:dict[str,_Metric]={}
+        self._lock=threading.Lock()
+
+    def _get_or_create(self,cls,name:str,documentation:str,labelnames:Iterable[str],**kwargs):
+        with self._lock:
+            metric=self._metrics.get(name)
+            if metric is None:
+                metric=self._metrics[name]=cls(name,documentation,labelnames,**kwargs)
+            elif not isinstance(metric,cls) or metric.labelnames!=tuple(labelnames):
+                raise ValueError(f"{name} is already registered as a different metric")
+            return metric
+
+    def counter(self,name:str,documentation:str,labelnames:Iterable[str]=())->Counter:
+        return self._get_or_create(Counter,name,documentation,labelnames)
+
+    def histogram(self,name:str,documentation:str,labelnames:Iterable[str]=(),buckets:Iterable[float]=DEFAULT_LATENCY_BUCKETS)->Histogram:
+        return self._get_or_create(Histogram,name,documentation,labelnames,buckets=buckets)
+
+    def get(self,name:str)->Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def exposition(self)->str:
+        """All the metrics, in the prometheus text exposition format (serve it with CONTENT_TYPE)"""
+        with self._lock:
+            metrics=sorted(self._metrics.values(),key=lambda m: m.name)
+        return "".join(metric.exposition() for metric in metrics)
+
+REGISTRY=MetricsRegistry()
+
+
+class MetricsHook(InstrumentationHook):
+    def __init__(self,registry:MetricsRegistry=REGISTRY,prefix:str="boltworks") -> None:
+        """Turns instrumentation spans into metrics in `registry`"""
+        r,p=registry,prefix
+        self._renders=r.counter(f"{p}_treenodeui_renders_total","TreeNodeUI renders")
+        self._repaginations=r.counter(f"{p}_treenodeui_repaginations_total","Repagination attempts needed to fit renders within slack's block limit")
+        self._render_blocks=r.histogram(f"{p}_treenodeui_render_blocks","Blocks per render",buckets=BLOCK_COUNT_BUCKETS)
+        self._render_seconds=r.histogram(f"{p}_treenodeui_render_seconds","Time to render a tree")
+        self._root_lookups=r.counter(f"{p}_treenodeui_root_lookups_total","Lookups of a tree's root node, by whether it was in the in memory cache",["cache"])
+        self._post_seconds=r.histogram(f"{p}_treenodeui_post_seconds","Round trip time posting a rendered tree to slack")
+        self._click_seconds=r.histogram(f"{p}_treenodeui_click_seconds","Total time handling a click on a tree")
+        self._coalesced_clicks=r.counter(f"{p}_treenodeui_coalesced_clicks_total","Clicks on a tree which didn't need a render of their own, being duplicates or superseded by a newer click")
+        self._dispatches=r.counter(f"{p}_actioncallbacks_dispatches_total","ActionCallbacks callbacks dispatched",["kind"])
+        self._misses=r.counter(f"{p}_actioncallbacks_misses_total","ActionCallbacks actions whose callback wasn't found in the store",["kind"])
+        self._callback_seconds=r.histogram(f"{p}_actioncallbacks_callback_seconds","ActionCallbacks lookup and callback time",["kind"])
+        self._scanned=r.counter(f"{p}_threadcallbacks_messages_scanned_total","Messages checked for a thread reply callback")
+        self._matched=r.counter(f"{p}_threadcallbacks_messages_matched_total","Messages in a thread with a registered callback")
+        self._kvstore_ops=r.counter(f"{p}_kvstore_operations_total","KVStore operations",["op"])
+        self._kvstore_bytes=r.counter(f"{p}_kvstore_bytes_total","Serialized bytes read and written",["op"])
+        self._kvstore_value_bytes=r.histogram(f"{p}_kvstore_value_bytes","Serialized size of values read and written",["op"],buckets=BYTES_BUCKETS)
+        self._kvstore_seconds=r.histogram(f"{p}_kvstore_operation_seconds","KVStore operation time, including (de)serialization",["op"])
+        self._errors=r.counter(f"{p}_errors_total","Exceptions raised, by the span they were raised in",["span"])
+        self._handlers={
+            "treenodeui.render":self._on_render,
+            "treenodeui.get_root":self._on_get_root,
+            "treenodeui.post":lambda span: self._post_seconds.observe(span.duration),
+            "treenodeui.click":self._on_click,
+            "actioncallbacks.run":self._on_action_callback,
+            "threadcallbacks.scan":self._on_thread_scan,
+            "kvstore.get":self._on_kvstore,
+            "kvstore.set":self._on_kvstore,
+        }
+
+    def span_ended(self,span:Span):
+        if span.error is not None:
+            self._errors.inc(span=span.name)
+        handler=self._handlers.get(span.name)
+        if handler: handler(span)
+
+    def _on_render(self,span:Span):
+        self._renders.inc()
+        self._render_seconds.observe(span.duration)
+        if "blocks" in span.attributes:
+            self._render_blocks.observe(span.attributes["blocks"])
+            self._repaginations.inc(span.attributes.get("repaginations",0))
+
+    def _on_click(self,span:Span):
+        if span.attributes.get("coalesced"):
+            self._coalesced_clicks.inc()
+        else:
+            self._click_seconds.observe(span.duration)
+
+    def _on_get_root(self,span:Span):
+        if "cache_hit" in span.attributes:
+            self._root_lookups.inc(cache="hit" if span.attributes["cache_hit"] else "miss")
+
+    def _on_action_callback(self,span:Span):
+        kind=span.attributes.get("kind","action")
+        self._dispatches.inc(kind=kind)
+        if span.attributes.get("found") is False:
+            self._misses.inc(kind=kind)
+        self._callback_seconds.observe(span.duration,kind=kind)
+
+    def _on_thread_scan(self,span:Span):
+        self._scanned.inc()
+        if span.attributes.get("matched"):
+            self._matched.inc()
+
+    def _on_kvstore(self,span:Span):
+        op=span.name.split(".",1)[1]
+        self._kvstore_ops.inc(op=op)
+        self._kvstore_seconds.observe(span.duration,op=op)
+        if "bytes" in span.attributes:
+            self._kvstore_bytes.inc(span.attributes["bytes"],op=op)
+            self._kvstore_value_bytes.observe(span.attributes["bytes"],op=op)
+
+
+_hook:Optional[InstrumentationHook]=None
+_hook_lock=threading.Lock()
+
+def enable(registry:MetricsRegistry=REGISTRY)->MetricsRegistry:
+    """Starts collecting metrics from every boltworks component into `registry`"""
+    global _hook
+    with _hook_lock:
+        if _hook is not None:
+            instrumentation.remove_hook(_hook)
+        _hook=instrumentation.add_hook(MetricsHook(registry))
+    return registry
+
+def disable():
+    global _hook
+    with _hook_lock:
+        if _hook is not None:
+            instrumentation.remove_hook(_hook)
+            _hook=None
@@ -0,0 +1,185 @@
+"""An on-demand sampling profiler for live handlers.
+
+When enabled, a share of TreeNodeUI clicks, ActionCallbacks callbacks and @argparse_command invocations are profiled:
+a background thread samples the handling thread's stack every `interval` seconds, and once the handler returns, the samples are written as
+folded stacks (one `frame;frame;frame count` line per distinct stack) to a file in `directory`, ready for flamegraph.pl, speedscope or inferno.
+Only the newest `max_files` files are kept.
+
+It can be switched on and off while running, with no restart:
+```
+from boltworks.helper import profiling
+profiling.enable("/tmp/boltworks-profiles",sample_rate=0.05)
+...
+profiling.disable()
+```
+or by sending a signal, after `profiling.install_signal_toggle("/tmp/boltworks-profiles")` (`kill -USR2 <pid>` to toggle).
+"""
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Optional, Union
+
+logger=logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_RATE=0.01
+DEFAULT_INTERVAL=0.005 #seconds between samples
+DEFAULT_MAX_FILES=200
+
+
+class _ProfiledInvocation:
+    def __init__(self,name:str,thread_id:int,entry_frame:Optional[FrameType]) -> None:
+        self.name=name
+        self.thread_id=thread_id
+        self.entry_frame=entry_frame #stacks are folded from here down, so they start at the handler rather than at bolt's internals
+        self.samples:Counter[str]=Counter()
+        self.start=time.perf_counter()
+
+
+class SamplingProfiler:
+    def __init__(self,directory:Union[str,Path],sample_rate:float=DEFAULT_SAMPLE_RATE,interval:float=DEFAULT_INTERVAL,max_files:int=DEFAULT_MAX_FILES) -> None:
+        """Samples the stacks of the invocations it's profiling from a single background thread, which is idle when nothing is being profiled
+
+        Args:
+            directory (Union[str,Path]): where to write the folded stacks, created if needed
+            sample_rate (float, optional): the share of invocations to profile, from 0 to 1. Defaults to DEFAULT_SAMPLE_RATE.
+            interval (float, optional): seconds between samples. Defaults to DEFAULT_INTERVAL.
+            max_files (int, optional): how many profiles to keep, the oldest are deleted beyond this. Defaults to DEFAULT_MAX_FILES.
+        """
+        self.directory=Path(directory)
+        self.directory.mkdir(parents=True,exist_ok=True)
+        self.sample_rate=sample_rate
+        self.interval=interval
+        self.max_files=max_files
+        self._active:dict[int,_ProfiledInvocation]={}
+        self._lock=threading.Lock()
+        self._wake=threading.Event()
+        self._stopped=False
+        self._sequence=0
+        self._thread=threading.Thread(target=self._sample_loop,name="boltworks-profiler",daemon=True)
+        self._thread.start()
+
+    def should_sample(self)->bool:
+        return self.sample_rate>=1 or random.random()<self.sample_rate
+
+    @contextlib.contextmanager
+    def profile(self,name:str):
+        """Profiles the code inside it, on the current thread, writing the result on exit"""
+        thread_id=threading.get_ident()
+        with self._lock:
+            nested=thread_id in self._active #already profiling an outer handler on this thread, which will include this
+            if not nested:
+                invocation=_ProfiledInvocation(name,thread_id,sys._getframe(2)) #the frame which entered profiled()
+                self._active[thread_id]=invocation
+        if nested:
+            yield
+            return
+        self._wake.set()
+        try:
+            yield
+        finally:
+            with self._lock:
+                del self._active[thread_id]
+            try:
+                self._write(invocation,time.perf_counter()-invocation.start)
+            except OSError:
+                logger.exception("error writing profile")
+
+    def _sample_loop(self):
+        while not self._stopped:
+            if not self._active:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            time.sleep(self.interval)
+            frames=sys._current_frames()
+            with self._lock:
+                for thread_id,invocation in self._active.items():
+                    frame=frames.get(thread_id)
+                    if frame is not None:
+                        invocation.samples[_fold(frame,invocation.entry_frame)]+=1
+            del frames #holding on to the frames would keep everything they reference alive
+
+    def _write(self,invocation:_ProfiledInvocation,duration:float):
+        with self._lock:
+            self._sequence+=1
+            sequence=self._sequence
+        safe_name="".join(c if c.isalnum() or c in "._-" else "_" for c in invocation.name)
+        path=self.directory/f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{sequence:06}-{safe_name}-{duration*1e3:.0f}ms.folded"
+        with open(path,"w") as f:
+            for stack,count in invocation.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        self._rotate()
+
+    def _rotate(self):
+        profiles=sorted(self.directory.glob("*.folded"),key=lambda p: (p.stat().st_mtime,p.name))
+        for old in profiles[:max(0,len(profiles)-self.max_files)]:
+            with contextlib.suppress(FileNotFoundError): #another process sharing the directory may have got to it first
+                old.unlink()
+
+    def stop(self):
+        self._stopped=True
+        self._wake.set()
+
+
+def _fold(frame:Optional[FrameType],stop_at:Optional[FrameType])->str:
+    names=[]
+    while frame is not None:
+        code=frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        if frame is stop_at:
+            break
+        frame=frame.f_back
+    return ";".join(reversed(names))
+
+
+_profiler:Optional[SamplingProfiler]=None
+_profiler_lock=threading.Lock()
+
+
+def enable(directory:Union[str,Path],sample_rate:float=DEFAULT_SAMPLE_RATE,interval:float=DEFAULT_INTERVAL,max_files:int=DEFAULT_MAX_FILES)->SamplingProfiler:
+    """Starts profiling a share of handler invocations, replacing any profiler already enabled. See SamplingProfiler for the args."""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is not None:
+            _profiler.stop()
+        _profiler=SamplingProfiler(directory,sample_rate,interval,max_files)
+        logger.info(f"profiling {sample_rate:.1%} of invocations to {directory}")
+        return _profiler
+
+def disable():
+    global _profiler
+    with _profiler_lock:
+        if _profiler is not None:
+            _profiler.stop()
+            _profiler=None
+            logger.info("profiling disabled")
+
+def is_enabled()->bool:
+    return _profiler is not None
+
+def install_signal_toggle(directory:Union[str,Path],signum:int=getattr(signal,"SIGUSR2",0),**enable_kwargs):
+    """Toggles profiling on (with these args) and off each time the process receives `signum`. Must be called from the main thread, and isn't available on Windows."""
+    if not signum:
+        raise ValueError("signals aren't supported on this platform, call enable() and disable() instead")
+    def toggle(signum,frame):
+        #the handler runs on the main thread between bytecodes, so the actual switch is done on another thread, where taking locks is safe
+        threading.Thread(target=lambda: disable() if is_enabled() else enable(directory,**enable_kwargs),daemon=True).start()
+    signal.signal(signum,toggle)
+
+
+def profiled(name:str):
+    """A context manager which profiles the code inside it, if profiling is enabled and this invocation is sampled"""
+    profiler=_profiler
+    if profiler is None or not profiler.should_sample():
+        return contextlib.nullcontext()
+    return profiler.profile(name)
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from slack_sdk.errors import SlackApiError
+
+
+class TokenBucket:
+    def __init__(self,rate:float,capacity:float=1,clock:Callable[[],float]=time.monotonic,sleep:Callable[[float],Any]=time.sleep) -> None:
+        """A thread safe token bucket, which lets through bursts of up to `capacity` calls, and then `rate` calls per second
+
+        Args:
+            rate (float): tokens added per second
+            capacity (float, optional): the maximum number of tokens held, ie the largest burst. Defaults to 1.
+        """
+        self.rate=rate
+        self.capacity=capacity
+        self._tokens=capacity
+        self._clock=clock
+        self._sleep=sleep
+        self._last=clock()
+        self._lock=threading.Lock()
+
+    def _refill(self,now:float):
+        self._tokens=min(self.capacity,self._tokens+(now-self._last)*self.rate)
+        self._last=now
+
+    def try_acquire(self,tokens:float=1)->bool:
+        with self._lock:
+            self._refill(self._clock())
+            if self._tokens>=tokens:
+                self._tokens-=tokens
+                return True
+            return False
+
+    def acquire(self,tokens:float=1):
+        """Blocks until `tokens` tokens are available, and takes them"""
+        while True:
+            with self._lock:
+                self._refill(self._clock())
+                if self._tokens>=tokens:
+                    self._tokens-=tokens
+                    return
+                wait=(tokens-self._tokens)/self.rate
+            self._sleep(wait)
+
+    def penalize(self,seconds:float):
+        """Empties the bucket for `seconds`, eg when slack tells us to back off with a Retry-After"""
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens=min(self._tokens,1)-seconds*self.rate #so the next acquire waits at least `seconds`
+
+
+def _header(headers:Optional[dict],name:str)->Optional[str]:
+    if not headers: return None
+    for key,value in headers.items():
+        if key.lower()==name:
+            return value[0] if isinstance(value,list) else value
+    return None
+
+def _rate_limited_retry_after(response_or_error:Any)->Optional[float]:
+    """If this was a ratelimited response (or SlackApiError), the number of seconds slack asked us to wait (or 0 if it didn't say), otherwise None"""
+    response=response_or_error.response if isinstance(response_or_error,SlackApiError) else response_or_error
+    status_code=getattr(response,"status_code",None)
+    error=response.get("error") if isinstance(response_or_error,SlackApiError) else None
+    if status_code!=429 and error!="ratelimited":
+        return None
+    retry_after=_header(getattr(response,"headers",None),"retry-after")
+    try:
+        return float(retry_after) if retry_after is not None else 0
+    except ValueError:
+        return 0
+
+def call_with_rate_limit_retry(post:Callable,*args,rate_limiter:Optional[TokenBucket]=None,max_retries:int=5,base_backoff:float=1.0,sleep:Callable[[float],Any]=time.sleep,**kwargs):
+    """Calls post(*args,**kwargs), taking a token from rate_limiter first if one is passed.
+    If slack responds that we're ratelimited (either a SlackApiError from a WebClient, or a 429 WebhookResponse from respond) it waits for the Retry-After, or else an exponential backoff, and tries again, up to max_retries times.
+    """
+    for attempt in range(max_retries+1):
+        if rate_limiter: rate_limiter.acquire()
+        try:
+            response=post(*args,**kwargs)
+            retry_after=_rate_limited_retry_after(response)
+        except SlackApiError as e:
+            retry_after=_rate_limited_retry_after(e)
+            if retry_after is None or attempt==max_retries:
+                raise
+        if retry_after is None or attempt==max_retries:
+            return response
+        delay=retry_after or base_backoff*2**attempt*(1+random.random()/2) #jitter so that concurrent posters don't all retry at once
+        if rate_limiter: rate_limiter.penalize(delay)
+        else: sleep(delay)
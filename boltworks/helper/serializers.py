@@ -1,7 +1,5 @@
 from typing import Any, Callable, Protocol, Union
 
-import itsdangerous
-
 
 """
 pickle and dill both qualify as Serializers (in ascending order of heavyweightness)
@@ -12,6 +10,7 @@ class Serializer(Protocol):
 
 class SignedSerializer(Serializer):
     def __init__(self,serializer:Serializer,symmetric_key,max_age:Union[int,None]=3600*24*90):
+        import itsdangerous #here, so stores without signing don't import it
         self._signer=itsdangerous.TimestampSigner(symmetric_key) if max_age else itsdangerous.Signer(symmetric_key)
         self._max_age=max_age
         self._serializer=serializer
@@ -22,7 +21,7 @@ class SignedSerializer(Serializer):
         return signed
 
     def loads(self,signed_serialized:bytes):
-        unsigned=self._signer.unsign(signed_value=signed_serialized,max_age=self._max_age) if isinstance(self._signer,itsdangerous.TimestampSigner) else self._signer.unsign(signed_value=signed_serialized)
+        unsigned=self._signer.unsign(signed_value=signed_serialized,max_age=self._max_age) if self._max_age else self._signer.unsign(signed_value=signed_serialized)
         return self._serializer.loads(unsigned)
 
     def __getstate__(self):
@@ -1,8 +1,30 @@
 from __future__ import annotations
 
+import codecs
+import gzip
+import io
+import tempfile
 import textwrap
-from typing import Callable
+import urllib.error
+import urllib.request
+from typing import IO, Callable, Iterable, Iterator, Optional, Tuple, Union
+from slack_sdk import WebClient
+from slack_sdk.http_retry import HttpRequest as RetryHttpRequest
+from slack_sdk.http_retry import HttpResponse as RetryHttpResponse
+from slack_sdk.http_retry import RetryState
 from slack_sdk.models.blocks import SectionBlock
+from slack_sdk.webhook import WebhookResponse
+from .ratelimit import TokenBucket, call_with_rate_limit_retry
+
+MAX_QUOTED_CHUNK_CHARS=3996 #slack truncates message text at 4000 characters
+MAX_LINE_CHARS=3990 #lines longer than this are wrapped, or they could never fit in a chunk
+CHUNK_POSTS_PER_SECOND=1.0 #slack's rate limit for posting to a single channel
+CHUNK_POSTS_BURST=3
+UPLOAD_THRESHOLD_CHARS=40_000 #beyond about 10 messages worth, it's uploaded as a file instead
+UPLOAD_PREVIEW_LINES=10
+UPLOAD_PREVIEW_CHARS=1500
+UPLOAD_READ_SIZE=64*1024
+UPLOAD_SPOOL_MAX_MEMORY=8*1024*1024 #above this the upload is spooled to a temp file
 
 def simple_slack_block(text:str):
     if len(text) >= 3000: #in the unlikely that this single block is too big by itself, truncate it
@@ -26,17 +48,161 @@ def safe_post_in_blockquotes(chatpostmethod:Callable,*args,**kwargs):
         def post(topost): return chatpostmethod(*args, text=topost,**nontextkwargs)
     if len(text)<=3994:
         return post(f"```{text}```")
-    _post_lines_quoted(text.splitlines(), post)
-
-def _post_lines_quoted(lines:list[str], post:Callable):
-    while lines:
-        if len(lines[0])>3990:#if a single line is too long all by itself, which would cause an endless loop
-            _post_lines_quoted(textwrap.wrap(lines.pop(0),width=1000),post) #alternatively could inline this by popping the line, applying wrap, and then inserting the results into the list again at 0 and hitting continue to restart
-        chunk="```\n"
-        while lines:
-            if len(chunk)+len(lines[0])<=3996:
-                chunk+= lines.pop(0)+"\n"
+    upload_target=_upload_target(chatpostmethod,kwargs)
+    if upload_target and len(text)>UPLOAD_THRESHOLD_CHARS: #too long to be worth posting in chunks, so it's uploaded as a file, if it's being posted somewhere a file can be
+        client,channel,thread_ts=upload_target
+        return post_long_output(client,channel,text,thread_ts=thread_ts)
+    post_lines_quoted(text.splitlines(), post)
+
+def _upload_target(chatpostmethod:Callable,kwargs:dict)->Optional[Tuple[WebClient,str,Optional[str]]]:
+    """The client, channel and thread to upload to instead, if chatpostmethod is a WebClient's chat_postMessage or bolt's say. respond can't upload files."""
+    client=getattr(chatpostmethod,"__self__",None)
+    if isinstance(client,WebClient) and getattr(chatpostmethod,"__name__",None)=="chat_postMessage":
+        channel=kwargs.get("channel")
+        thread_ts=kwargs.get("thread_ts")
+    else: #say, which knows its client and channel
+        client=getattr(chatpostmethod,"client",None)
+        channel=kwargs.get("channel") or getattr(chatpostmethod,"channel",None)
+        thread_ts=kwargs.get("thread_ts") or getattr(chatpostmethod,"thread_ts",None)
+    if not isinstance(client,WebClient) or not isinstance(channel,str):
+        return None
+    return client,channel,thread_ts
+
+def chunk_lines_quoted(lines:Iterable[str],max_chars:int=MAX_QUOTED_CHUNK_CHARS)->Iterator[str]:
+    """Lazily packs lines into as few code-quoted chunks as possible, each fitting within a single slack message, in time linear in the total length"""
+    def fitted_lines():
+        for line in lines:
+            if len(line)>MAX_LINE_CHARS: #if a single line is too long all by itself, which would cause an endless loop
+                yield from textwrap.wrap(line,width=1000)
             else:
-                break
-        chunk+="```"
-        post(chunk)
+                yield line
+    parts:list[str]=[]
+    length=len("```\n")
+    for line in fitted_lines():
+        if parts and length+len(line)>max_chars:
+            yield "```\n"+"".join(parts)+"```"
+            parts=[]
+            length=len("```\n")
+        parts.append(line+"\n")
+        length+=len(line)+1
+    if parts:
+        yield "```\n"+"".join(parts)+"```"
+
+def post_lines_quoted(lines:Iterable[str], post:Callable, rate_limiter:Optional[TokenBucket]=None, max_retries:int=5):
+    """Posts the lines in order, in as few code-quoted messages as possible, pacing the posts with a token bucket and backing off if slack says we're ratelimited
+
+    Args:
+        lines (Iterable[str]): the lines to post, which can be a lazy iterator
+        post (Callable): called with the text of each chunk, eg `partial(client.chat_postMessage,channel=channel)` or `respond`
+        rate_limiter (TokenBucket, optional): to share a limit between concurrent posters to the same channel. Defaults to a new bucket of CHUNK_POSTS_BURST posts, refilling at CHUNK_POSTS_PER_SECOND.
+        max_retries (int, optional): how many times to retry a single chunk if ratelimited. Defaults to 5.
+    """
+    rate_limiter=rate_limiter or TokenBucket(rate=CHUNK_POSTS_PER_SECOND,capacity=CHUNK_POSTS_BURST)
+    for chunk in chunk_lines_quoted(lines): #each chunk is only posted once the previous one succeeded, so they always arrive in order
+        call_with_rate_limit_retry(post,chunk,rate_limiter=rate_limiter,max_retries=max_retries)
+
+def post_long_output(client:WebClient,
+                     channel:str,
+                     content:Union[str,IO],
+                     *,
+                     thread_ts:Optional[str]=None,
+                     upload_threshold:int=UPLOAD_THRESHOLD_CHARS,
+                     compress:bool=False,
+                     filename:str="output.txt",
+                     title:Optional[str]=None,
+                     preview_lines:int=UPLOAD_PREVIEW_LINES):
+    """Posts output of any size: inline in code-quoted messages if it's up to upload_threshold characters, otherwise uploaded once as a file with a short inline preview.
+    A file-like content is streamed, and never held in memory all at once.
+
+    Args:
+        client (WebClient): the client to post with
+        channel (str): the channel id to post in
+        content (Union[str,IO]): the output, either a str, or a file-like object opened in text or binary (utf-8) mode
+        thread_ts (str, optional): to post in a thread
+        upload_threshold (int, optional): the number of characters beyond which content is uploaded. Defaults to UPLOAD_THRESHOLD_CHARS.
+        compress (bool, optional): gzip the uploaded file. Defaults to False.
+        filename (str, optional): the name of the uploaded file, `.gz` is appended if compressing. Defaults to "output.txt".
+        title (str, optional): the title of the uploaded file
+        preview_lines (int, optional): how many lines of the start of the output to show inline with the upload. Defaults to UPLOAD_PREVIEW_LINES.
+    """
+    post_kwargs=dict(channel=channel,thread_ts=thread_ts) if thread_ts else dict(channel=channel)
+    chunks=_read_chunks(io.StringIO(content) if isinstance(content,str) else content)
+    head_chunks=[]
+    head_chars=0
+    for data,text in chunks: #reads just past the threshold, in characters, however many bytes that is
+        head_chunks.append((data,text))
+        head_chars+=len(text)
+        if head_chars>upload_threshold: break
+    head="".join(text for _,text in head_chunks)
+    if head_chars<=upload_threshold: #it all fits, so just post it the regular way
+        return safe_post_in_blockquotes(client.chat_postMessage,text=head,**post_kwargs)
+
+    preview="\n".join(head[:UPLOAD_PREVIEW_CHARS*4].splitlines()[:preview_lines])[:UPLOAD_PREVIEW_CHARS]
+    del head
+    with tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_MEMORY) as spool:
+        sink:IO[bytes]=gzip.GzipFile(fileobj=spool,mode="wb") if compress else spool # type: ignore
+        total_chars=0
+        for data,text in _chained(head_chunks,chunks):
+            total_chars+=len(text)
+            sink.write(data)
+        if compress: sink.close() #writes the gzip trailer, without closing the spool
+        length=spool.tell()
+        upload_filename=f"{filename}.gz" if compress else filename
+        upload=call_with_rate_limit_retry(client.files_getUploadURLExternal,filename=upload_filename,length=length,**({} if compress else dict(snippet_type="text")))
+        response=call_with_rate_limit_retry(_stream_to_upload_url,client,upload["upload_url"],spool,length)
+        if response.status_code!=200:
+            raise IOError(f"uploading to slack failed with status {response.status_code}")
+    comment=f"```\n{preview}\n```\n_(output truncated, the full {total_chars:,} characters are in the attached file)_"
+    return call_with_rate_limit_retry(client.files_completeUploadExternal,files=[dict(id=upload["file_id"],title=title or upload_filename)],
+                                      channel_id=channel,thread_ts=thread_ts,initial_comment=comment)
+
+def _read_chunks(reader:IO)->Iterator[Tuple[bytes,str]]:
+    """The content in chunks, each as the bytes to upload and the text they decode to, so characters are counted as characters even when reading bytes.
+    Bytes are uploaded as they were read, even if they aren't valid utf-8."""
+    decoder=codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        chunk=reader.read(UPLOAD_READ_SIZE)
+        if not chunk:
+            break
+        if isinstance(chunk,str):
+            yield chunk.encode(),chunk
+        else:
+            yield chunk,decoder.decode(chunk)
+    tail=decoder.decode(b"",final=True) #eg a multibyte character cut off at the end
+    if tail:
+        yield b"",tail
+
+def _chained(first:list,rest:Iterator)->Iterator:
+    yield from first
+    first.clear() #so the head isn't held on to while the rest is read
+    yield from rest
+
+def _stream_to_upload_url(client:WebClient,upload_url:str,fileobj:IO[bytes],length:int)->WebhookResponse:
+    """POSTs the file to an upload url from files.getUploadURLExternal, retrying as the client's retry_handlers say (eg on connection errors), as its own API calls are.
+    An error status is returned rather than raised, so a 429 can be retried by call_with_rate_limit_retry."""
+    #http.client sends a file-like body in blocks, so the upload is never read into memory all at once
+    request=urllib.request.Request(upload_url,data=fileobj,method="POST",headers={"Content-Length":str(length),"Content-Type":"application/octet-stream"})
+    handlers=[urllib.request.HTTPSHandler(context=client.ssl)]
+    if client.proxy:
+        handlers.append(urllib.request.ProxyHandler({"http":client.proxy,"https":client.proxy}))
+    opener=urllib.request.build_opener(*handlers)
+    retry_state=RetryState()
+    while True:
+        fileobj.seek(0) #each attempt sends the whole file
+        retry_response=None
+        try:
+            with opener.open(request,timeout=client.timeout) as response:
+                return WebhookResponse(url=upload_url,status_code=response.status,body=response.read().decode(errors="replace"),headers=dict(response.headers))
+        except urllib.error.HTTPError as e:
+            error:Exception=e
+            response=WebhookResponse(url=upload_url,status_code=e.code,body=e.read().decode(errors="replace"),headers=dict(e.headers))
+            retry_response=RetryHttpResponse(status_code=e.code,headers=dict(e.headers),data=response.body.encode())
+        except Exception as e:
+            error=e
+        retry_request=RetryHttpRequest(method="POST",url=upload_url,headers=dict(request.headers))
+        handler=next((h for h in client.retry_handlers if h.can_retry(state=retry_state,request=retry_request,response=retry_response,error=error)),None)
+        if handler is None:
+            if retry_response is not None:
+                return response
+            raise error
+        handler.prepare_for_next_attempt(state=retry_state,request=retry_request,response=retry_response,error=error)
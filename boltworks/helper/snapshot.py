@@ -0,0 +1,141 @@
+"""The stream format of KVStore.export and KVStore.import_, a header and then one length prefixed record per entry, optionally zlib compressed as a whole.
+
+```
+with open("store.bwkv","wb") as f:
+    store.export(f,compress=1) #on the old host
+with open("store.bwkv","rb") as f:
+    new_store.import_(f,workers=4) #on the new one
+```
+
+Entries are written and read one at a time, so memory use doesn't grow with the size of the store, only with the largest entry.
+Values are exported as they're stored, so a store with a serializer exports the serialized bytes, without deserializing them, and must be imported into a store with the same serializer.
+Keys which aren't strings, and values which aren't bytes, are pickled, so only import snapshots from somewhere you trust.
+"""
+from __future__ import annotations
+
+import pickle
+import struct
+import zlib
+from typing import BinaryIO, Iterable, Iterator, NamedTuple, Optional
+
+MAGIC=b"BWKVSNP1"
+_HEADER=struct.Struct("<8sB") #magic, compression (0 none, 1 zlib)
+_RECORD=struct.Struct("<BHIQd") #flags, then the lengths of the namespace, key and value, and the expire time (0 for never)
+_KEY_PICKLED=1
+_VALUE_PICKLED=2
+_END=0xFF
+NAMESPACE_SEPARATOR="\x00" #between the names of nested namespaces
+_BUFFER_SIZE=1<<20
+
+
+class SnapshotEntry(NamedTuple):
+    namespace:tuple #the names of the namespaces it's in, outermost first, () for none
+    key:object
+    value:object
+    expire_time:Optional[float] #as a unix time
+
+
+def write_snapshot(stream:BinaryIO,entries:Iterable[SnapshotEntry],compress:int=0)->int:
+    """Writes the entries to the stream, returning how many were written
+
+    Args:
+        compress (int, optional): a zlib level from 1 (fastest) to 9 (smallest), or 0 for no compression. Defaults to 0.
+    """
+    stream.write(_HEADER.pack(MAGIC,1 if compress else 0))
+    writer=_Writer(stream,zlib.compressobj(compress) if compress else None)
+    count=0
+    for entry in entries:
+        flags=0
+        key=entry.key
+        if isinstance(key,str):
+            key=key.encode()
+        else:
+            key=pickle.dumps(key,protocol=pickle.HIGHEST_PROTOCOL)
+            flags|=_KEY_PICKLED
+        value=entry.value
+        if not isinstance(value,bytes):
+            value=pickle.dumps(value,protocol=pickle.HIGHEST_PROTOCOL)
+            flags|=_VALUE_PICKLED
+        namespace=NAMESPACE_SEPARATOR.join(entry.namespace).encode()
+        writer.write(_RECORD.pack(flags,len(namespace),len(key),len(value),entry.expire_time or 0))
+        writer.write(namespace)
+        writer.write(key)
+        writer.write(value)
+        count+=1
+    writer.write(_RECORD.pack(_END,0,0,0,0))
+    writer.close()
+    return count
+
+def read_snapshot(stream:BinaryIO)->Iterator[SnapshotEntry]:
+    """The entries in a stream written by write_snapshot, read as they're iterated"""
+    header=stream.read(_HEADER.size)
+    if len(header)<_HEADER.size:
+        raise ValueError("not a KVStore snapshot, it's too short")
+    magic,compression=_HEADER.unpack(header)
+    if magic!=MAGIC:
+        raise ValueError("not a KVStore snapshot")
+    reader=_Reader(stream,zlib.decompressobj() if compression else None)
+    while True:
+        flags,namespace_length,key_length,value_length,expire_time=_RECORD.unpack(reader.read_exactly(_RECORD.size))
+        if flags==_END:
+            return
+        namespace=reader.read_exactly(namespace_length).decode()
+        key=reader.read_exactly(key_length)
+        value=reader.read_exactly(value_length)
+        yield SnapshotEntry(
+            tuple(namespace.split(NAMESPACE_SEPARATOR)) if namespace else (),
+            pickle.loads(key) if flags&_KEY_PICKLED else key.decode(),
+            pickle.loads(value) if flags&_VALUE_PICKLED else value,
+            expire_time or None)
+
+
+class _Writer:
+    """Buffers small writes, so each record isn't a write (or a compress call) of its own"""
+    def __init__(self,stream:BinaryIO,compressor) -> None:
+        self._stream=stream
+        self._compressor=compressor
+        self._buffer=bytearray()
+
+    def write(self,data:bytes):
+        self._buffer+=data
+        if len(self._buffer)>=_BUFFER_SIZE:
+            self._flush()
+
+    def _flush(self):
+        data=bytes(self._buffer)
+        self._buffer.clear()
+        self._stream.write(self._compressor.compress(data) if self._compressor else data)
+
+    def close(self):
+        self._flush()
+        if self._compressor:
+            self._stream.write(self._compressor.flush())
+
+class _Reader:
+    def __init__(self,stream:BinaryIO,decompressor) -> None:
+        self._stream=stream
+        self._decompressor=decompressor
+        self._buffer=bytearray()
+        self._position=0
+
+    def read_exactly(self,size:int)->bytes:
+        while len(self._buffer)-self._position<size:
+            if not self._fill(size):
+                raise ValueError("the KVStore snapshot is truncated")
+        data=bytes(self._buffer[self._position:self._position+size])
+        self._position+=size
+        return data
+
+    def _fill(self,size:int)->bool:
+        del self._buffer[:self._position] #what's been read already
+        self._position=0
+        if self._decompressor and self._decompressor.unconsumed_tail: #decompressing is capped, so a small chunk of a highly compressed stream can't inflate all at once
+            chunk=self._decompressor.unconsumed_tail
+        else:
+            chunk=self._stream.read(max(_BUFFER_SIZE,size))
+            if not chunk:
+                return False
+        if self._decompressor:
+            chunk=self._decompressor.decompress(chunk,max(_BUFFER_SIZE,size))
+        self._buffer+=chunk
+        return True
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from functools import partial
+from typing import Iterable, Optional
+
+from slack_sdk import WebClient
+from .ratelimit import TokenBucket, call_with_rate_limit_retry
+from .slack_utils import MAX_QUOTED_CHUNK_CHARS
+
+logger=logging.getLogger(__name__)
+
+
+class _StreamedMessage:
+    def __init__(self) -> None:
+        self.ts:Optional[str]=None
+        self.parts:list[str]=[]
+        self.length=0
+        self.dirty=False
+
+    def append(self,text:str):
+        self.parts.append(text)
+        self.length+=len(text)
+        self.dirty=True
+
+    def text(self)->str:
+        return "```\n"+"".join(self.parts)+"```"
+
+
+class StreamingOutput:
+    def __init__(self,client:WebClient,channel:str,thread_ts:Optional[str]=None,*,min_update_interval:float=1.0,max_chars:int=MAX_QUOTED_CHUNK_CHARS,rate_limiter:Optional[TokenBucket]=None) -> None:
+        """A file-like sink for the output of long running commands (log tails, builds etc).
+        Whatever is written to it is shown in a code-quoted message which is edited in place as more output arrives, at most once every min_update_interval seconds.
+        Once a message is full, it moves on to a new message.
+
+        ```
+        with StreamingOutput(app.client,channel) as out:
+            for line in process.stdout:
+                out.write(line)
+        ```
+
+        Args:
+            client (WebClient): the client to post and update the messages with
+            channel (str): the channel to post in
+            thread_ts (str, optional): to post the output in a thread
+            min_update_interval (float, optional): the minimum number of seconds between edits, writes in between are batched together. Defaults to 1.0.
+            max_chars (int, optional): the maximum length of each message. Defaults to MAX_QUOTED_CHUNK_CHARS.
+            rate_limiter (TokenBucket, optional): an extra limit on posts/updates, eg shared with other streams to the same channel
+        """
+        self._post_message=partial(client.chat_postMessage,channel=channel,thread_ts=thread_ts) if thread_ts else partial(client.chat_postMessage,channel=channel)
+        self._update_message=partial(client.chat_update,channel=channel)
+        self._min_update_interval=min_update_interval
+        self._budget=max_chars-len("```\n```")
+        self._rate_limiter=rate_limiter
+        self._messages=[_StreamedMessage()]
+        self._lock=threading.Lock() #guards the messages' contents
+        self._post_lock=threading.Lock() #serializes flushes, so messages are posted in order
+        self._timer:Optional[threading.Timer]=None
+        self._last_flush=float("-inf")
+        self.closed=False
+
+    def write(self,text:str)->int:
+        if self.closed:
+            raise ValueError("I/O operation on closed StreamingOutput")
+        if not text:
+            return 0
+        with self._lock:
+            self._append(text)
+            self._schedule_flush()
+        return len(text)
+
+    def writelines(self,lines:Iterable[str]):
+        for line in lines:
+            self.write(line)
+
+    def _append(self,text:str):
+        while text:
+            current=self._messages[-1]
+            room=self._budget-current.length
+            if len(text)<=room:
+                current.append(text)
+                return
+            cut=text.rfind("\n",0,room)+1 #prefer to move on to the next message at a line break
+            if not cut and not current.length:
+                cut=room #a single line too long for a whole message, so it has to be split
+            if cut:
+                current.append(text[:cut])
+                text=text[cut:]
+            self._messages.append(_StreamedMessage())
+
+    def _schedule_flush(self):
+        if self._timer is not None:
+            return #a flush is already coming, which will pick this write up too
+        delay=max(0.0,self._last_flush+self._min_update_interval-time.monotonic())
+        self._timer=threading.Timer(delay,self._flush_from_timer)
+        self._timer.daemon=True
+        self._timer.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("error updating streamed output")
+
+    def flush(self):
+        """Posts/updates every message with pending output right away"""
+        with self._post_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer=None
+                to_post=[(message,message.text()) for message in self._messages if message.dirty]
+                for message,_ in to_post:
+                    message.dirty=False
+                self._last_flush=time.monotonic()
+            for n,(message,text) in enumerate(to_post):
+                try:
+                    if message.ts is None:
+                        response=call_with_rate_limit_retry(self._post_message,text=text,rate_limiter=self._rate_limiter)
+                        message.ts=response["ts"]
+                    else:
+                        call_with_rate_limit_retry(self._update_message,ts=message.ts,text=text,rate_limiter=self._rate_limiter)
+                except BaseException:
+                    with self._lock: #so this message, and the ones after it which weren't tried, are sent by the next flush
+                        for unsent,_ in to_post[n:]:
+                            unsent.dirty=True
+                    raise
+            with self._lock: #full messages which are already up to date won't change again, so there's no need to hold on to them
+                while len(self._messages)>1 and not self._messages[0].dirty and self._messages[0].ts is not None:
+                    self._messages.pop(0)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed=True
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc_info):
+        self.close()
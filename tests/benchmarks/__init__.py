@@ -0,0 +1,6 @@
+"""Performance benchmarks for boltworks' hot paths.
+
+These aren't collected by a plain `pytest tests`, run them explicitly with `pytest tests/benchmarks`.
+If pytest-benchmark is installed it is used (eg with --benchmark-autosave), otherwise a minimal compatible fixture times them,
+and either way results are saved under .benchmarks/ and can be compared across commits with `python -m tests.benchmarks.compare`.
+"""
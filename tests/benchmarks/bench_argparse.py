@@ -0,0 +1,96 @@
+import argparse
+import copy
+import tempfile
+import typing
+
+import diskcache
+import pytest
+
+from boltworks import DiskCacheKVStore, argparse_command
+from boltworks.cli import argparse_decorator
+from ..common import mock_an_args
+
+COMMAND_TEXT="a b c --option3 7"
+
+
+def _big_parser():
+    argparser=argparse.ArgumentParser(description="a parser with a realistic number of options")
+    for n in range(30):
+        argparser.add_argument(f"--option{n}",type=int,default=n,help=f"option number {n}")
+    argparser.add_argument("positional",nargs="*")
+    return argparser
+
+def _mocked_command_args(text:str):
+    args,_,_=mock_an_args()
+    args.command=dict(command="/bench",text=text)
+    return args
+
+
+def test_argparse_command(benchmark):
+    @argparse_command(_big_parser(),echo_back=False,do_ack=False)
+    def command_handler(**kwargs):...
+    benchmark(command_handler,args=_mocked_command_args(COMMAND_TEXT))
+
+def test_argparse_command_quoted(benchmark):
+    @argparse_command(_big_parser(),echo_back=False,do_ack=False)
+    def command_handler(**kwargs):...
+    benchmark(command_handler,args=_mocked_command_args('"a b" \'c d\' e\\ f --option3 7'))
+
+def test_argparse_command_automagic(benchmark):
+    @argparse_command(echo_back=False,do_ack=False,automagic=True)
+    def command_handler(positional:str,option1:int=1,option2:str="two"):...
+    benchmark(command_handler,args=_mocked_command_args("a 3 x"))
+
+def test_deepcopy_per_invocation_baseline(benchmark):
+    #what every invocation used to do before parsers were cached, kept as a reference point
+    argparser=_big_parser()
+    command_args=COMMAND_TEXT.split()
+    def old_way():
+        parser=copy.deepcopy(argparser)
+        parser.prog="/bench"
+        parser.parse_args(command_args)
+    benchmark(old_way)
+
+
+#a plugin module's worth of commands, under `from __future__ import annotations` as plugins usually are, so the annotations are strings until resolved
+PLUGIN_COMMANDS=300
+_plugin_source="from __future__ import annotations\n"+"".join(
+    f"def command_{n}(respond, target:str, count:int=1, *, mode:Optional[Mode]=None, tags:Optional[list[str]]=None):...\n" for n in range(PLUGIN_COMMANDS))
+
+def _plugin_commands()->list:
+    namespace=dict(Optional=typing.Optional,Mode=typing.Literal["fast","slow"])
+    exec(_plugin_source,namespace)
+    return [namespace[f"command_{n}"] for n in range(PLUGIN_COMMANDS)]
+
+def _decorate_all(commands:list):
+    decorator=argparse_command(echo_back=False,do_ack=False,automagic=True)
+    for command in commands:
+        decorator(command)
+
+def _decorate_all_uncached(commands:list):
+    #what decorating used to do for each command, resolving the hints, deepcopying the parser and walking the generics every time, kept as a reference point
+    for command in commands:
+        params=list(argparse_decorator.inspect.signature(command).parameters.values())[1:]
+        parser=copy.deepcopy(argparse.ArgumentParser())
+        argparse_decorator._add_automagic_args(parser,argparse_decorator._compile_automagic_spec(command,params))
+
+@pytest.mark.parametrize("cache",["uncached_baseline","cold","from_store","memoized"])
+def test_decorate_plugin_commands(benchmark,cache):
+    commands=_plugin_commands()
+    directory=tempfile.mkdtemp()
+    disk_cache=diskcache.Cache(directory)
+    if cache=="from_store":
+        argparse_decorator.set_automagic_spec_store(DiskCacheKVStore(disk_cache))
+        _decorate_all(commands) #so the specs are stored, as by a previous run
+    def setup():
+        if cache!="memoized":
+            argparse_decorator._automagic_spec_memo.clear() #as on a fresh start
+        return (commands,),{}
+    try:
+        if cache=="memoized":
+            _decorate_all(commands)
+        benchmark.pedantic(_decorate_all_uncached if cache=="uncached_baseline" else _decorate_all,setup=setup,rounds=10)
+    finally:
+        argparse_decorator.set_automagic_spec_store(None)
+        argparse_decorator._automagic_spec_memo.clear()
+        disk_cache.close()
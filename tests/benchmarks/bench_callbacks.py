@@ -0,0 +1,46 @@
+import tempfile
+from unittest.mock import Mock
+
+import diskcache
+import dill
+import pytest
+
+from boltworks import ActionCallbacks, DiskCacheKVStore, MsgThreadCallbacks
+from ..common import mock_an_app, mock_an_args
+
+REGISTERED_CALLBACKS=1000
+
+
+@pytest.fixture
+def kvstore():
+    cache=diskcache.Cache(tempfile.mkdtemp())
+    yield DiskCacheKVStore(cache).using_serializer(dill)
+    cache.close()
+
+
+def _noop_callback(args):...
+
+def test_action_callback_dispatch(benchmark,kvstore):
+    app,_=mock_an_app()
+    callbacks=ActionCallbacks(app,kvstore)
+    buttons=[callbacks.get_button_register_callback(f"button {n}",_noop_callback) for n in range(REGISTERED_CALLBACKS)]
+    args,_,_=mock_an_args()
+    args.action=dict(action_id=buttons[REGISTERED_CALLBACKS//2].action_id)
+    benchmark(callbacks._do_callback_action,args)
+
+def test_action_callback_register(benchmark,kvstore):
+    app,_=mock_an_app()
+    callbacks=ActionCallbacks(app,kvstore)
+    benchmark(callbacks.get_button_register_callback,"button",_noop_callback)
+
+@pytest.mark.parametrize("registered",[True,False])
+def test_thread_callback_scan(benchmark,kvstore,registered):
+    #every message the app sees is checked for a thread callback, so the miss is the hot path
+    app,_=mock_an_app()
+    callbacks=MsgThreadCallbacks(app,kvstore)
+    for n in range(REGISTERED_CALLBACKS):
+        callbacks.register_thread_reply_callback(f"{n}.000",_noop_callback)
+    args,_,_=mock_an_args()
+    args.payload=dict(thread_ts="500.000" if registered else "not registered",channel="C1",user="U1")
+    args.respond=Mock(response_url="https://example.com")
+    benchmark(callbacks._check_for_thread_reply_callback,args)
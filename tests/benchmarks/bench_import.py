@@ -0,0 +1,21 @@
+import subprocess
+import sys
+
+import pytest
+
+from .conftest import BENCHMARKS_DIR
+
+#each is a fresh interpreter, so the interpreter's own startup is included, as timed by the baseline
+STATEMENTS={
+    "baseline":"pass",
+    "boltworks":"import boltworks",
+    "kvstore":"from boltworks import DiskCacheKVStore",
+    "treenodeui":"from boltworks import TreeNodeUI",
+    "everything":"from boltworks import *",
+}
+
+
+@pytest.mark.parametrize("statement",list(STATEMENTS))
+def test_import_time(benchmark,statement):
+    command=[sys.executable,"-c",STATEMENTS[statement]]
+    benchmark.pedantic(subprocess.run,args=(command,),kwargs=dict(cwd=BENCHMARKS_DIR.parent.parent,check=True),rounds=10,iterations=1)
@@ -0,0 +1,72 @@
+import io
+import itertools
+import pickle
+import tempfile
+
+import diskcache
+import dill
+import pytest
+
+from boltworks import DiskCacheKVStore, SignedSerializer
+from .synthetic import synthetic_tree
+
+SERIALIZERS={
+    "none":None,
+    "pickle":pickle,
+    "dill":dill,
+    "signed_pickle":SignedSerializer(pickle,"benchmark key"),
+    "signed_dill":SignedSerializer(dill,"benchmark key"),
+}
+
+
+@pytest.fixture(params=list(SERIALIZERS))
+def store(request):
+    cache=diskcache.Cache(tempfile.mkdtemp())
+    store=DiskCacheKVStore(cache)
+    serializer=SERIALIZERS[request.param]
+    yield store.using_serializer(serializer) if serializer else store
+    cache.close()
+
+@pytest.fixture(params=["small","tree"])
+def value(request):
+    return {"a":1,"b":[1,2,3],"c":"text"} if request.param=="small" else synthetic_tree(10,2)
+
+
+def test_set(benchmark,store,value):
+    keys=(f"key{n}" for n in itertools.count())
+    def set_one():
+        store[next(keys)]=value
+    benchmark(set_one)
+
+def test_get(benchmark,store,value):
+    store["key"]=value
+    benchmark(store.__getitem__,"key")
+
+def test_contains(benchmark,store):
+    store["key"]=1
+    benchmark(store.__contains__,"key")
+
+SNAPSHOT_ENTRIES=10000
+
+@pytest.fixture(scope="module")
+def filled_store():
+    cache=diskcache.Cache(tempfile.mkdtemp())
+    store=DiskCacheKVStore(cache)
+    with store.transact():
+        for n in range(SNAPSHOT_ENTRIES):
+            store[f"key{n}"]=pickle.dumps(synthetic_tree(4,2) if n%10==0 else {"n":n,"text":"some text"*10})
+    yield store
+    cache.close()
+
+@pytest.mark.parametrize("compress",[0,1])
+def test_export(benchmark,filled_store,compress):
+    benchmark.pedantic(lambda: filled_store.export(io.BytesIO(),compress=compress),rounds=3,iterations=1)
+
+@pytest.mark.parametrize("workers",[1,4])
+def test_import(benchmark,filled_store,workers):
+    snapshot=io.BytesIO()
+    filled_store.export(snapshot,compress=1)
+    def setup():
+        snapshot.seek(0)
+        return (DiskCacheKVStore.multiprocess(tempfile.mkdtemp(),shards=4),),{}
+    benchmark.pedantic(lambda store: store.import_(snapshot,workers=workers),setup=setup,rounds=3,iterations=1)
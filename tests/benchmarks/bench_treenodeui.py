@@ -0,0 +1,65 @@
+import tempfile
+
+import diskcache
+import dill
+import pytest
+
+from boltworks import DiskCacheKVStore, TreeNode, TreeNodeUI
+from boltworks.gui.expandpointer import _ExpandPointer
+from ..common import mock_an_app
+from .synthetic import synthetic_json, synthetic_tree
+
+
+@pytest.fixture
+def treeui():
+    app,_=mock_an_app()
+    cache=diskcache.Cache(tempfile.mkdtemp())
+    yield TreeNodeUI(app,DiskCacheKVStore(cache).using_serializer(dill))
+    cache.close()
+
+
+@pytest.mark.parametrize("width,depth",[(5,2),(10,3),(30,2)])
+def test_format_tree_collapsed(benchmark,treeui:TreeNodeUI,width,depth):
+    rootkey=treeui._rootkey_from_treenode(synthetic_tree(width,depth))
+    benchmark(treeui._format_tree,rootkey)
+
+@pytest.mark.parametrize("width,depth",[(5,3),(10,3),(30,2)])
+def test_format_tree_expanded(benchmark,treeui:TreeNodeUI,width,depth):
+    rootkey=treeui._rootkey_from_treenode(synthetic_tree(width,depth))
+    pointer=_ExpandPointer([0]+[0,0,0]*(depth-1)) #expands the first child at each level
+    blocks=benchmark(treeui._format_tree,rootkey,expandpointer=pointer)
+    assert len(blocks)<=50
+
+def test_format_tree_repaginated(benchmark,treeui:TreeNodeUI):
+    #every level is expanded with a large pagination, so the blocks have to be repaginated to fit in a message
+    rootkey=treeui._rootkey_from_treenode(synthetic_tree(width=40,depth=3,pageination=40))
+    blocks=benchmark(treeui._format_tree,rootkey,expandpointer=_ExpandPointer([0,0,0,0,0,0,0]))
+    assert len(blocks)<=50
+
+def test_format_tree_from_kvstore(benchmark,treeui:TreeNodeUI):
+    #a root that has dropped out of the in memory cache, so has to be loaded and deserialized
+    rootkey=treeui._rootkey_from_treenode(synthetic_tree(10,3))
+    def format_uncached():
+        treeui.expiring_root_dict.clear()
+        return treeui._format_tree(rootkey)
+    benchmark(format_uncached)
+
+@pytest.mark.parametrize("width,depth",[(5,3),(20,2)])
+def test_from_json(benchmark,width,depth):
+    payload=synthetic_json(width,depth)
+    benchmark(TreeNode.fromJson,"payload",payload)
+
+def test_format_tree_to_dict(benchmark,treeui:TreeNodeUI):
+    #what actually goes out to slack is the blocks serialized to dicts
+    rootkey=treeui._rootkey_from_treenode(synthetic_tree(10,3))
+    pointer=_ExpandPointer([0,0,0,0,0,0,0])
+    benchmark(lambda: [block.to_dict() for block in treeui._format_tree(rootkey,expandpointer=pointer)])
+
+def test_format_tree_preserialized(benchmark):
+    #the same render as test_format_tree_to_dict, assembled from dicts serialized when the tree was stored
+    app,_=mock_an_app()
+    cache=diskcache.Cache(tempfile.mkdtemp())
+    treeui=TreeNodeUI(app,DiskCacheKVStore(cache).using_serializer(dill),preserialize_blocks=True)
+    rootkey=treeui._rootkey_from_treenode(synthetic_tree(10,3))
+    benchmark(treeui._format_tree,rootkey,expandpointer=_ExpandPointer([0,0,0,0,0,0,0]))
+    cache.close()
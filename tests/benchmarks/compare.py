@@ -0,0 +1,45 @@
+"""Compares two saved benchmark runs, flagging regressions.
+
+`python -m tests.benchmarks.compare` compares the two latest runs in .benchmarks/,
+or pass two result files (from this suite or from pytest-benchmark --benchmark-autosave) explicitly.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from .conftest import RESULTS_DIR
+
+
+def _load(path:Path)->dict[str,float]:
+    data=json.loads(path.read_text())
+    return {b.get("fullname",b["name"]):b["stats"]["median"] for b in data["benchmarks"]}
+
+def compare(baseline:Path,current:Path,threshold:float)->int:
+    old,new=_load(baseline),_load(current)
+    regressions=0
+    print(f"{'benchmark':<85} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name in sorted(old.keys()|new.keys()):
+        if name not in old or name not in new:
+            print(f"{name:<85} {'-' if name not in old else f'{old[name]*1e6:.1f}us':>12} {'-' if name not in new else f'{new[name]*1e6:.1f}us':>12}")
+            continue
+        change=new[name]/old[name]-1
+        flag=" <-- regression" if change>threshold else ""
+        regressions+=bool(flag)
+        print(f"{name:<85} {old[name]*1e6:>10.1f}us {new[name]*1e6:>10.1f}us {change:>+8.1%}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files",nargs="*",type=Path,help="baseline and current result files, defaults to the two latest runs")
+    parser.add_argument("--threshold",type=float,default=0.2,help="fractional slowdown to flag as a regression, default 0.2")
+    args=parser.parse_args(argv)
+    files=args.files or sorted(RESULTS_DIR.glob("*.json"))[-2:]
+    if len(files)!=2:
+        parser.error("need two result files to compare")
+    return 1 if compare(files[0],files[1],args.threshold) else 0
+
+if __name__=="__main__":
+    sys.exit(main())
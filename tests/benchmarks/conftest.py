@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+
+import pytest
+
+BENCHMARKS_DIR=Path(__file__).parent
+RESULTS_DIR=BENCHMARKS_DIR.parent.parent/".benchmarks"/"boltworks"
+MIN_ROUNDS=5
+MAX_TIME=1.0 #seconds to spend on each benchmark
+
+try:
+    import pytest_benchmark # noqa
+    HAVE_PYTEST_BENCHMARK=True
+except ImportError:
+    HAVE_PYTEST_BENCHMARK=False
+
+
+def _explicitly_requested(config)->bool:
+    for arg in config.args:
+        path=Path(arg.split("::")[0]).resolve()
+        if path==BENCHMARKS_DIR or BENCHMARKS_DIR in path.parents:
+            return True
+    return False
+
+def pytest_collect_file(file_path,parent):
+    #benchmark modules are named bench_*.py so that a regular test run skips them, unless they're asked for by path
+    if file_path.suffix==".py" and file_path.name.startswith("bench_") and _explicitly_requested(parent.config) and not parent.session.isinitpath(file_path): #an explicitly passed file is collected by pytest itself
+        return pytest.Module.from_parent(parent,path=file_path)
+
+
+class _FallbackBenchmark:
+    """Times a function like pytest-benchmark's `benchmark` fixture does, for when it isn't installed"""
+    def __init__(self,name:str,group:str) -> None:
+        self.name=name
+        self.group=group
+        self.stats:dict|None=None
+        self.extra_info:dict={}
+
+    def __call__(self,fn,*args,**kwargs):
+        return self.pedantic(fn,args=args,kwargs=kwargs)
+
+    def pedantic(self,target,args=(),kwargs=None,setup=None,rounds:int|None=None,iterations:int|None=None,warmup_rounds:int=1):
+        kwargs=kwargs or {}
+        def run_once():
+            call_args,call_kwargs=(args,kwargs) if setup is None else (setup() or (args,kwargs))
+            start=time.perf_counter()
+            result=target(*call_args,**call_kwargs)
+            return time.perf_counter()-start,result
+        for _ in range(warmup_rounds):
+            run_once()
+        if iterations is None: #calibrate so each round is at least a millisecond, which keeps timer resolution out of it
+            iterations=1
+            while iterations<10**6:
+                elapsed=sum(run_once()[0] for _ in range(iterations))
+                if elapsed>=0.001: break
+                iterations*=10
+        times=[]
+        deadline=time.perf_counter()+MAX_TIME
+        result=None
+        while len(times)<(rounds or MIN_ROUNDS) or (rounds is None and time.perf_counter()<deadline):
+            elapsed=0.0
+            for _ in range(iterations):
+                t,result=run_once()
+                elapsed+=t
+            times.append(elapsed/iterations)
+        self.stats=dict(min=min(times),max=max(times),mean=statistics.mean(times),median=statistics.median(times),
+                        stddev=statistics.stdev(times) if len(times)>1 else 0.0,rounds=len(times),iterations=iterations,ops=1/statistics.mean(times))
+        return result
+
+
+if not HAVE_PYTEST_BENCHMARK:
+    _results:list[_FallbackBenchmark]=[]
+
+    @pytest.fixture
+    def benchmark(request):
+        bench=_FallbackBenchmark(request.node.name,request.node.module.__name__.rsplit(".",1)[-1])
+        yield bench
+        if bench.stats:
+            _results.append(bench)
+
+    def pytest_terminal_summary(terminalreporter):
+        if not _results: return
+        terminalreporter.write_sep("-","benchmarks (median per call)")
+        for bench in sorted(_results,key=lambda b: (b.group,b.name)):
+            terminalreporter.write_line(f"{bench.group:<22} {bench.name:<60} {bench.stats['median']*1e6:>12.1f} us  ({bench.stats['rounds']} rounds)")
+        saved=_save_results(_results)
+        terminalreporter.write_line(f"saved to {saved}")
+
+
+def _git_commit()->str:
+    try:
+        return subprocess.check_output(["git","rev-parse","--short","HEAD"],cwd=BENCHMARKS_DIR,stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+def _save_results(results)->Path:
+    """saves in the same shape as pytest-benchmark's json, so compare.py reads either"""
+    commit=_git_commit()
+    now=datetime.datetime.now()
+    data=dict(
+        machine_info=dict(node=platform.node(),python_version=platform.python_version(),machine=platform.machine()),
+        commit_info=dict(id=commit),
+        datetime=now.isoformat(),
+        benchmarks=[dict(group=b.group,name=b.name,fullname=f"{b.group}::{b.name}",stats=b.stats,extra_info=b.extra_info) for b in results],
+    )
+    RESULTS_DIR.mkdir(parents=True,exist_ok=True)
+    path=RESULTS_DIR/f"{now:%Y%m%d_%H%M%S}_{commit}.json"
+    path.write_text(json.dumps(data,indent=2))
+    return path
@@ -0,0 +1,98 @@
+"""Measures thread callback registration throughput and latency with several processes sharing one store directory, as gunicorn workers would.
+
+Each process registers thread reply callbacks as fast as it can, and each registration is a transaction (a read and a write of the thread's entry),
+so with a plain Cache every registration in every process waits on the one database's write lock, while DiskCacheKVStore.multiprocess only locks the shard holding the thread.
+Throughput, p50/p99/p99.9 latency, and the registrations which gave up waiting for the lock (diskcache.Timeout, after a second) are reported for each layout and number of processes.
+
+run with eg `python -m tests.benchmarks.kvstore_contention --processes 1 2 4 8 --seconds 5`
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import tempfile
+import time
+from unittest.mock import Mock
+
+import diskcache
+import dill
+
+from boltworks import DiskCacheKVStore, MsgThreadCallbacks
+
+LAYOUTS=("cache","multiprocess")
+
+
+def _open_store(layout:str,directory:str,shards:int)->DiskCacheKVStore:
+    if layout=="multiprocess":
+        return DiskCacheKVStore.multiprocess(directory,shards=shards)
+    return DiskCacheKVStore(diskcache.Cache(directory,timeout=1))
+
+def _noop_callback(args):...
+
+def _worker(layout:str,directory:str,shards:int,worker:int,threads:int,start_at:float,seconds:float,results):
+    callbacks=MsgThreadCallbacks(Mock(),_open_store(layout,directory,shards).using_serializer(dill),sweep_every=0)
+    latencies:list[float]=[]
+    timeouts=0
+    while time.time()<start_at: #so every process starts together, once they've all been forked and opened the store
+        time.sleep(0.001)
+    end_at=start_at+seconds
+    n=0
+    while time.time()<end_at:
+        ts=f"{worker}.{n%threads:06}" #a few registrations on each thread, like replies being awaited on a handful of messages
+        start=time.perf_counter()
+        try:
+            callbacks.register_thread_reply_callback(ts,_noop_callback)
+            latencies.append(time.perf_counter()-start)
+        except diskcache.Timeout:
+            timeouts+=1
+        n+=1
+    results.put((latencies,timeouts))
+
+def _percentile(sorted_values:list[float],fraction:float)->float:
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values)-1,int(fraction*len(sorted_values)))]
+
+def run(layout:str,processes:int,seconds:float=3,shards:int=8,threads:int=50)->dict:
+    directory=tempfile.mkdtemp()
+    _open_store(layout,directory,shards)._diskcache.close() #creates the databases up front, rather than every process racing to
+    context=multiprocessing.get_context("fork")
+    results=context.Queue()
+    start_at=time.time()+0.5
+    workers=[context.Process(target=_worker,args=(layout,directory,shards,worker,threads,start_at,seconds,results)) for worker in range(processes)]
+    for worker in workers: worker.start()
+    latencies:list[float]=[]
+    timeouts=0
+    for _ in workers:
+        worker_latencies,worker_timeouts=results.get()
+        latencies.extend(worker_latencies)
+        timeouts+=worker_timeouts
+    for worker in workers: worker.join()
+    latencies.sort()
+    return dict(layout=layout,processes=processes,registrations=len(latencies),timeouts=timeouts,throughput_per_second=len(latencies)/seconds,
+                p50_ms=_percentile(latencies,.5)*1e3,p99_ms=_percentile(latencies,.99)*1e3,p999_ms=_percentile(latencies,.999)*1e3)
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes",type=int,nargs="+",default=[1,2,4,8])
+    parser.add_argument("--layouts",nargs="+",choices=LAYOUTS,default=list(LAYOUTS))
+    parser.add_argument("--seconds",type=float,default=3,help="seconds each run lasts, default 3")
+    parser.add_argument("--shards",type=int,default=8)
+    parser.add_argument("--json",action="store_true",help="print the results as json rather than a table")
+    args=parser.parse_args(argv)
+    reports=[]
+    for processes in args.processes:
+        for layout in args.layouts:
+            report=run(layout,processes,args.seconds,args.shards)
+            reports.append(report)
+            if not args.json:
+                print(f"{layout:>12} x{processes:<3} {report['throughput_per_second']:8.1f} reg/s  p50 {report['p50_ms']:7.2f}ms  "
+                      f"p99 {report['p99_ms']:7.2f}ms  p99.9 {report['p999_ms']:7.2f}ms  timeouts {report['timeouts']}",flush=True)
+    if args.json:
+        print(json.dumps(reports,indent=2))
+
+
+if __name__=="__main__":
+    main()
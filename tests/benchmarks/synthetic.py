@@ -0,0 +1,25 @@
+"""Synthetic inputs of a set size, for the benchmarks"""
+from __future__ import annotations
+
+import itertools
+
+from boltworks import TreeNode
+
+
+def synthetic_tree(width:int,depth:int,pageination:int=10)->TreeNode:
+    """A tree where every node down to `depth` has `width` children behind an expand button"""
+    counter=itertools.count()
+    def build(level:int)->TreeNode:
+        text=f"node {next(counter)} at level {level}"
+        if level==depth:
+            return TreeNode(text)
+        return TreeNode.withSimpleSideButton(text,[build(level+1) for _ in range(width)],child_pageination=pageination)
+    return build(0)
+
+def synthetic_json(width:int,depth:int)->dict:
+    """A nested json payload, of the kind passed to TreeNode.fromJson"""
+    def build(level:int):
+        if level==depth:
+            return {f"field{i}":f"value {i}" for i in range(width)}
+        return {f"key{i}":build(level+1) if i%2==0 else [i,f"item {i}",None] for i in range(width)}
+    return build(0)
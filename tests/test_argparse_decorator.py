@@ -2,9 +2,12 @@ from __future__ import annotations
 # pylint: disable=redefined-outer-name
 
 import argparse
+import copy
 import inspect
 import sys
-from typing import Callable, List
+import threading
+import typing
+from typing import Callable, List, Optional
 from unittest import mock
 
 from slack_bolt import Args
@@ -342,4 +345,131 @@ if sys.version_info >= (3, 9):
         
         command_handler(args=args)
         
-        respond.assert_called_once_with("1")
\ No newline at end of file
+        respond.assert_called_once_with("1")
+
+def test_parser_built_once_per_command():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument("i", type=int)
+    @argparse_command(argparser,echo_back=False)
+    def command_handler(respond, i:int):
+        respond(str(i))
+
+    args,respond,say=mock_an_args()
+    with mock.patch("copy.deepcopy",wraps=copy.deepcopy) as deepcopy_spy:
+        for i in range(5):
+            args.command=dict(command="/test", text=str(i))
+            command_handler(args=args)
+    assert deepcopy_spy.call_count==1
+    assert [c.args for c in respond.call_args_list]==[(str(i),) for i in range(5)]
+    assert argparser._print_message.__func__ is argparse.ArgumentParser._print_message #the passed in parser isn't modified
+
+
+def test_help_goes_to_the_invoking_commands_respond():
+    argparser = argparse.ArgumentParser(description="helpful description")
+    argparser.add_argument("i", type=int)
+    @argparse_command(argparser)
+    def command_handler(i:int):...
+
+    results={}
+    def run(name):
+        args,respond,say=mock_an_args()
+        args.command=dict(command=f"/{name}", text="--help")
+        with pytest.raises(SystemExit):
+            command_handler(args=args)
+        results[name]=respond
+    threads=[threading.Thread(target=run,args=(f"cmd{n}",)) for n in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    for name,respond in results.items():
+        respond.assert_called_once()
+        posted=respond.call_args.args[0]
+        assert "helpful description" in posted
+        assert f"usage: /{name}" in posted
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason="automagic is only supported on python>=3.9")
+def test_automagic_spec_memoized_and_stored(tmp_path):
+    import diskcache
+    from boltworks import DiskCacheKVStore
+    from boltworks.cli import argparse_decorator
+
+    def make_handler():
+        def command_handler(respond, i:int, *, names:Optional[list[str]]=None):
+            respond(f"{i} {names}")
+        return command_handler
+
+    cache=diskcache.Cache(str(tmp_path))
+    argparse_decorator.set_automagic_spec_store(DiskCacheKVStore(cache))
+    try:
+        with mock.patch.object(argparse_decorator,"_compile_automagic_spec",wraps=argparse_decorator._compile_automagic_spec) as compile_spy:
+            decorated=[argparse_command(automagic=True)(make_handler()) for _ in range(3)]
+            assert compile_spy.call_count==1
+            argparse_decorator._automagic_spec_memo.clear() #as if restarted, so the spec must come from the store
+            decorated.append(argparse_command(automagic=True)(make_handler()))
+            assert compile_spy.call_count==1
+    finally:
+        argparse_decorator.set_automagic_spec_store(None)
+        cache.close()
+
+    for handler in decorated:
+        args,respond,say=mock_an_args()
+        args.command=dict(command="/test", text="3 --names a b")
+        handler(args=args)
+        respond.assert_called_once_with("3 ['a', 'b']")
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason="automagic is only supported on python>=3.9")
+def test_automagic_decoration_is_cheap_once_compiled():
+    from boltworks.cli import argparse_decorator
+    def make_handler():
+        def command_handler(respond, i:int, *, mode:Optional[typing.Literal["a","b"]]=None):
+            respond(f"{i} {mode}")
+        return command_handler
+    argparse_command(automagic=True)(make_handler())
+    with mock.patch("typing.get_type_hints",wraps=typing.get_type_hints) as get_type_hints_spy,\
+            mock.patch.object(argparse_decorator.copy,"deepcopy",wraps=copy.deepcopy) as deepcopy_spy:
+        handler=argparse_command(automagic=True)(make_handler())
+        assert get_type_hints_spy.call_count==0 and deepcopy_spy.call_count==0
+    args,respond,say=mock_an_args()
+    args.command=dict(command="/test", text="3 --mode b")
+    handler(args=args)
+    respond.assert_called_once_with("3 b")
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason="automagic is only supported on python>=3.9")
+def test_automagic_spec_changes_with_signature():
+    from boltworks.cli import argparse_decorator
+    def command_handler(respond, i:int):...
+    first_hash=argparse_decorator._automagic_signature_hash(command_handler,list(inspect.signature(command_handler).parameters.values())[1:])
+    def command_handler(respond, i:float):...
+    second_hash=argparse_decorator._automagic_signature_hash(command_handler,list(inspect.signature(command_handler).parameters.values())[1:])
+    assert first_hash!=second_hash
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason="automagic is only supported on python>=3.9")
+def test_automagic_spec_changes_with_what_annotations_name():
+    from boltworks.cli import argparse_decorator
+    namespace=dict(Literal=typing.Literal,Mode=typing.Literal["a","b"])
+    exec("from __future__ import annotations\ndef command_handler(respond, mode:Mode):...",namespace) #the annotation is just the string 'Mode'
+    command_handler=namespace["command_handler"]
+    params=list(inspect.signature(command_handler).parameters.values())[1:]
+    first_hash=argparse_decorator._automagic_signature_hash(command_handler,params)
+    namespace["Mode"]=typing.Literal["x","y"]
+    assert argparse_decorator._automagic_signature_hash(command_handler,params)!=first_hash
+    assert argparse_decorator._automagic_spec(command_handler,params)[0][1]["choices"]==("x","y")
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason="automagic is only supported on python>=3.9")
+def test_automagic_spec_store_failure_is_logged(caplog):
+    from boltworks.cli import argparse_decorator
+    store=mock.MagicMock()
+    store.namespaced.return_value=store
+    store.__contains__.return_value=False
+    store.__setitem__.side_effect=OSError("disk full")
+    argparse_decorator.set_automagic_spec_store(store)
+    try:
+        def command_handler(respond, store_failure_count:int):
+            respond(store_failure_count)
+        handler=argparse_command(automagic=True)(command_handler)
+    finally:
+        argparse_decorator.set_automagic_spec_store(None)
+    assert "couldn't store the automagic spec" in caplog.text
+    args,respond,say=mock_an_args()
+    args.command=dict(command="/test", text="3")
+    handler(args=args)
+    respond.assert_called_once_with(3)
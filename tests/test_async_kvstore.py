@@ -0,0 +1,141 @@
+import asyncio
+import io
+import pickle
+import tempfile
+import threading
+
+import diskcache
+import pytest
+
+from ..boltworks import AsyncKVStore, DiskCacheKVStore
+from ..boltworks.helper.kvstore import KVStore
+from ..boltworks.helper.async_kvstore import SyncKVStoreAdapter
+from .test_kvstore import all_kvstore_simple_tests
+
+
+@pytest.fixture
+def disk_cache():
+    cache=diskcache.Cache(tempfile.mkdtemp())
+    yield cache
+    cache.close()
+
+@pytest.fixture
+def async_store(disk_cache)->AsyncKVStore:
+    return DiskCacheKVStore(disk_cache).using_serializer(pickle).as_async()
+
+
+def test_async_operations(async_store:AsyncKVStore):
+    async def run():
+        await async_store.aset("k",{"a":1})
+        assert await async_store.aget("k")=={"a":1}
+        assert await async_store.acontains("k")
+        with pytest.raises(KeyError):
+            await async_store.aget("missing")
+        assert await async_store.aget("missing",None) is None
+        assert await async_store.adelete("k") and not await async_store.adelete("k")
+        await async_store.aset("short",1,expire=0.05)
+        await asyncio.sleep(0.1)
+        assert not await async_store.acontains("short")
+        assert await async_store.aexpire()>=1
+    asyncio.run(run())
+
+def test_async_bulk_operations(async_store:AsyncKVStore):
+    async def run():
+        await async_store.aset_many({f"k{n}":n for n in range(10)})
+        assert await async_store.aget_many(["k1","k5","missing"])=={"k1":1,"k5":5}
+        assert await async_store.adelete_many(["k1","k2","missing"])==2
+        assert await async_store.aget_many(["k1","k3"])=={"k3":3}
+    asyncio.run(run())
+
+def test_async_operations_dont_block_the_loop(async_store:AsyncKVStore,disk_cache):
+    async def run():
+        ticks=0
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks+=1
+                await asyncio.sleep(0)
+        ticker=asyncio.ensure_future(tick())
+        with disk_cache.transact(): #holds the lock, so the write waits on the pool until it's released
+            write=asyncio.ensure_future(async_store.aset("k",1))
+            await asyncio.sleep(0.1)
+            assert not write.done() and ticks>10
+        ticker.cancel()
+    asyncio.run(run())
+
+def test_async_transact(async_store:AsyncKVStore):
+    async def increment():
+        async with async_store.transact(key="counter") as transaction:
+            value=await transaction.aget("counter")
+            await asyncio.sleep(0.001) #lets the other increments try to interleave
+            await transaction.aset("counter",value+1)
+    async def run():
+        await async_store.aset("counter",0)
+        await asyncio.gather(*(increment() for _ in range(20)))
+        assert await async_store.aget("counter")==20
+        with pytest.raises(ValueError):
+            async with async_store.transact() as transaction:
+                await transaction.aset("counter",-1)
+                raise ValueError
+        assert await async_store.aget("counter")==20 #rolled back
+    asyncio.run(run())
+
+def test_namespaced(async_store:AsyncKVStore):
+    async def run():
+        namespaced=async_store.namespaced("ns")
+        await namespaced.aset("k",1)
+        assert not await async_store.acontains("k")
+        assert await async_store.namespaced("ns").aget("k")==1
+    asyncio.run(run())
+
+def test_as_sync_unwraps(disk_cache):
+    store=DiskCacheKVStore(disk_cache)
+    assert store.as_async().as_sync() is store
+
+def test_sync_adapter(async_store:AsyncKVStore):
+    adapter=SyncKVStoreAdapter(async_store)
+    all_kvstore_simple_tests(adapter)
+    adapter.set("k",2,expire=60)
+    assert adapter["k"]==2
+    with pytest.raises(KeyError):
+        del adapter["missing"]
+
+def test_whole_store_operations(async_store:AsyncKVStore):
+    adapter=SyncKVStoreAdapter(async_store.namespaced("ns"))
+    for n in range(5):
+        adapter[f"k{n}"]=n
+    async_store.as_sync()["outside"]=1
+    assert len(adapter)==5
+    assert sorted(adapter.keys())==[f"k{n}" for n in range(5)]
+    exported=io.BytesIO()
+    assert adapter.export(exported)==5
+    assert adapter.clear()==5 and len(adapter)==0
+    assert asyncio.run(async_store.alen())==1
+    exported.seek(0)
+    assert adapter.import_(exported)==5
+    assert adapter["k3"]==3
+
+def test_unimplemented_operations_raise():
+    class MinimalKVStore(KVStore):...
+    class MinimalAsyncKVStore(AsyncKVStore):...
+    with pytest.raises(NotImplementedError):
+        len(MinimalKVStore())
+    with pytest.raises(NotImplementedError):
+        SyncKVStoreAdapter(MinimalAsyncKVStore()).keys()
+
+def test_sync_adapter_transact_is_atomic(async_store:AsyncKVStore):
+    adapter=SyncKVStoreAdapter(async_store)
+    adapter["counter"]=0
+    def increment():
+        for _ in range(10):
+            with adapter.transact(key="counter"):
+                adapter["counter"]=adapter["counter"]+1
+    threads=[threading.Thread(target=increment) for _ in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join(30)
+    assert adapter["counter"]==40
+    with pytest.raises(ValueError):
+        with adapter.transact():
+            adapter["counter"]=0
+            raise ValueError
+    assert adapter["counter"]==40
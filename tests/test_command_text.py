@@ -0,0 +1,96 @@
+import shlex
+
+import pytest
+
+from ..boltworks.cli.command_text import split_command_text, unescape_slack_text
+
+SHLEX_CORPUS=[
+    "",
+    "   ",
+    "single",
+    "two words",
+    "  leading and trailing  ",
+    "tabs\tand\nnewlines\r\nmixed",
+    "non\xa0breaking space stays in the word",
+    "--a 1 1.5 -b 2 3",
+    "'single quoted' words",
+    '"double quoted" words',
+    "mid'dle quo'tes",
+    'mid"dle quo"tes',
+    "''",
+    '""',
+    "a '' b",
+    'a "" b',
+    "'it''s'",
+    "it\\'s",
+    'escaped\\ space',
+    'escaped\\\\backslash',
+    '"escaped \\" quote"',
+    '"backslash \\\\ in double"',
+    '"other \\n escapes stay in double"',
+    "'backslash \\ literal in single'",
+    "'double \" in single'",
+    "\"single ' in double\"",
+    "adjacent'single'\"double\"bare",
+    "unicode ünïcödé 'ü ü'",
+    "# not a comment",
+    "semi;colons|pipes&amps",
+    "\\n\\t",
+    "trailing\\\nnewline",
+    "--flag='value with spaces' --other=\"x y\"",
+    "*stars* and `backticks`",
+    "say don’t stop",
+]
+
+@pytest.mark.parametrize("text",SHLEX_CORPUS)
+def test_matches_shlex(text):
+    assert split_command_text(text)==shlex.split(text)
+
+@pytest.mark.parametrize("text",["'unclosed","\"unclosed","a 'b c","trailing\\",'"escaped close\\"'])
+def test_errors_match_shlex(text):
+    with pytest.raises(ValueError) as shlex_error:
+        shlex.split(text)
+    with pytest.raises(ValueError) as our_error:
+        split_command_text(text)
+    assert str(our_error.value)==str(shlex_error.value)
+
+@pytest.mark.parametrize("text,expected",[
+    ("plain text","plain text"),
+    ("*bold* --a 1","bold --a 1"),
+    ("glob *.py and 2*3","glob *.py and 2*3"),
+    ("(*bold in parens*)","(bold in parens)"),
+    ("a &amp; b &lt;c&gt;","a & b <c>"),
+    ("&amp;lt;","&lt;"),
+    ("<https://example.com|example.com>","example.com"),
+    ("<https://example.com>","https://example.com"),
+    ("<mailto:a@b.com|a@b.com>","a@b.com"),
+    ("<@U123> and <#C123|general>","<@U123> and <#C123|general>"),
+    ("“smart quotes” ‘single’","\"smart quotes\" 'single'"),
+    ("say don’t stop","say don’t stop"),
+    ("--msg ‘it’s fine’ “don’t”","--msg 'it’s fine' \"don’t\""),
+    ("unpaired “ and ‘","unpaired “ and ‘"),
+])
+def test_unescape_slack_text(text,expected):
+    assert unescape_slack_text(text)==expected
+
+@pytest.mark.parametrize("text,expected",[
+    ("--name “two words”",["--name","two words"]),
+    ("say don’t stop",["say","don’t","stop"]), #as shlex.split of the text as sent would
+    ("‘the users’ list’s",["the users","list’s"]),
+])
+def test_smart_quotes_tokenize(text,expected):
+    assert split_command_text(unescape_slack_text(text))==expected
+
+def test_matches_shlex_fuzzed():
+    import random
+    rng=random.Random(1234)
+    alphabet="ab '\"\\ \t\n"
+    for _ in range(5000):
+        text="".join(rng.choice(alphabet) for _ in range(rng.randint(0,12)))
+        try:
+            expected=shlex.split(text)
+        except ValueError as e:
+            with pytest.raises(ValueError,match=str(e)):
+                split_command_text(text)
+        else:
+            assert split_command_text(text)==expected,repr(text)
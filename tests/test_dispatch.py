@@ -0,0 +1,144 @@
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+from unittest.mock import Mock
+
+import dill
+import pytest
+from diskcache import Cache
+
+from ..boltworks import ActionCallbacks, CallbackDispatcher, DiskCacheKVStore, DispatchedRequest
+from ..boltworks.helper.dispatch import key_by_channel, key_by_user
+from .common import mock_an_app, mock_an_args
+
+
+def test_runs_off_thread():
+    dispatcher=CallbackDispatcher(max_workers=2)
+    ran_on=[]
+    done=threading.Event()
+    def callback():
+        ran_on.append(threading.current_thread())
+        done.set()
+    assert dispatcher.submit(callback)
+    assert done.wait(2)
+    assert ran_on[0] is not threading.current_thread()
+    dispatcher.shutdown()
+
+def test_backpressure_rejects():
+    on_rejected=Mock()
+    dispatcher=CallbackDispatcher(max_workers=1,max_pending=2,on_rejected=on_rejected)
+    release=threading.Event()
+    assert dispatcher.submit(release.wait)
+    assert dispatcher.submit(release.wait)
+    assert not dispatcher.submit(release.wait,"rejected_arg")
+    on_rejected.assert_called_once_with(DispatchedRequest("Event.wait"))
+    request=DispatchedRequest("ActionCallbacks",{"user":{"id":"U1"}},Mock(),Mock())
+    assert not dispatcher.submit(release.wait,request=request)
+    on_rejected.assert_called_with(request)
+    assert dispatcher.stats()['pending']==2
+    assert dispatcher.stats()['rejected']==2
+    release.set()
+    dispatcher.shutdown()
+    assert dispatcher.stats()['pending']==0
+    assert dispatcher.stats()['completed']==2
+
+def test_per_key_limit():
+    dispatcher=CallbackDispatcher(max_workers=4,per_key_limit=1)
+    lock=threading.Lock()
+    running={"a":0,"b":0}
+    max_running={"a":0,"b":0}
+    def callback(key):
+        with lock:
+            running[key]+=1
+            max_running[key]=max(max_running[key],running[key])
+        sleep(0.02)
+        with lock:
+            running[key]-=1
+    for _ in range(4):
+        dispatcher.submit(callback,"a",key="a")
+        dispatcher.submit(callback,"b",key="b")
+    assert dispatcher.stats()['waiting_on_key_limit']==6
+    dispatcher.shutdown() #waits for the ones held back by the key limit too
+    assert max_running=={"a":1,"b":1}
+    assert dispatcher.stats()['completed']==8
+
+def test_failures_counted():
+    dispatcher=CallbackDispatcher(max_workers=1)
+    def callback(): raise ValueError("boom")
+    dispatcher.submit(callback)
+    dispatcher.shutdown()
+    assert dispatcher.stats()['failed']==1
+
+class FlakyExecutor(ThreadPoolExecutor):
+    """fails to submit while failing is set, like a pool which has been shut down"""
+    failing=False
+    def submit(self,*args,**kwargs):
+        if self.failing: raise RuntimeError("cannot schedule new futures after shutdown")
+        return super().submit(*args,**kwargs)
+
+def test_failed_submit_releases_its_place():
+    executor=FlakyExecutor(max_workers=1)
+    dispatcher=CallbackDispatcher(executor,max_pending=1,per_key_limit=1)
+    executor.failing=True
+    with pytest.raises(RuntimeError):
+        dispatcher.submit(Mock(),key="a")
+    stats=dispatcher.stats()
+    assert (stats['pending'],stats['active_keys'],stats['failed'])==(0,0,1)
+    executor.failing=False
+    callback=Mock()
+    assert dispatcher.submit(callback,key="a") #neither max_pending nor the key's slot were leaked
+    dispatcher.shutdown()
+    callback.assert_called_once()
+
+def test_failed_start_of_waiting_callback_releases_the_key():
+    executor=FlakyExecutor(max_workers=1)
+    dispatcher=CallbackDispatcher(executor,per_key_limit=1)
+    release=threading.Event()
+    dispatcher.submit(release.wait,key="a")
+    dispatcher.submit(Mock(),key="a") #waits on the key
+    executor.failing=True
+    release.set()
+    dispatcher.shutdown()
+    stats=dispatcher.stats()
+    assert (stats['pending'],stats['active_keys'],stats['waiting_on_key_limit'],stats['failed'])==(0,0,0,1)
+
+def test_key_funcs():
+    action_body=dict(user=dict(id="U1"),channel=dict(id="C1"))
+    message_payload=dict(user="U2",channel="C2")
+    command_body=dict(user_id="U3",channel_id="C3")
+    assert [key_by_user(b) for b in (action_body,message_payload,command_body)]==["U1","U2","U3"]
+    assert [key_by_channel(b) for b in (action_body,message_payload,command_body)]==["C1","C2","C3"]
+
+def test_action_callbacks_dispatched():
+    app,_=mock_an_app()
+    dispatcher=CallbackDispatcher(max_workers=1)
+    store=DiskCacheKVStore(Cache(directory=tempfile.mkdtemp()))
+    callbacks=ActionCallbacks(app,store.using_serializer(dill),dispatcher=dispatcher)
+    def callback_func(args):
+        args.respond("dispatched")
+    button=callbacks.get_button_register_callback("(button)",callback_func).to_dict()
+
+    args_mock,respond_mock,_=mock_an_args()
+    args_mock.action=dict(action_id=button['action_id'])
+    args_mock.body=dict(user=dict(id="U1"))
+    assert callbacks._do_callback_action(args=args_mock) is None
+    args_mock.ack.assert_called_once()
+    dispatcher.shutdown()
+    respond_mock.assert_called_once_with("dispatched")
+    store._diskcache.close()
+
+def test_rejected_action_callback_request():
+    app,_=mock_an_app()
+    on_rejected=Mock()
+    dispatcher=CallbackDispatcher(max_workers=1,max_pending=0,on_rejected=on_rejected) #rejects everything
+    store=DiskCacheKVStore(Cache(directory=tempfile.mkdtemp()))
+    callbacks=ActionCallbacks(app,store.using_serializer(dill),dispatcher=dispatcher)
+    button=callbacks.get_button_register_callback("(button)",Mock()).to_dict()
+    args_mock,respond_mock,_=mock_an_args()
+    args_mock.action=dict(action_id=button['action_id'])
+    args_mock.body=dict(user=dict(id="U1"))
+    callbacks._do_callback_action(args=args_mock)
+    on_rejected.assert_called_once_with(DispatchedRequest("ActionCallbacks",args_mock.body,args_mock,respond_mock))
+    dispatcher.shutdown()
+    store._diskcache.close()
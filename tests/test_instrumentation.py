@@ -0,0 +1,135 @@
+import logging
+import pickle
+import tempfile
+from unittest.mock import Mock
+
+import diskcache
+import pytest
+
+from ..boltworks import DiskCacheKVStore, TreeNode, TreeNodeUI
+from ..boltworks.helper import instrumentation
+from ..boltworks.helper.instrumentation import InstrumentationHook, LoggingHook, Span
+from .common import mock_an_app
+
+
+@pytest.fixture
+def spans():
+    ended:list[Span]=[]
+    hook=instrumentation.add_hook(ended.append)
+    yield ended
+    instrumentation.remove_hook(hook)
+
+@pytest.fixture
+def kvstore():
+    cache=diskcache.Cache(tempfile.mkdtemp())
+    yield DiskCacheKVStore(cache).using_serializer(pickle)
+    cache.close()
+
+
+def test_noop_without_hooks():
+    assert not instrumentation.enabled()
+    first=instrumentation.span("a",x=1)
+    assert first is instrumentation.span("b")
+    with first as span:
+        span.set(y=2)
+    assert first.attributes=={}
+
+def test_callable_hook_receives_ended_spans(spans):
+    with instrumentation.span("outer",a=1) as outer:
+        with instrumentation.span("inner") as inner:
+            inner.set(b=2)
+    assert [s.name for s in spans]==["inner","outer"]
+    assert spans[0].parent is outer
+    assert spans[0].attributes==dict(b=2)
+    assert spans[1].attributes==dict(a=1)
+    assert spans[1].duration>=spans[0].duration>=0
+
+def test_error_recorded_and_raised(spans):
+    with pytest.raises(KeyError):
+        with instrumentation.span("failing"):
+            raise KeyError("x")
+    assert isinstance(spans[0].error,KeyError)
+
+def test_hook_errors_dont_propagate(spans):
+    class BrokenHook(InstrumentationHook):
+        def span_started(self,span): raise RuntimeError("broken")
+        def span_ended(self,span): raise RuntimeError("broken")
+    hook=instrumentation.add_hook(BrokenHook())
+    try:
+        with instrumentation.span("still works"):
+            pass
+    finally:
+        instrumentation.remove_hook(hook)
+    assert [s.name for s in spans]==["still works"]
+
+def test_remove_hook():
+    ended=[]
+    hook=instrumentation.add_hook(ended.append)
+    instrumentation.remove_hook(hook)
+    with instrumentation.span("unseen"):
+        pass
+    assert not ended and not instrumentation.enabled()
+
+def test_kvstore_spans(spans,kvstore):
+    kvstore["key"]={"a":"b"*100}
+    assert kvstore["key"]=={"a":"b"*100}
+    by_name={s.name:s for s in spans}
+    size=len(pickle.dumps({"a":"b"*100}))
+    assert by_name["kvstore.set"].attributes["bytes"]==size
+    assert by_name["kvstore.serialize"].parent is by_name["kvstore.set"]
+    assert by_name["kvstore.get"].attributes["bytes"]==size
+    assert by_name["kvstore.deserialize"].parent is by_name["kvstore.get"]
+
+def test_treenodeui_click_spans(spans,kvstore):
+    app,_=mock_an_app()
+    treeui=TreeNodeUI(app,kvstore)
+    rootkey=treeui._rootkey_from_treenode(TreeNode.withSimpleSideButton("parent",[TreeNode(f"child{n}") for n in range(60)],child_pageination=60))
+    treeui.expiring_root_dict.clear()
+    button=treeui._format_tree(rootkey)[0].accessory.to_dict()
+    spans.clear()
+    respond=Mock(return_value=Mock(status_code=200))
+    treeui._do_callback_action(ack=Mock(),action=button,respond=respond)
+
+    by_name={s.name:s for s in spans}
+    click=by_name["treenodeui.click"]
+    assert by_name["treenodeui.render"].parent is click
+    assert by_name["treenodeui.post"].parent is click
+    assert by_name["treenodeui.post"].attributes["status"]==200
+    assert by_name["treenodeui.get_root"].attributes["cache_hit"] is True
+    render=by_name["treenodeui.render"].attributes
+    assert render["blocks"]==len(respond.call_args.kwargs["blocks"])<=50
+    assert render["repaginations"]>0
+
+def test_logging_hook(caplog):
+    hook=instrumentation.add_hook(LoggingHook())
+    try:
+        with caplog.at_level(logging.DEBUG,logger=instrumentation.logger.name):
+            with instrumentation.span("outer"):
+                with instrumentation.span("inner",x=1):
+                    pass
+    finally:
+        instrumentation.remove_hook(hook)
+    assert caplog.messages[0].startswith("  inner ") and caplog.messages[0].endswith("x=1")
+    assert caplog.messages[1].startswith("outer ")
+
+def test_opentelemetry_hook():
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from ..boltworks.helper.instrumentation import OpenTelemetryHook
+
+    exporter=InMemorySpanExporter()
+    provider=TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    hook=instrumentation.add_hook(OpenTelemetryHook(provider.get_tracer("test")))
+    try:
+        with instrumentation.span("outer"):
+            with instrumentation.span("inner") as inner:
+                inner.set(bytes=10,obj=object())
+    finally:
+        instrumentation.remove_hook(hook)
+    inner_span,outer_span=exporter.get_finished_spans()
+    assert inner_span.name=="inner" and inner_span.parent.span_id==outer_span.context.span_id
+    assert inner_span.attributes["bytes"]==10
+    assert isinstance(inner_span.attributes["obj"],str)
@@ -1,3 +1,5 @@
+import io
+import multiprocessing
 import tempfile
 import threading
 from time import sleep
@@ -161,4 +163,136 @@ def test_using_serializer_and_encryption(disk_cache):
     mock.assert_called_once()
     assert ret==8
     assert store['persist']==3
-    
\ No newline at end of file
+    
+def test_set_with_expire(store:KVStore):
+    store.set("short",1,expire=0.1)
+    store.set("long",2,expire=60)
+    store["forever"]=3
+    assert "short" in store
+    sleep(0.2)
+    assert "short" not in store
+    assert store.expire()>=1
+    assert store["long"]==2 and store["forever"]==3
+
+def test_set_with_expire_serialized(disk_cache):
+    store = DiskCacheKVStore(disk_cache).namespaced("ns").using_serializer(dill)
+    store.set("k",simplefunc,expire=60)
+    assert store["k"] is simplefunc
+
+@pytest.fixture
+def multiprocess_store():
+    store=DiskCacheKVStore.multiprocess(tempfile.mkdtemp(),shards=4)
+    yield store
+    store._diskcache.close()
+
+def test_multiprocess_store(multiprocess_store:DiskCacheKVStore):
+    all_kvstore_simple_tests(multiprocess_store)
+    all_kvstore_simple_tests(multiprocess_store.namespaced("ns").using_serializer(pickle))
+    test_set_with_expire(multiprocess_store)
+
+def _key_in_other_shard(store:DiskCacheKVStore,key:str)->str:
+    return next(other for other in (f"other{n}" for n in range(100)) if store._shard_for(other) is not store._shard_for(key))
+
+def test_transact_with_key_locks_only_its_shard(multiprocess_store:DiskCacheKVStore):
+    other_key=_key_in_other_shard(multiprocess_store,"key")
+    written=threading.Event()
+    def write_other():
+        multiprocess_store[other_key]=1
+        written.set()
+    with multiprocess_store.transact(key="key"):
+        multiprocess_store["key"]=1
+        threading.Thread(target=write_other).start()
+        assert written.wait(5) #not waiting on this transaction
+    assert multiprocess_store["key"]==multiprocess_store[other_key]==1
+
+def _increment_under_transact(directory:str,times:int):
+    store=DiskCacheKVStore.multiprocess(directory,shards=4)
+    for _ in range(times):
+        with store.transact(key="counter"):
+            store["counter"]=store["counter"]+1
+
+def test_multiprocess_transact_across_processes(multiprocess_store:DiskCacheKVStore):
+    if "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("needs fork")
+    multiprocess_store["counter"]=0
+    context=multiprocessing.get_context("fork")
+    processes=[context.Process(target=_increment_under_transact,args=(multiprocess_store._diskcache.directory,50)) for _ in range(4)]
+    for process in processes: process.start()
+    for process in processes: process.join(60)
+    assert multiprocess_store["counter"]==200
+
+def test_nested_namespaces_nest_prefixes(store:DiskCacheKVStore):
+    nested=store.namespaced("outer").namespaced("inner")
+    nested["k"]=1
+    assert "k" not in store.namespaced("inner")
+    assert store.namespaced("outer").namespaced("inner")["k"]==1
+    assert list(store.namespaced("outer").keys())==[] #only its own entries, not its nested namespaces'
+
+def test_namespaces_dont_share_keys(store:DiskCacheKVStore):
+    store.namespaced("a").namespaced("bc")["k"]=1
+    assert "k" not in store.namespaced("ab").namespaced("c")
+    store.namespaced("tree")["k"]=1
+    store.namespaced("tree_x")["k"]=2
+    store.namespaced("tree").namespaced("sub")["k"]=3
+    assert len(store.namespaced("tree"))==1 and list(store.namespaced("tree").keys())==["k"]
+    assert store.namespaced("tree").clear()==1
+    assert store.namespaced("tree_x")["k"]==2 and store.namespaced("tree").namespaced("sub")["k"]==3
+    with pytest.raises(ValueError):
+        store.namespaced("a\x00b")
+
+def test_export_namespace_excludes_similarly_named(store:DiskCacheKVStore):
+    store.namespaced("tree")["k"]=1
+    store.namespaced("tree").namespaced("sub")["n"]=2
+    store.namespaced("tree_x")["k"]=3
+    stream=io.BytesIO()
+    assert store.export(stream,namespaces=["tree"])==2
+    store.clear()
+    stream.seek(0)
+    assert store.import_(stream)==2
+    assert store.namespaced("tree")["k"]==1 and store.namespaced("tree").namespaced("sub")["n"]==2
+    assert "k" not in store.namespaced("tree_x")
+
+def test_namespace_len_keys_clear(store:DiskCacheKVStore):
+    namespace=store.namespaced("ns").using_serializer(pickle)
+    store["outside"]=0
+    for n in range(5):
+        namespace[f"k{n}"]=n
+    assert len(namespace)==5
+    assert sorted(namespace.keys())==[f"k{n}" for n in range(5)]
+    assert namespace.clear()==5
+    assert len(namespace)==0 and store["outside"]==0
+
+@pytest.fixture(params=["cache","fanout"])
+def partitioned_store(request):
+    directory=tempfile.mkdtemp()
+    if request.param=="fanout":
+        store=DiskCacheKVStore.multiprocess(directory,shards=2,partition_namespaces=True)
+    else:
+        store=DiskCacheKVStore(diskcache.Cache(directory),partition_namespaces=True)
+    yield store
+    store._diskcache.close()
+
+def test_partitioned_namespaces(partitioned_store:DiskCacheKVStore):
+    all_kvstore_simple_tests(partitioned_store)
+    callbacks=partitioned_store.namespaced("callbacks").using_serializer(pickle)
+    threads=partitioned_store.namespaced("threads")
+    for n in range(10):
+        callbacks[f"cb{n}"]=n
+    threads.set("short",1,expire=0.05)
+    threads["long"]=2
+    assert "cb1" not in partitioned_store and "cb1" not in threads
+    assert callbacks._inner_kvstore._diskcache is not partitioned_store._diskcache
+    assert partitioned_store.namespaced("callbacks")._diskcache is callbacks._inner_kvstore._diskcache #reused
+    assert len(callbacks)==10 and len(threads)==2
+    sleep(0.1)
+    assert threads.expire()==1 and list(threads.keys())==["long"]
+    assert callbacks.clear()==10
+    assert len(callbacks)==0 and threads["long"]==2
+
+def test_nested_partitioned_namespaces(partitioned_store:DiskCacheKVStore):
+    nested=partitioned_store.namespaced("outer").namespaced("in/ner")
+    nested["k"]=1
+    assert "k" not in partitioned_store.namespaced("in/ner") and "k" not in partitioned_store.namespaced("outer")
+    assert partitioned_store.namespaced("outer").namespaced("in/ner")["k"]==1
+    with pytest.raises(ValueError):
+        partitioned_store.namespaced("..")
@@ -0,0 +1,35 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from .. import boltworks
+
+HEAVY_MODULES=["slack_bolt","slack_sdk","diskcache","itsdangerous","expiringdict","more_itertools","dill"]
+REPO_ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def modules_imported_by(statement:str)->list[str]:
+    """the HEAVY_MODULES imported by running statement in a fresh interpreter.
+    It's run from the repo root, importing boltworks as a top level package, as the repo root's own __init__ star imports all of it."""
+    script=f"import sys; {statement}; print(__import__('json').dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    output=subprocess.run([sys.executable,"-c",script],cwd=REPO_ROOT,capture_output=True,text=True,check=True).stdout
+    return json.loads(output)
+
+
+def test_import_is_lazy():
+    assert modules_imported_by("import boltworks")==[]
+
+def test_exports_import_only_what_they_need():
+    assert modules_imported_by("from boltworks import DiskCacheKVStore")==["diskcache"]
+    assert "itsdangerous" not in modules_imported_by("from boltworks import MsgThreadCallbacks")
+    assert "itsdangerous" in modules_imported_by("from boltworks import SignedSerializer; SignedSerializer(__import__('pickle'),'secret')") #only once one is made
+
+def test_exports_resolve():
+    for name in boltworks.__all__:
+        assert getattr(boltworks,name).__name__==name
+    assert set(boltworks.__all__)<=set(dir(boltworks))
+    with pytest.raises(AttributeError):
+        boltworks.NoSuchThing
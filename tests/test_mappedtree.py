@@ -0,0 +1,87 @@
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+from unittest.mock import patch
+
+import pytest
+from diskcache import Cache
+
+from ..boltworks import (ButtonChildContainer, DiskCacheKVStore, MappedTree,
+                         MenuOption, StaticSelectMenuChildContainer, TreeNode,
+                         TreeNodeUI, compile_tree)
+from ..boltworks.gui.expandpointer import _ExpandPointer
+from .common import mock_an_app
+
+
+def big_tree()->TreeNode:
+    return TreeNode("root",[
+        ButtonChildContainer([TreeNode.withSimpleSideButton(f"section {s}",[TreeNode(f"section {s} item {i}") for i in range(100)]) for s in range(50)],child_pageination=5),
+        StaticSelectMenuChildContainer([MenuOption("empty",[]),MenuOption("some",[TreeNode("a"),TreeNode("b")])]),
+    ])
+
+@pytest.fixture
+def compiled_path():
+    path=os.path.join(tempfile.mkdtemp(),"tree.bwtree")
+    compile_tree(big_tree(),path)
+    return path
+
+@pytest.fixture
+def treeui():
+    app,_=mock_an_app()
+    disk_cache=Cache(directory=tempfile.mkdtemp())
+    yield TreeNodeUI(app,DiskCacheKVStore(disk_cache).using_serializer(pickle))
+    disk_cache.close()
+
+def rendered(treeui:TreeNodeUI,root:TreeNode,pointer:list[int])->str:
+    rootkey=treeui._rootkey_from_treenode(root)
+    return json.dumps([block.to_dict() for block in treeui._format_tree(rootkey,expandpointer=_ExpandPointer(pointer))],sort_keys=True).replace(rootkey,"<root>")
+
+
+@pytest.mark.parametrize("pointer",[[0],[0,0,0],[0,0,12],[0,0,12,0,97],[0,1,0,0],[0,1,1,1]])
+def test_renders_like_the_original(treeui:TreeNodeUI,compiled_path,pointer):
+    assert rendered(treeui,MappedTree.open(compiled_path).root,pointer)==rendered(treeui,big_tree(),pointer)
+
+def test_only_nodes_on_the_path_are_loaded(treeui:TreeNodeUI,compiled_path):
+    tree=MappedTree.open(compiled_path)
+    rootkey=treeui._rootkey_from_treenode(tree.root)
+    with patch.object(MappedTree,"node",autospec=True,side_effect=MappedTree.node) as load:
+        treeui._format_tree(rootkey,expandpointer=_ExpandPointer([0,0,12,0,97]))
+    loaded=sorted(call.args[1] for call in load.call_args_list)
+    assert len(set(loaded))==5+10 #the page of sections containing section 12, and the page of its items containing item 97
+    assert tree.node_count==1+50+50*100+2
+
+def test_stored_as_a_reference(treeui:TreeNodeUI,compiled_path):
+    root=MappedTree.open(compiled_path).root
+    assert len(pickle.dumps(root))<len(compiled_path)+200
+    rootkey=treeui._rootkey_from_treenode(root)
+    treeui.expiring_root_dict.clear()
+    assert treeui._get_root(rootkey).formatblocks=="root"
+    assert MappedTree.open(compiled_path) is MappedTree.open(compiled_path) #one mapping per process
+
+def test_searchable_after_being_reloaded(treeui:TreeNodeUI,compiled_path):
+    rootkey=treeui._rootkey_from_treenode(MappedTree.open(compiled_path).root,searchable=True)
+    def has_search_box(ui:TreeNodeUI)->bool:
+        return any(block.to_dict()["type"]=="input" for block in ui._format_tree(rootkey))
+    assert has_search_box(treeui)
+    treeui.expiring_root_dict.clear()
+    treeui._searchable_roots.clear()
+    assert has_search_box(treeui)
+    app,_=mock_an_app()
+    assert has_search_box(TreeNodeUI(app,treeui.kvstore)) #eg another worker process
+    assert not any(block.to_dict()["type"]=="input" for block in treeui._format_tree(treeui._rootkey_from_treenode(MappedTree.open(compiled_path).root)))
+
+def test_readable_from_another_process(compiled_path):
+    package_parent=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    script=f"from package.boltworks import MappedTree; print(MappedTree.open({compiled_path!r}).node(60).formatblocks)"
+    output=subprocess.run([sys.executable,"-c",script],cwd=package_parent,capture_output=True,text=True,check=True).stdout
+    assert output.strip()=="section 0 item 7" #numbered breadth first: the root, 50 sections, the 2 menu nodes, then the items
+
+def test_rejects_other_files():
+    path=tempfile.mktemp()
+    with open(path,"wb") as f:
+        f.write(b"not a tree"*10)
+    with pytest.raises(ValueError):
+        MappedTree(path)
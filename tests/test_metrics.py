@@ -0,0 +1,125 @@
+import dill
+import tempfile
+import threading
+from unittest.mock import Mock
+
+import diskcache
+import pytest
+
+from ..boltworks import ActionCallbacks, DiskCacheKVStore, MsgThreadCallbacks, TreeNode, TreeNodeUI
+from ..boltworks.helper import metrics
+from ..boltworks.helper.metrics import MetricsRegistry
+from .common import mock_an_app, mock_an_args
+
+
+@pytest.fixture
+def registry():
+    registry=metrics.enable(MetricsRegistry())
+    yield registry
+    metrics.disable()
+
+@pytest.fixture
+def kvstore():
+    cache=diskcache.Cache(tempfile.mkdtemp())
+    yield DiskCacheKVStore(cache).using_serializer(dill)
+    cache.close()
+
+
+def test_counter_exposition():
+    registry=MetricsRegistry()
+    counter=registry.counter("requests_total","Requests\nhandled",["path"])
+    counter.inc(path="/a")
+    counter.inc(2.5,path='/b"c')
+    assert registry.exposition()==(
+        '# HELP requests_total Requests\\nhandled\n'
+        '# TYPE requests_total counter\n'
+        'requests_total{path="/a"} 1\n'
+        'requests_total{path="/b\\"c"} 2.5\n')
+
+def test_histogram_exposition():
+    registry=MetricsRegistry()
+    histogram=registry.histogram("latency_seconds","Latency",buckets=(0.1,1))
+    for value in (0.05,0.1,0.5,3):
+        histogram.observe(value)
+    assert registry.exposition()==(
+        '# HELP latency_seconds Latency\n'
+        '# TYPE latency_seconds histogram\n'
+        'latency_seconds_bucket{le="0.1"} 2\n'
+        'latency_seconds_bucket{le="1"} 3\n'
+        'latency_seconds_bucket{le="+Inf"} 4\n'
+        'latency_seconds_sum 3.65\n'
+        'latency_seconds_count 4\n')
+
+def test_registry_returns_same_metric_and_rejects_conflicts():
+    registry=MetricsRegistry()
+    assert registry.counter("x","X",["a"]) is registry.counter("x","X",["a"])
+    with pytest.raises(ValueError):
+        registry.histogram("x","X",["a"])
+    with pytest.raises(ValueError):
+        registry.counter("x","X",["b"])
+    with pytest.raises(ValueError):
+        registry.counter("x","X",["a"]).inc(b=1)
+
+def test_counter_thread_safe():
+    counter=MetricsRegistry().counter("n","N")
+    def work():
+        for _ in range(10000): counter.inc()
+    threads=[threading.Thread(target=work) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert counter.value()==80000
+
+def test_treenodeui_and_kvstore_metrics(registry,kvstore):
+    app,_=mock_an_app()
+    treeui=TreeNodeUI(app,kvstore)
+    rootkey=treeui._rootkey_from_treenode(TreeNode.withSimpleSideButton("parent",[TreeNode(f"child{n}") for n in range(60)],child_pageination=60))
+    treeui.expiring_root_dict.clear()
+    button=treeui._format_tree(rootkey)[0].accessory.to_dict()
+    treeui._do_callback_action(ack=Mock(),action=button,respond=Mock(return_value=Mock(status_code=200)))
+    treeui._do_callback_action(ack=Mock(),action=button,respond=Mock(return_value=Mock(status_code=200))) #a double click
+
+    assert registry.get("boltworks_treenodeui_renders_total").value()==2
+    assert registry.get("boltworks_treenodeui_repaginations_total").value()>0
+    assert registry.get("boltworks_treenodeui_render_blocks").count()==2
+    root_lookups=registry.get("boltworks_treenodeui_root_lookups_total")
+    assert root_lookups.value(cache="miss")==1 and root_lookups.value(cache="hit")==1
+    assert registry.get("boltworks_treenodeui_click_seconds").count()==1
+    assert registry.get("boltworks_treenodeui_coalesced_clicks_total").value()==1
+    assert registry.get("boltworks_kvstore_operations_total").value(op="set")==1
+    assert registry.get("boltworks_kvstore_operations_total").value(op="get")==1
+    assert registry.get("boltworks_kvstore_bytes_total").value(op="get")==registry.get("boltworks_kvstore_bytes_total").value(op="set")>0
+    assert 'boltworks_kvstore_operation_seconds_count{op="get"} 1' in registry.exposition()
+
+def test_actioncallbacks_metrics(registry,kvstore):
+    app,_=mock_an_app()
+    callbacks=ActionCallbacks(app,kvstore)
+    button=callbacks.get_button_register_callback("button",lambda args: None)
+    args,_,_=mock_an_args()
+    args.action=dict(action_id=button.action_id)
+    callbacks._do_callback_action(args)
+    args.action=dict(action_id="rcb_missing")
+    with pytest.raises(KeyError):
+        callbacks._do_callback_action(args)
+
+    assert registry.get("boltworks_actioncallbacks_dispatches_total").value(kind="action")==2
+    assert registry.get("boltworks_actioncallbacks_misses_total").value(kind="action")==1
+    assert registry.get("boltworks_actioncallbacks_callback_seconds").count(kind="action")==2
+    assert registry.get("boltworks_errors_total").value(span="actioncallbacks.run")==1
+
+def test_threadcallbacks_metrics(registry,kvstore):
+    app,_=mock_an_app()
+    callbacks=MsgThreadCallbacks(app,kvstore)
+    callbacks.register_thread_reply_callback("1.1",lambda args: None)
+    for payload in (dict(thread_ts="1.1",user="U1",channel="C1"),dict(thread_ts="2.2"),dict()):
+        args,_,_=mock_an_args()
+        args.payload=payload
+        args.respond=Mock(response_url="https://example.com")
+        callbacks._check_for_thread_reply_callback(args)
+    assert registry.get("boltworks_threadcallbacks_messages_scanned_total").value()==3
+    assert registry.get("boltworks_threadcallbacks_messages_matched_total").value()==1
+
+def test_disable_stops_collecting(kvstore):
+    registry=metrics.enable(MetricsRegistry())
+    metrics.disable()
+    kvstore["key"]=1
+    assert registry.get("boltworks_kvstore_operations_total").value(op="set")==0
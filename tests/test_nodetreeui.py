@@ -2,6 +2,10 @@
 
 import copy
 import json
+import pickle
+import random
+import tempfile
+import threading
 import pytest
 from slack_bolt import App
 from ..boltworks import *
@@ -10,8 +14,12 @@ from unittest.mock import Mock
 from diskcache import Cache
 import dill
 from slack_bolt.adapter.socket_mode import SocketModeHandler
+from slack_sdk.models.blocks import DividerBlock, HeaderBlock, InputBlock, SectionBlock
+from slack_sdk.webhook import WebhookResponse
+from ..boltworks.gui.expandpointer import _ExpandPointer
+from ..boltworks.gui.treenodeui import EMPTY_PANE_TEXT
 
-from .common import TOKEN,APPTOKEN, TEST_CHANNEL, assert_block_text_equals, fake_a_respond_from_response, get_blocks_from_response_with_assertions
+from .common import TOKEN,APPTOKEN, TEST_CHANNEL, assert_block_text_equals, fake_a_respond_from_response, get_blocks_from_response_with_assertions, mock_an_app
 
 
 
@@ -390,3 +398,262 @@ def test_json_helper_method(fixture:Tuple[App,TreeNodeUI]):
     
     
    
+
+
+@pytest.fixture
+def mocked_treeui():
+    app,_=mock_an_app()
+    disk_cache=Cache(directory=tempfile.mkdtemp())
+    yield TreeNodeUI(app,DiskCacheKVStore(disk_cache).using_serializer(pickle)) #trees without callbacks don't need dill, and pickle is much faster
+    disk_cache.close()
+
+@pytest.fixture
+def preserialized_treeui():
+    app,_=mock_an_app()
+    disk_cache=Cache(directory=tempfile.mkdtemp())
+    yield TreeNodeUI(app,DiskCacheKVStore(disk_cache).using_serializer(pickle),preserialize_blocks=True)
+    disk_cache.close()
+
+def random_tree(rng:random.Random,depth:int=0)->TreeNode:
+    formatblocks=rng.choice([
+        lambda: f"text {rng.random()}",
+        lambda: "",
+        lambda: HeaderBlock(text="header"), #no accessory, so the first container can't go on the side
+        lambda: DividerBlock(),
+        lambda: [SectionBlock(text="a"),SectionBlock(text="b")],
+        lambda: [HeaderBlock(text="header"),SectionBlock(text="b")],
+        lambda: [],
+    ])()
+    def children():
+        return [random_tree(rng,depth+1) for _ in range(rng.choice([0,1,3,8,30]) if depth<2 else rng.randint(0,2))]
+    containers=[]
+    if depth<3:
+        for _ in range(rng.choice([0,0,1,1,2,7]) if depth==0 else rng.choice([0,1,1,2])):
+            if rng.random()<0.6:
+                containers.append(ButtonChildContainer(children(),child_pageination=rng.randint(1,30)))
+            else:
+                containers.append(StaticSelectMenuChildContainer([MenuOption(f"option {n}",children()) for n in range(rng.randint(1,3))],child_pageination=rng.randint(1,30)))
+    return TreeNode(formatblocks,containers,first_child_container_on_side=rng.random()<0.7)
+
+def random_expandpointer(rng:random.Random,root:TreeNode)->_ExpandPointer:
+    pointer=[0]
+    node=root
+    while node.children_containers and rng.random()<0.8:
+        container_index=rng.randrange(len(node.children_containers))
+        container=node.children_containers[container_index]
+        pointer.append(container_index)
+        if isinstance(container,ButtonChildContainer):
+            child_nodes=container.child_nodes
+        else:
+            option=rng.randrange(len(container.child_nodes))
+            pointer.append(option)
+            child_nodes=container.child_nodes[option]
+        if not child_nodes:
+            pointer.append(0) #the "this pane is empty" node
+            break
+        child_index=rng.randrange(len(child_nodes))
+        pointer.append(child_index)
+        node=child_nodes[child_index]
+    return _ExpandPointer(pointer)
+
+def repaginate_by_rebuilding(treeui:TreeNodeUI,rootkey:str,expandpointer:_ExpandPointer,give_up_at:int=30):
+    """the way _format_tree used to fit within the block limit, rebuilding the blocks with ever smaller pages until they fit"""
+    def build(diminish_pageination_by):
+        return treeui._format_tree_recursive(parentnodes=[treeui._get_root(rootkey)],expandpointer=expandpointer,ancestral_pointer=_ExpandPointer([]),
+                                             rootkey=rootkey,parents_pagination=1,diminish_pageination_by=diminish_pageination_by)
+    diminish_pageination_by=0
+    blocks=build(0)
+    if len(blocks)>50:
+        while len(blocks)>49 and diminish_pageination_by<give_up_at:
+            diminish_pageination_by+=1
+            blocks=build(diminish_pageination_by)
+    return blocks,diminish_pageination_by
+
+def test_block_counts_match_built_blocks(mocked_treeui:TreeNodeUI):
+    rng=random.Random(1234)
+    for _ in range(100):
+        root=random_tree(rng)
+        rootkey=mocked_treeui._rootkey_from_treenode(root)
+        expandpointer=random_expandpointer(rng,root)
+        for diminish_pageination_by in (0,1,3,20):
+            built=mocked_treeui._format_tree_recursive(parentnodes=[root],expandpointer=expandpointer,ancestral_pointer=_ExpandPointer([]),
+                                                      rootkey=rootkey,parents_pagination=1,diminish_pageination_by=diminish_pageination_by)
+            counted,_=mocked_treeui._count_tree_blocks([root],[0,root._block_count],expandpointer,1,diminish_pageination_by)
+            assert counted==len(built)
+
+def test_repagination_matches_rebuilding(mocked_treeui:TreeNodeUI):
+    rng=random.Random(5678)
+    repaginated=0
+    for _ in range(100):
+        root=random_tree(rng)
+        rootkey=mocked_treeui._rootkey_from_treenode(root)
+        expandpointer=random_expandpointer(rng,root)
+        expected_blocks,expected_diminish=repaginate_by_rebuilding(mocked_treeui,rootkey,expandpointer)
+        blocks=mocked_treeui._format_tree(rootkey,expandpointer=expandpointer)
+        if expected_diminish:
+            repaginated+=1
+            assert blocks[-1].elements[0].text=="(blocks were repaginated to avoid exceeding slack limits)"
+            blocks=blocks[:-1]
+        if expected_diminish<30: #otherwise the old way never finished, so only the blocks, not the amount diminished by, are comparable
+            assert mocked_treeui._diminish_pageination_to_fit(root,expandpointer)==expected_diminish
+        assert [b.to_dict() for b in blocks]==[b.to_dict() for b in expected_blocks]
+    assert repaginated #the random trees should exercise repagination
+
+def test_block_counts_computed_for_trees_stored_before_indexing(mocked_treeui:TreeNodeUI):
+    root=TreeNode.withSimpleSideButton("parent",[TreeNode(f"child{n}") for n in range(60)],child_pageination=60)
+    rootkey=mocked_treeui._rootkey_from_treenode(root)
+    del root._block_count #as if it were stored by an older version
+    del root.children_containers[0]._block_prefix_sums
+    blocks=mocked_treeui._format_tree(rootkey,expandpointer=_ExpandPointer([0,0,0]))
+    assert len(blocks)<=50
+    assert root._block_count==1
+
+def test_preserialized_blocks_match_built_blocks(mocked_treeui:TreeNodeUI,preserialized_treeui:TreeNodeUI):
+    for seed in range(30):
+        trees=[random_tree(random.Random(seed)) for _ in range(2)] #identical trees, one for each
+        rootkeys=[mocked_treeui._rootkey_from_treenode(trees[0]),preserialized_treeui._rootkey_from_treenode(trees[1])]
+        expandpointer=random_expandpointer(random.Random(seed),trees[0])
+        built=mocked_treeui._format_tree(rootkeys[0],expandpointer=expandpointer)
+        preserialized=preserialized_treeui._format_tree(rootkeys[1],expandpointer=expandpointer)
+        assert all(isinstance(block,dict) for block in preserialized)
+        assert json.dumps([block.to_dict() for block in built],sort_keys=True).replace(rootkeys[0],"<root>")==json.dumps(preserialized,sort_keys=True).replace(rootkeys[1],"<root>")
+
+def test_preserialized_blocks_click_through(preserialized_treeui:TreeNodeUI):
+    root=TreeNode("parent",[ButtonChildContainer([TreeNode(f"child{n}") for n in range(3)]),
+                            StaticSelectMenuChildContainer([MenuOption("a",TreeNode("in a")),MenuOption("b",[])])])
+    rootkey=preserialized_treeui._rootkey_from_treenode(root)
+    preserialized_treeui.expiring_root_dict.clear() #so the serialized blocks have to survive the kvstore
+    blocks=preserialized_treeui._format_tree(rootkey)
+    respond=Mock(return_value=Mock(status_code=200))
+    preserialized_treeui._do_callback_action(ack=Mock(),action={**blocks[1]['elements'][1],"selected_option":{"value":"1"}},respond=respond)
+    expanded=respond.call_args.kwargs['blocks']
+    assert expanded[1]['elements'][1]['initial_option']['value']=="1"
+    assert expanded[2]['text']['text']==EMPTY_PANE_TEXT
+    assert preserialized_treeui._get_root(rootkey)._serialized_blocks[0][0]['text']['text']=="parent"
+
+def test_duplicate_clicks_suppressed(mocked_treeui:TreeNodeUI):
+    rootkey=mocked_treeui._rootkey_from_treenode(TreeNode.withSimpleSideButton("parent",[TreeNode("child")]))
+    button=mocked_treeui._format_tree(rootkey)[0].accessory.to_dict()
+    respond=Mock(return_value=Mock(status_code=200))
+    for _ in range(3):
+        mocked_treeui._do_callback_action(ack=Mock(),action=button,respond=respond)
+    respond.assert_called_once()
+
+def test_click_retried_after_failed_post(mocked_treeui:TreeNodeUI):
+    rootkey=mocked_treeui._rootkey_from_treenode(TreeNode.withSimpleSideButton("parent",[TreeNode("child")]))
+    button=mocked_treeui._format_tree(rootkey)[0].accessory.to_dict()
+    respond=Mock(side_effect=[WebhookResponse(url="",status_code=500,body="internal_error",headers={}),None,WebhookResponse(url="",status_code=200,body="ok",headers={})])
+    for _ in range(2):
+        mocked_treeui._do_callback_action(ack=Mock(),action=button,respond=respond)
+    assert respond.call_count==3 #the failed post, its error message, and the retry
+
+def test_duplicate_click_suppression_disabled():
+    app,_=mock_an_app()
+    treeui=TreeNodeUI(app,DiskCacheKVStore(Cache(directory=tempfile.mkdtemp())).using_serializer(pickle),duplicate_click_seconds=0)
+    rootkey=treeui._rootkey_from_treenode(TreeNode.withSimpleSideButton("parent",[TreeNode("child")]))
+    button=treeui._format_tree(rootkey)[0].accessory.to_dict()
+    respond=Mock(return_value=Mock(status_code=200))
+    for _ in range(3):
+        treeui._do_callback_action(ack=Mock(),action=button,respond=respond)
+    assert respond.call_count==3
+
+def test_clicks_during_render_coalesced_to_newest(mocked_treeui:TreeNodeUI):
+    root=TreeNode("parent",[ButtonChildContainer([TreeNode("first child")]),ButtonChildContainer([TreeNode("second child")]),ButtonChildContainer([TreeNode("third child")])])
+    rootkey=mocked_treeui._rootkey_from_treenode(root)
+    buttons=[element.to_dict() for element in mocked_treeui._format_tree(rootkey)[1].elements]
+    posting=threading.Event()
+    release=threading.Event()
+    posted=[]
+    def slow_respond(**kwargs):
+        posted.append(kwargs['blocks'])
+        posting.set()
+        release.wait(5)
+        return Mock(status_code=200)
+    first=threading.Thread(target=mocked_treeui._do_callback_action,kwargs=dict(ack=Mock(),action=buttons[0],respond=slow_respond))
+    first.start()
+    assert posting.wait(5)
+    for button in (buttons[0],buttons[1],buttons[2],buttons[2]): #while the first is in flight, a duplicate of it, then two newer states
+        assert mocked_treeui._do_callback_action(ack=Mock(),action=button,respond=slow_respond) is None
+    release.set()
+    first.join(5)
+    assert [blocks[-1].text.text for blocks in posted]==["first child","third child"] #the second child's render was superseded before it started
+    assert not mocked_treeui._inflight_renders
+
+def search(treeui:TreeNodeUI,search_action:dict,value:str):
+    respond=Mock(return_value=Mock(status_code=200))
+    treeui._do_search_action(ack=Mock(),action={**search_action,"value":value},respond=respond)
+    return respond.call_args.kwargs['blocks']
+
+def texts(blocks)->list[str]:
+    return [block.text.text for block in blocks if isinstance(block,SectionBlock)]
+
+def test_search_expands_to_matches(mocked_treeui:TreeNodeUI):
+    root=TreeNode.fromJson("json",json.loads(json1),pageination=2)
+    rootkey=mocked_treeui._rootkey_from_treenode(root,searchable=True)
+    blocks=mocked_treeui._format_tree(rootkey)
+    assert isinstance(blocks[0],InputBlock)
+    search_box=blocks[0].element.to_dict()
+
+    blocks=search(mocked_treeui,search_box,"LONGITUDE")
+    assert blocks[1].elements[0].text=="match 1 of 1 for _LONGITUDE_"
+    assert any("longitude: -122.1234" in text for text in texts(blocks))
+
+    blocks=search(mocked_treeui,search_box,"no such words")
+    assert blocks[1].elements[0].text=="no matches for _no such words_"
+    assert texts(blocks)==["json"]
+
+def test_search_next_and_previous_match(mocked_treeui:TreeNodeUI):
+    root=TreeNode.withSimpleSideButton("root",[TreeNode(f"item {n} {'even' if n%2==0 else 'odd'}") for n in range(30)],child_pageination=5)
+    rootkey=mocked_treeui._rootkey_from_treenode(root,searchable=True)
+    search_box=mocked_treeui._format_tree(rootkey)[0].element.to_dict()
+    blocks=search(mocked_treeui,search_box,"odd")
+    assert blocks[1].elements[0].text=="match 1 of 15 for _odd_"
+    previous,next=(button.to_dict() for button in blocks[2].elements)
+    assert previous['action_id']!=next['action_id']
+    blocks=search(mocked_treeui,next,next['value'])
+    assert blocks[1].elements[0].text=="match 2 of 15 for _odd_"
+    assert "item 3 odd" in texts(blocks)
+    blocks=search(mocked_treeui,previous,previous['value'])
+    assert blocks[1].elements[0].text=="match 15 of 15 for _odd_" #wraps around
+    assert "item 29 odd" in texts(blocks)
+    assert len(blocks)<=50
+
+def test_search_index_stored_seperately(mocked_treeui:TreeNodeUI):
+    root=TreeNode("root",ButtonChildContainer([TreeNode("alpha beta"),TreeNode("beta")]))
+    rootkey=mocked_treeui._rootkey_from_treenode(root,searchable=True)
+    search_index=mocked_treeui.kvstore[rootkey+"^search"]
+    assert [tuple(p) for p in search_index.search("beta")]==[(0,0,0),(0,0,1)]
+    assert [tuple(p) for p in search_index.search("Alpha, BETA")]==[(0,0,0)]
+    assert search_index.search("")==[]
+    assert not hasattr(mocked_treeui.kvstore[rootkey],"pointers")
+
+def test_modal_renders_with_view_block_limit(mocked_treeui:TreeNodeUI):
+    root=TreeNode.withSimpleSideButton("a rather long title for a modal",[TreeNode(f"child{n}") for n in range(80)],child_pageination=80)
+    mocked_treeui.open_in_modal("trigger",root,expand_first=True)
+    kwargs=mocked_treeui._slack_chat_client.views_open.call_args.kwargs
+    view=kwargs['view']
+    assert kwargs['trigger_id']=="trigger" and view['type']=="modal"
+    assert len(view['title']['text'])==24
+    assert len(view['blocks'])==81 #would be repaginated into a message
+    assert all(isinstance(block,dict) for block in view['blocks'])
+
+def test_clicks_in_views_update_the_view(mocked_treeui:TreeNodeUI):
+    client=mocked_treeui._slack_chat_client
+    root=TreeNode.withSimpleSideButton("parent",[TreeNode(f"child{n}") for n in range(80)],child_pageination=80)
+    mocked_treeui.open_in_modal("trigger",root)
+    button=client.views_open.call_args.kwargs['view']['blocks'][0]['accessory']
+    respond=Mock()
+    modal=dict(id="V1",type="modal",title=dict(type="plain_text",text="parent"),close=dict(type="plain_text",text="Close"),blocks=[],hash="1")
+    mocked_treeui._do_callback_action(ack=Mock(),action=button,respond=respond,body=dict(container=dict(type="view",view_id="V1"),view=modal,user=dict(id="U1")))
+    respond.assert_not_called()
+    kwargs=client.views_update.call_args.kwargs
+    assert kwargs['view_id']=="V1" and kwargs['view']['title']==modal['title']
+    assert len(kwargs['view']['blocks'])==81 and "hash" not in kwargs['view']
+
+    mocked_treeui.publish_to_home("U1",root)
+    home=client.views_publish.call_args.kwargs
+    assert home['user_id']=="U1" and home['view']['type']=="home"
+    button=home['view']['blocks'][0]['accessory']
+    mocked_treeui._do_callback_action(ack=Mock(),action=button,respond=respond,body=dict(container=dict(type="view",view_id="V2"),view=dict(id="V2",type="home"),user=dict(id="U1")))
+    assert len(client.views_publish.call_args.kwargs['view']['blocks'])==81
+    respond.assert_not_called()
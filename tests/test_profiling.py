@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import os
+import signal
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+
+from ..boltworks import ActionCallbacks, DiskCacheKVStore
+from ..boltworks.helper import profiling
+from .common import mock_an_app, mock_an_args
+
+
+@pytest.fixture
+def profile_dir():
+    directory=Path(tempfile.mkdtemp())
+    yield directory
+    profiling.disable()
+
+
+def busy_wait_in_a_recognizable_function(seconds:float):
+    end=time.perf_counter()+seconds
+    while time.perf_counter()<end:
+        pass
+
+def read_profiles(directory:Path)->dict[str,str]:
+    return {p.name:p.read_text() for p in directory.glob("*.folded")}
+
+
+def test_disabled_is_a_noop(profile_dir):
+    assert not profiling.is_enabled()
+    with profiling.profiled("nothing"):
+        busy_wait_in_a_recognizable_function(0.01)
+    assert not read_profiles(profile_dir)
+
+def test_profile_written_as_folded_stacks(profile_dir):
+    profiling.enable(profile_dir,sample_rate=1,interval=0.001)
+    with profiling.profiled("my handler"):
+        busy_wait_in_a_recognizable_function(0.1)
+    (name,content),=read_profiles(profile_dir).items()
+    assert "my_handler" in name and name.endswith("ms.folded")
+    lines=content.splitlines()
+    assert lines
+    for line in lines:
+        stack,count=line.rsplit(" ",1)
+        assert int(count)>0
+        assert stack.startswith("test_profile_written_as_folded_stacks (test_profiling.py:") #starts at the profiled frame, not the test runner
+    assert any("busy_wait_in_a_recognizable_function" in line for line in lines)
+
+def test_sample_rate_zero_profiles_nothing(profile_dir):
+    profiling.enable(profile_dir,sample_rate=0)
+    for _ in range(20):
+        with profiling.profiled("never"):
+            pass
+    assert not read_profiles(profile_dir)
+
+def test_nested_profiles_only_write_outer(profile_dir):
+    profiling.enable(profile_dir,sample_rate=1,interval=0.001)
+    with profiling.profiled("outer"):
+        with profiling.profiled("inner"):
+            busy_wait_in_a_recognizable_function(0.01)
+    (name,_),=read_profiles(profile_dir).items()
+    assert "outer" in name
+
+def test_rotation_keeps_newest(profile_dir):
+    profiling.enable(profile_dir,sample_rate=1,max_files=3)
+    for n in range(6):
+        with profiling.profiled(f"handler{n}"):
+            pass
+        time.sleep(0.01) #distinct mtimes
+    names=sorted(read_profiles(profile_dir))
+    assert len(names)==3
+    assert all(f"handler{n}" in " ".join(names) for n in (3,4,5))
+
+def test_enable_disable_at_runtime(profile_dir):
+    profiler=profiling.enable(profile_dir,sample_rate=1)
+    assert profiling.is_enabled()
+    profiling.disable()
+    assert not profiling.is_enabled()
+    with profiling.profiled("after disable"):
+        pass
+    assert not read_profiles(profile_dir)
+    profiler._thread.join(1)
+    assert not profiler._thread.is_alive()
+
+@pytest.mark.skipif(not hasattr(signal,"SIGUSR2"),reason="no SIGUSR2 on this platform")
+def test_signal_toggle(profile_dir):
+    previous=signal.getsignal(signal.SIGUSR2)
+    try:
+        profiling.install_signal_toggle(profile_dir,sample_rate=1)
+        os.kill(os.getpid(),signal.SIGUSR2)
+        deadline=time.time()+2
+        while not profiling.is_enabled() and time.time()<deadline: time.sleep(0.01)
+        assert profiling.is_enabled()
+        os.kill(os.getpid(),signal.SIGUSR2)
+        while profiling.is_enabled() and time.time()<deadline: time.sleep(0.01)
+        assert not profiling.is_enabled()
+    finally:
+        signal.signal(signal.SIGUSR2,previous)
+
+def test_action_callback_profiled(profile_dir):
+    profiling.enable(profile_dir,sample_rate=1,interval=0.001)
+    app,_=mock_an_app()
+    kvstore=Mock(DiskCacheKVStore)
+    callbacks=ActionCallbacks(app,kvstore)
+    def slow_callback(args):
+        busy_wait_in_a_recognizable_function(0.05)
+    kvstore.__getitem__=Mock(return_value=slow_callback)
+    args,_,_=mock_an_args()
+    args.action=dict(action_id="rcb_somekey")
+    callbacks._do_callback_action(args)
+    (name,content),=read_profiles(profile_dir).items()
+    assert "actioncallbacks.action" in name
+    assert "slow_callback" in content
@@ -0,0 +1,103 @@
+import pickle
+import sqlite3
+import tempfile
+from unittest.mock import Mock
+
+import dill
+import pytest
+from diskcache import Cache
+from slack_sdk.models.blocks import SectionBlock
+
+from ..boltworks import (ChildNodeProvider, DiskCacheKVStore,
+                         GeneratorChildNodeProvider, LineFileChildNodeProvider,
+                         SQLiteChildNodeProvider, TreeNode, TreeNodeUI,
+                         VirtualChildContainer)
+from ..boltworks.gui.expandpointer import _ExpandPointer
+from .common import mock_an_app
+
+
+class CountingProvider(ChildNodeProvider):
+    """a million children, recording which ranges were built"""
+    def __init__(self,rows:int=1_000_000) -> None:
+        self.rows=rows
+        self.ranges=[]
+    def row_count(self):
+        return self.rows
+    def get_range(self,start,stop):
+        self.ranges.append((start,stop))
+        return [TreeNode(f"row {n}") for n in range(start,stop)]
+
+
+@pytest.fixture
+def treeui():
+    app,_=mock_an_app()
+    disk_cache=Cache(directory=tempfile.mkdtemp())
+    yield TreeNodeUI(app,DiskCacheKVStore(disk_cache).using_serializer(dill))
+    disk_cache.close()
+
+def texts(blocks)->list[str]:
+    return [block.text.text for block in blocks if isinstance(block,SectionBlock)]
+
+
+def test_only_the_visible_page_is_built(treeui:TreeNodeUI):
+    provider=CountingProvider()
+    rootkey=treeui._rootkey_from_treenode(TreeNode("root",VirtualChildContainer(provider,child_pageination=10)))
+    assert provider.ranges==[]
+    blocks=treeui._format_tree(rootkey,expandpointer=_ExpandPointer([0,0,543_210]))
+    assert texts(blocks)==["root"]+[f"row {n}" for n in range(543_210,543_220)]
+    assert provider.ranges==[(543_210,543_220)]
+    assert blocks[-1].elements[0].action_id.endswith("^0,0,543200") and blocks[-1].elements[1].action_id.endswith("^0,0,543220") #prev and next
+
+def test_virtual_children_expand_and_repaginate(treeui:TreeNodeUI):
+    def row_with_children(n):
+        return TreeNode.withSimpleSideButton(f"row {n}",[TreeNode(f"row {n} child {c}") for c in range(40)],child_pageination=40)
+    class NestedProvider(CountingProvider):
+        def get_range(self,start,stop):
+            self.ranges.append((start,stop))
+            return [row_with_children(n) for n in range(start,stop)]
+    provider=NestedProvider()
+    rootkey=treeui._rootkey_from_treenode(TreeNode("root",VirtualChildContainer(provider,child_pageination=30)))
+    treeui.expiring_root_dict.clear() #the provider has to survive the kvstore
+    blocks=treeui._format_tree(rootkey,expandpointer=_ExpandPointer([0,0,7,0,3]))
+    assert len(blocks)<=50
+    assert "row 7" in texts(blocks) and "row 7 child 3" in texts(blocks)
+
+def test_virtual_children_counted_once_and_empty(treeui:TreeNodeUI):
+    provider=CountingProvider(rows=0)
+    provider.row_count=Mock(return_value=0)
+    rootkey=treeui._rootkey_from_treenode(TreeNode("root",VirtualChildContainer(provider)))
+    assert texts(treeui._format_tree(rootkey,expandpointer=_ExpandPointer([0,0,0])))==["root","_(this pane is empty)_"]
+    treeui._format_tree(rootkey,expandpointer=_ExpandPointer([0,0,0]))
+    provider.row_count.assert_called_once()
+
+def test_sqlite_provider(treeui:TreeNodeUI):
+    database=tempfile.mktemp(suffix=".db")
+    with sqlite3.connect(database) as connection:
+        connection.execute("CREATE TABLE jobs (id INTEGER PRIMARY KEY, status TEXT)")
+        connection.executemany("INSERT INTO jobs VALUES (?,?)",((n,"ok" if n%3 else "failed") for n in range(100_000)))
+    provider=SQLiteChildNodeProvider(database,"SELECT id,status FROM jobs WHERE status=? ORDER BY id",["failed"])
+    assert provider.row_count()==33_334
+    assert [node.formatblocks for node in provider.get_range(1000,1003)]==["3000 | failed","3003 | failed","3006 | failed"]
+    provider=pickle.loads(pickle.dumps(provider))
+    rootkey=treeui._rootkey_from_treenode(TreeNode("failed jobs",VirtualChildContainer(provider,child_pageination=5)))
+    blocks=treeui._format_tree(rootkey,expandpointer=_ExpandPointer([0,0,33_333]))
+    assert texts(blocks)==["failed jobs","99990 | failed","99993 | failed","99996 | failed","99999 | failed"] #the last page
+
+def test_line_file_provider():
+    path=tempfile.mktemp()
+    lines=[f"line {n}" if n%10 else "" for n in range(1000)]
+    with open(path,"w") as f:
+        f.write("\n".join(lines)) #no newline after the last line
+    provider=LineFileChildNodeProvider(path)
+    assert provider.row_count()==1000
+    for start,stop in ((0,3),(255,258),(511,512),(990,1000)):
+        assert [node.formatblocks for node in provider.get_range(start,stop)]==[line or " " for line in lines[start:stop]]
+    assert pickle.loads(pickle.dumps(provider)).get_range(999,1000)[0].formatblocks=="line 999"
+
+def numbers():
+    return (TreeNode(f"number {n}") for n in range(50))
+
+def test_generator_provider():
+    provider=GeneratorChildNodeProvider(numbers)
+    assert provider.row_count()==50
+    assert [node.formatblocks for node in provider.get_range(10,12)]==["number 10","number 11"]
@@ -0,0 +1,203 @@
+import gzip
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import Mock, patch
+
+import pytest
+from slack_bolt import Say
+from slack_sdk import WebClient
+from slack_sdk.http_retry import FixedValueRetryIntervalCalculator, RetryHandler
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web import SlackResponse
+from slack_sdk.webhook import WebhookResponse
+
+from ..boltworks.helper import slack_utils
+from ..boltworks.helper.ratelimit import TokenBucket, call_with_rate_limit_retry
+from ..boltworks.helper.slack_utils import (_stream_to_upload_url,
+                                            chunk_lines_quoted,
+                                            post_lines_quoted,
+                                            post_long_output,
+                                            safe_post_in_blockquotes)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now=0.0
+        self.sleeps=[]
+    def __call__(self):
+        return self.now
+    def sleep(self,seconds):
+        self.sleeps.append(seconds)
+        self.now+=seconds
+
+
+def test_short_text_single_post():
+    post=Mock()
+    safe_post_in_blockquotes(post,"hello")
+    post.assert_called_once_with("```hello```")
+
+def test_chunks_fit_and_keep_order():
+    lines=[f"line {i} "+"x"*(i%50) for i in range(2000)]
+    chunks=list(chunk_lines_quoted(lines))
+    assert all(len(c)<=4000 for c in chunks)
+    assert all(c.startswith("```\n") and c.endswith("```") for c in chunks)
+    assert "".join(c[4:-3] for c in chunks).splitlines()==lines
+
+def test_long_line_wrapped():
+    chunks=list(chunk_lines_quoted(["before","y"*10000,"after"]))
+    assert all(len(c)<=4000 for c in chunks)
+    joined="".join(c[4:-3] for c in chunks).splitlines()
+    assert joined[0]=="before" and joined[-1]=="after"
+    assert "".join(joined[1:-1])=="y"*10000
+
+def test_chunks_lazily_from_iterator():
+    consumed=[]
+    def lines():
+        for i in range(10000):
+            consumed.append(i)
+            yield "z"*100
+    chunks=chunk_lines_quoted(lines())
+    next(chunks)
+    assert len(consumed)<50
+
+def test_long_text_posted_in_chunks():
+    post=Mock()
+    text="\n".join(f"line {i}" for i in range(1000)) #few enough chunks to fit in the default burst
+    safe_post_in_blockquotes(post,text=text,channel="C1")
+    assert post.call_count>1
+    assert all(c.kwargs["channel"]=="C1" for c in post.call_args_list)
+    assert "".join(c.kwargs["text"][4:-3] for c in post.call_args_list).splitlines()==text.splitlines()
+
+def test_token_bucket():
+    clock=FakeClock()
+    bucket=TokenBucket(rate=2,capacity=3,clock=clock,sleep=clock.sleep)
+    for _ in range(3): bucket.acquire()
+    assert clock.sleeps==[]
+    bucket.acquire()
+    assert clock.now==pytest.approx(0.5)
+    assert not bucket.try_acquire()
+    bucket.penalize(10)
+    bucket.acquire()
+    assert clock.now>=10.5
+
+def _ratelimited_error(retry_after="2"):
+    response=SlackResponse(client=None,http_verb="POST",api_url="",req_args={},data={"ok":False,"error":"ratelimited"},headers={"Retry-After":retry_after},status_code=429)
+    return SlackApiError("ratelimited",response)
+
+def test_retries_after_ratelimited_error():
+    clock=FakeClock()
+    bucket=TokenBucket(rate=1,capacity=1,clock=clock,sleep=clock.sleep)
+    post=Mock(side_effect=[_ratelimited_error("7"),"ok"])
+    assert call_with_rate_limit_retry(post,"chunk",rate_limiter=bucket)=="ok"
+    assert post.call_count==2
+    assert clock.now>=7
+
+def test_retries_after_ratelimited_webhook_response():
+    sleeps=[]
+    ratelimited=WebhookResponse(url="",status_code=429,body="rate_limited",headers={"retry-after":"3"})
+    ok=WebhookResponse(url="",status_code=200,body="ok",headers={})
+    post=Mock(side_effect=[ratelimited,ok])
+    assert call_with_rate_limit_retry(post,"chunk",sleep=sleeps.append) is ok
+    assert sleeps==[3]
+
+def test_gives_up_after_max_retries():
+    post=Mock(side_effect=_ratelimited_error("0"))
+    with pytest.raises(SlackApiError):
+        call_with_rate_limit_retry(post,"chunk",max_retries=2,sleep=lambda s: None)
+    assert post.call_count==3
+
+def test_other_errors_not_retried():
+    response=SlackResponse(client=None,http_verb="POST",api_url="",req_args={},data={"ok":False,"error":"channel_not_found"},headers={},status_code=200)
+    post=Mock(side_effect=SlackApiError("nope",response))
+    with pytest.raises(SlackApiError):
+        call_with_rate_limit_retry(post,"chunk",sleep=lambda s: None)
+    assert post.call_count==1
+
+def test_post_lines_quoted_with_shared_limiter():
+    clock=FakeClock()
+    bucket=TokenBucket(rate=1,capacity=1,clock=clock,sleep=clock.sleep)
+    post=Mock()
+    post_lines_quoted(("w"*1000 for _ in range(20)),post,rate_limiter=bucket)
+    assert post.call_count==7 #3 lines of 1000 fit per chunk
+    assert clock.now==pytest.approx(6)
+
+
+def mock_an_upload_client():
+    client=Mock(WebClient)
+    client.files_getUploadURLExternal.return_value={"upload_url":"https://files.example/upload","file_id":"F1"}
+    return client
+
+def test_small_output_posted_inline():
+    client=mock_an_upload_client()
+    post_long_output(client,"C1",io.StringIO("small output"))
+    client.chat_postMessage.assert_called_once_with(channel="C1",text="```small output```")
+    client.files_getUploadURLExternal.assert_not_called()
+
+@pytest.mark.parametrize("compress",[False,True])
+@pytest.mark.parametrize("binary",[False,True])
+def test_large_output_uploaded(compress,binary):
+    client=mock_an_upload_client()
+    text="".join(f"line {i}\n" for i in range(20000))
+    uploaded={}
+    def fake_upload(client,url,fileobj,length):
+        fileobj.seek(0)
+        uploaded["data"]=fileobj.read()
+        uploaded["length"]=length
+        return WebhookResponse(url=url,status_code=200,body="OK",headers={})
+    content=io.BytesIO(text.encode()) if binary else io.StringIO(text)
+    with patch.object(slack_utils,"_stream_to_upload_url",fake_upload):
+        post_long_output(client,"C1",content,thread_ts="1.1",compress=compress,upload_threshold=1000)
+    client.chat_postMessage.assert_not_called()
+    data=gzip.decompress(uploaded["data"]) if compress else uploaded["data"]
+    assert data.decode()==text
+    assert uploaded["length"]==len(uploaded["data"])
+    assert client.files_getUploadURLExternal.call_args.kwargs["filename"]==("output.txt.gz" if compress else "output.txt")
+    complete_kwargs=client.files_completeUploadExternal.call_args.kwargs
+    assert complete_kwargs["files"][0]["id"]=="F1"
+    assert complete_kwargs["channel_id"]=="C1" and complete_kwargs["thread_ts"]=="1.1"
+    assert complete_kwargs["initial_comment"].startswith("```\nline 0\nline 1\n")
+    assert f"{len(text):,}" in complete_kwargs["initial_comment"]
+
+def test_threshold_counts_characters_of_bytes():
+    client=mock_an_upload_client()
+    text="é"*1500 #3000 bytes
+    post_long_output(client,"C1",io.BytesIO(text.encode()),upload_threshold=2000)
+    client.chat_postMessage.assert_called_once_with(channel="C1",text=f"```{text}```")
+    client.files_getUploadURLExternal.assert_not_called()
+
+def test_stream_to_upload_url():
+    received=[]
+    statuses=[500,200]
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(self.rfile.read(int(self.headers["Content-Length"])))
+            self.send_response(statuses.pop(0))
+            self.end_headers()
+        def log_message(self,*args):...
+    class RetryServerErrors(RetryHandler):
+        def _can_retry(self,*,state,request,response=None,error=None):
+            return response is not None and response.status_code>=500
+    server=HTTPServer(("127.0.0.1",0),Handler)
+    thread=threading.Thread(target=lambda: [server.handle_request() for _ in range(2)])
+    thread.start()
+    data=b"x"*300_000
+    client=WebClient(retry_handlers=[RetryServerErrors(max_retry_count=1,interval_calculator=FixedValueRetryIntervalCalculator(0))])
+    response=_stream_to_upload_url(client,f"http://127.0.0.1:{server.server_port}/upload",io.BytesIO(data),len(data))
+    thread.join()
+    server.server_close()
+    assert response.status_code==200
+    assert received==[data,data] #retried by the client's retry handler, sending the whole file again
+
+def test_long_post_uploaded_when_it_can_be():
+    client=WebClient(token="xoxb-test")
+    text="\n".join(f"line {i}" for i in range(10000))
+    with patch.object(slack_utils,"post_long_output") as post_long_output_mock:
+        safe_post_in_blockquotes(client.chat_postMessage,channel="C1",text=text)
+        post_long_output_mock.assert_called_once_with(client,"C1",text,thread_ts=None)
+        safe_post_in_blockquotes(Say(client,"C2",thread_ts="1.1"),text)
+        post_long_output_mock.assert_called_with(client,"C2",text,thread_ts="1.1")
+        with patch.object(slack_utils,"post_lines_quoted") as post_lines_quoted_mock:
+            safe_post_in_blockquotes(Mock(),text) #eg respond, which can't upload, so it's chunked
+        post_lines_quoted_mock.assert_called_once()
+        assert post_long_output_mock.call_count==2
@@ -0,0 +1,83 @@
+import io
+import os
+import pickle
+import tempfile
+from time import sleep
+
+import diskcache
+import pytest
+
+from ..boltworks import DiskCacheKVStore
+from ..boltworks.helper.snapshot import SnapshotEntry, read_snapshot, write_snapshot
+
+
+def new_store(partition_namespaces=False,fanout=False)->DiskCacheKVStore:
+    if fanout:
+        return DiskCacheKVStore.multiprocess(tempfile.mkdtemp(),shards=4,partition_namespaces=partition_namespaces)
+    return DiskCacheKVStore(diskcache.Cache(tempfile.mkdtemp()),partition_namespaces=partition_namespaces)
+
+def fill(store:DiskCacheKVStore):
+    store["plain"]={"a":1}
+    store[("tuple","key")]=b"bytes"
+    store.set("expiring",2,expire=60)
+    store.namespaced("callbacks").using_serializer(pickle)["cb"]=[1,2,3]
+    store.namespaced("threads")["t"]="thread"
+    store.namespaced("threads").namespaced("nested")["n"]=4
+
+def assert_filled(store:DiskCacheKVStore):
+    assert store["plain"]=={"a":1} and store[("tuple","key")]==b"bytes" and store["expiring"]==2
+    assert store.namespaced("callbacks").using_serializer(pickle)["cb"]==[1,2,3]
+    assert store.namespaced("threads")["t"]=="thread"
+    assert store.namespaced("threads").namespaced("nested")["n"]==4
+
+
+def test_format_round_trip():
+    entries=[SnapshotEntry((),"k",b"v",None),SnapshotEntry(("a","b"),1,{"x":[1]},1e10),SnapshotEntry((),"big",os.urandom(3<<20),None)]
+    for compress in (0,1,9):
+        stream=io.BytesIO()
+        assert write_snapshot(stream,entries,compress)==3
+        stream.seek(0)
+        assert list(read_snapshot(stream))==entries
+
+def test_format_rejects_bad_streams():
+    with pytest.raises(ValueError):
+        list(read_snapshot(io.BytesIO(b"not a snapshot at all")))
+    stream=io.BytesIO()
+    write_snapshot(stream,[SnapshotEntry((),"k",b"v"*100,None)])
+    with pytest.raises(ValueError):
+        list(read_snapshot(io.BytesIO(stream.getvalue()[:-30])))
+
+@pytest.mark.parametrize("partition_namespaces,fanout,compress,workers",[(False,False,0,1),(False,False,1,1),(True,False,1,1),(True,True,6,4),(False,True,0,4)])
+def test_export_import(partition_namespaces,fanout,compress,workers):
+    old,new=new_store(partition_namespaces,fanout),new_store(partition_namespaces,fanout)
+    fill(old)
+    stream=io.BytesIO()
+    assert old.export(stream,compress=compress)==6
+    stream.seek(0)
+    assert new.import_(stream,workers=workers,batch_size=2)==6
+    assert_filled(new)
+    assert len(new.namespaced("threads"))==1 #its own entry, not its nested namespace's
+
+def test_export_namespaces_only():
+    for partition_namespaces in (False,True):
+        old,new=new_store(partition_namespaces),new_store(partition_namespaces)
+        fill(old)
+        stream=io.BytesIO()
+        assert old.using_serializer(pickle).export(stream,namespaces=["threads"])==2
+        stream.seek(0)
+        new.import_(stream)
+        assert "plain" not in new and "cb" not in new.namespaced("callbacks")
+        assert new.namespaced("threads")["t"]=="thread" and new.namespaced("threads").namespaced("nested")["n"]==4
+
+def test_import_keeps_expiry_and_skips_expired():
+    old,new=new_store(),new_store()
+    old.set("soon",1,expire=0.2)
+    old.set("later",2,expire=60)
+    stream=io.BytesIO()
+    old.export(stream)
+    sleep(0.3)
+    stream.seek(0)
+    assert new.import_(stream)==1
+    assert "soon" not in new
+    _,expire_time=new._diskcache.get("later",expire_time=True)
+    assert expire_time is not None
@@ -0,0 +1,86 @@
+import itertools
+from time import sleep
+from unittest.mock import Mock
+
+import pytest
+from slack_sdk import WebClient
+
+from ..boltworks.helper.streaming import StreamingOutput
+
+
+def mock_a_client():
+    client=Mock(WebClient)
+    counter=itertools.count()
+    client.chat_postMessage.side_effect=lambda **kwargs: {"ts":f"1.{next(counter)}"}
+    return client
+
+def final_texts(client):
+    texts={}
+    for call,ts in zip(client.chat_postMessage.call_args_list,itertools.count()):
+        texts[f"1.{ts}"]=call.kwargs["text"]
+    for call in client.chat_update.call_args_list:
+        texts[call.kwargs["ts"]]=call.kwargs["text"]
+    return list(texts.values())
+
+
+def test_writes_batched_into_one_edit():
+    client=mock_a_client()
+    out=StreamingOutput(client,"C1",min_update_interval=0.2)
+    out.write("first\n")
+    sleep(0.05) #the first write posts right away
+    for i in range(10):
+        out.write(f"line {i}\n")
+    client.chat_update.assert_not_called()
+    sleep(0.3)
+    client.chat_postMessage.assert_called_once_with(channel="C1",text="```\nfirst\n```")
+    client.chat_update.assert_called_once()
+    assert client.chat_update.call_args.kwargs["ts"]=="1.0"
+    assert client.chat_update.call_args.kwargs["text"]=="```\nfirst\n"+"".join(f"line {i}\n" for i in range(10))+"```"
+    out.close()
+    client.chat_update.assert_called_once() #nothing new to flush
+
+def test_moves_to_new_message_when_full():
+    client=mock_a_client()
+    with StreamingOutput(client,"C1",thread_ts="9.9",min_update_interval=60) as out:
+        lines=[f"{i:04d}"+"x"*95+"\n" for i in range(100)]
+        out.writelines(lines)
+    posted=final_texts(client)
+    assert len(posted)==3
+    assert all(len(text)<=4000 for text in posted)
+    assert all(c.kwargs["thread_ts"]=="9.9" for c in client.chat_postMessage.call_args_list)
+    assert "".join(text[4:-3] for text in posted)=="".join(lines)
+
+def test_overlong_line_is_split():
+    client=mock_a_client()
+    with StreamingOutput(client,"C1",max_chars=100) as out:
+        out.write("y"*250)
+    posted=final_texts(client)
+    assert all(len(text)<=100 for text in posted)
+    assert "".join(text[4:-3] for text in posted)=="y"*250
+
+def test_failed_update_resent_on_next_flush():
+    client=mock_a_client()
+    out=StreamingOutput(client,"C1",min_update_interval=60)
+    out.write("first\n")
+    out.flush()
+    out.write("second\n")
+    client.chat_update.side_effect=[RuntimeError("slack is down"),None]
+    with pytest.raises(RuntimeError):
+        out.flush()
+    out.close()
+    assert client.chat_update.call_count==2
+    assert client.chat_update.call_args.kwargs["text"]=="```\nfirst\nsecond\n```"
+
+def test_no_writes_after_close():
+    client=mock_a_client()
+    out=StreamingOutput(client,"C1")
+    out.close()
+    with pytest.raises(ValueError):
+        out.write("late")
+    client.chat_postMessage.assert_not_called()
+
+def test_print_to_stream():
+    client=mock_a_client()
+    with StreamingOutput(client,"C1") as out:
+        print("hello", "world", file=out)
+    client.chat_postMessage.assert_called_once_with(channel="C1",text="```\nhello world\n```")
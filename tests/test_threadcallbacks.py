@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta
 from functools import partial
 import json
+import tempfile
+import threading
 from time import sleep
 from typing import Tuple
 from unittest.mock import Mock
@@ -17,7 +19,7 @@ from slack_sdk.web import SlackResponse
 
 from slack_bolt import Respond, Say
 
-from .common import get_blocks_from_response_with_assertions, mock_an_args
+from .common import get_blocks_from_response_with_assertions, mock_an_app, mock_an_args
 
 from .common import TOKEN, APPTOKEN, TEST_CHANNEL, DISK_CACHE_DIR, WEBHOOK_URL
 
@@ -86,3 +88,106 @@ def test_real(fixture: Tuple[App, MsgThreadCallbacks,DiskCacheKVStore]):
     sleep(1) # to give it a chance to call the callback
     
     assert store['posted']=="123"
+
+
+@pytest.fixture
+def mocked_fixture():
+    app,_=mock_an_app()
+    disk_cache = DiskCacheKVStore(Cache(directory=tempfile.mkdtemp()))
+    callbacks = MsgThreadCallbacks(app, disk_cache.using_serializer(dill))
+
+    yield callbacks, disk_cache
+
+    disk_cache._diskcache.close()
+
+
+def _mock_thread_reply(ts):
+    args=Mock()
+    args.payload={"thread_ts":ts}
+    return args
+
+
+def test_multiple_callbacks(mocked_fixture: Tuple[MsgThreadCallbacks,DiskCacheKVStore]):
+    callbacks,_ = mocked_fixture
+    ts = '123123123.124'
+    callbacks.register_thread_reply_callback(ts, lambda args: args.say('first'))
+    callbacks.register_thread_reply_callback(ts, lambda args: args.say('second'))
+
+    args=_mock_thread_reply(ts)
+    callbacks._check_for_thread_reply_callback(args)
+    assert [c.args for c in args.say.call_args_list]==[('first',),('second',)]
+
+
+def test_one_shot(mocked_fixture: Tuple[MsgThreadCallbacks,DiskCacheKVStore]):
+    callbacks,store = mocked_fixture
+    ts = '123123123.125'
+    callbacks.register_thread_reply_callback(ts, lambda args: args.say('once'), one_shot=True)
+    callbacks.register_thread_reply_callback(ts, lambda args: args.say('always'))
+
+    args=_mock_thread_reply(ts)
+    callbacks._check_for_thread_reply_callback(args)
+    callbacks._check_for_thread_reply_callback(args)
+    assert [c.args for c in args.say.call_args_list]==[('once',),('always',),('always',)]
+
+    callbacks.unregister_thread_reply_callback(ts)
+    assert ts not in store.namespaced("thread_callback")
+
+
+def test_one_shot_only_entry_removed(mocked_fixture: Tuple[MsgThreadCallbacks,DiskCacheKVStore]):
+    callbacks,store = mocked_fixture
+    ts = '123123123.126'
+    callbacks.register_thread_reply_callback(ts, lambda args: args.say('once'), one_shot=True)
+    callbacks._check_for_thread_reply_callback(_mock_thread_reply(ts))
+    assert ts not in store.namespaced("thread_callback")
+
+
+def test_ttl(mocked_fixture: Tuple[MsgThreadCallbacks,DiskCacheKVStore]):
+    callbacks,store = mocked_fixture
+    ts = '123123123.127'
+    callbacks.register_thread_reply_callback(ts, lambda args: args.say('short'), ttl=0.2)
+    registration_id=callbacks.register_thread_reply_callback(ts, lambda args: args.say('long'), ttl=60)
+
+    sleep(0.3)
+    args=_mock_thread_reply(ts)
+    callbacks._check_for_thread_reply_callback(args)
+    args.say.assert_called_once_with('long')
+
+    callbacks.unregister_thread_reply_callback(ts, registration_id)
+    assert ts not in store.namespaced("thread_callback")
+
+
+def test_sweep_expired(mocked_fixture: Tuple[MsgThreadCallbacks,DiskCacheKVStore]):
+    callbacks,store = mocked_fixture
+    for i in range(5):
+        callbacks.register_thread_reply_callback(f'1.{i}', lambda args: None, ttl=0.1)
+    callbacks.register_thread_reply_callback('2.0', lambda args: None)
+    sleep(0.2)
+    assert callbacks.sweep_expired()==5
+    assert '2.0' in store.namespaced("thread_callback")
+
+
+def test_failing_callback_doesnt_stop_others(mocked_fixture: Tuple[MsgThreadCallbacks,DiskCacheKVStore], caplog):
+    callbacks,_ = mocked_fixture
+    ts = '123123123.128'
+    def fail(args): raise RuntimeError("callback failed")
+    callbacks.register_thread_reply_callback(ts, fail)
+    callbacks.register_thread_reply_callback(ts, lambda args: args.say('after'))
+
+    args=_mock_thread_reply(ts)
+    callbacks._check_for_thread_reply_callback(args)
+    args.say.assert_called_once_with('after')
+    assert any(record.exc_info and isinstance(record.exc_info[1],RuntimeError) for record in caplog.records)
+
+
+def test_sweep_counted_across_threads(mocked_fixture: Tuple[MsgThreadCallbacks,DiskCacheKVStore]):
+    callbacks,_ = mocked_fixture
+    callbacks._sweep_every=10
+    sweeps=[]
+    callbacks._callback_store.expire=lambda: sweeps.append(1) or 0 # type: ignore
+    def register(n):
+        for i in range(25):
+            callbacks.register_thread_reply_callback(f'3.{n}', lambda args: None)
+    threads=[threading.Thread(target=register,args=(n,)) for n in range(4)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert len(sweeps)==10 and callbacks._registrations_since_sweep==0